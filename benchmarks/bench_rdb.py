@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+'''快照保存和载入的吞吐量
+
+    python benchmarks/bench_rdb.py [键的数量]
+'''
+
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+from pydis.core import BaseCore
+
+
+def main(n: int = 1_000_000):
+    core = BaseCore()
+    core.mset({'key:%d' % i: {'id': i, 'name': 'user%d' % i} for i in range(n // 2)})
+    core.mset({'ex:%d' % i: 'x' * 32 for i in range(n // 2)}, 3600)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'dump.pydis')
+        start = perf_counter()
+        core.save(path)
+        dump_time = perf_counter() - start
+        size = os.path.getsize(path) / 1024 / 1024
+
+        start = perf_counter()
+        core.save_mapped(path + '.mapped')
+        mapped_dump_time = perf_counter() - start
+        mapped_size = os.path.getsize(path + '.mapped') / 1024 / 1024
+
+        core = BaseCore()
+        start = perf_counter()
+        core.load(path)
+        load_time = perf_counter() - start
+
+        core = BaseCore()
+        start = perf_counter()
+        core.attach(path + '.mapped')
+        core.get('key:%d' % (n // 4))
+        attach_time = perf_counter() - start
+        start = perf_counter()
+        core._materialize()
+        materialize_time = perf_counter() - start
+    print('keys: %d, file: %.1f MB, mapped file: %.1f MB' % (n, size, mapped_size))
+    print('dump: %.2fs, %.1f MB/s' % (dump_time, size / dump_time))
+    print('load: %.2fs, %.1f MB/s' % (load_time, size / load_time))
+    print('mapped dump: %.2fs, %.1f MB/s' % (mapped_dump_time, mapped_size / mapped_dump_time))
+    print('mapped attach + first get: %.2fms' % (attach_time * 1000))
+    print('mapped materialize: %.2fs' % materialize_time)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
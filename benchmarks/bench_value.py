@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+'''带失效时长的键的读取吞吐量
+
+    python benchmarks/bench_value.py [键的数量]
+'''
+
+import sys
+from time import perf_counter
+
+from pydis.core import BaseCore
+
+
+def main(n: int = 1_000_000):
+    core = BaseCore()
+    keys = ['key:%d' % i for i in range(n)]
+    core.mset({key: 'x' * 32 for key in keys}, 3600)
+
+    get = core.get
+    start = perf_counter()
+    for key in keys:
+        get(key)
+    get_time = perf_counter() - start
+
+    batch = 100
+    start = perf_counter()
+    for i in range(0, n, batch):
+        core.mget(keys[i:i + batch])
+    mget_time = perf_counter() - start
+
+    start = perf_counter()
+    core.keys()
+    keys_time = perf_counter() - start
+    start = perf_counter()
+    core.keys('key:1*')
+    match_time = perf_counter() - start
+
+    print('keys: %d, all with ttl' % n)
+    print('get: %.2fs, %.0f ops/s' % (get_time, n / get_time))
+    print('mget (%d keys): %.2fs, %.0f keys/s' % (batch, mget_time, n / mget_time))
+    print('keys: %.2fs' % keys_time)
+    print('keys with pattern: %.2fs' % match_time)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 
-from .core import Core as Pydis
\ No newline at end of file
+from .core import Core as Pydis
+from .sharded import ShardedCore
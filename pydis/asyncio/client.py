@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from datetime import timedelta
+from functools import wraps
+from typing import (Any, AsyncIterator, Awaitable, Callable, Dict, List,
+                    Optional, Union)
+
+from ..exceptions import ConnectionClosedError, ReceiveTimeout, WatchError
+from ..multithreading.client import PydisClient, Pipeline, make_message
+from ..multithreading.commands import OPCODES
+from ..multithreading.message import message
+from ..multithreading.typing import RequestT, ResponseT
+
+
+class AsyncPydisClient(PydisClient):
+    '''基于 asyncio 的客户端
+
+    接口与 ``pydis.multithreading.PydisClient`` 相同，但所有命令都是协程。
+    连接的 socketpair 被注册到事件循环中，结果到达时才被唤醒，
+    不会阻塞事件循环
+
+    同一事件循环中的多个协程可以共享一个客户端，它们的请求会同时在途，
+    响应按请求 ID 交给对应的协程，与到达的顺序无关
+
+    命令的 ``block`` 参数会被忽略，``timeout`` 超时后引发 ReceiveTimeout
+
+    只能在一个事件循环中使用，线程不安全
+
+    eg:
+        client = AsyncPydisClient()
+        await client.set('key', 'val')
+        await asyncio.gather(*(client.incr('counter') for _ in range(100)))
+    '''
+
+    def __init__(
+        self,
+        default_timout: Optional[Union[float, timedelta]] = None
+    ) -> None:
+        self._waiters: Dict[int, asyncio.Future] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        super().__init__(default_timout)
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._conn.closed:
+            raise ConnectionClosedError('connection has been closed')
+        if self._loop is None:
+            loop.add_reader(self._conn.fileno(), self._on_readable)
+            self._loop = loop
+        elif self._loop is not loop:
+            raise RuntimeError('client is bound to a different event loop')
+        return loop
+
+    def _on_readable(self):
+        waiters = self._waiters
+        while True:
+            try:
+                resp = self._conn.recv(block=False)
+            except ReceiveTimeout:
+                return
+            except ConnectionClosedError as e:
+                self._fail_waiters(e)
+                return
+            rid, kind, result = resp  # type: ignore
+            fut = waiters.pop(rid, None)
+            # 超时被取消的请求，其结果到达时直接丢弃
+            if fut is not None and not fut.done():
+                fut.set_result((kind, result))
+
+    def _fail_waiters(self, exc: BaseException):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.remove_reader(self._conn.fileno())
+        self._loop = None
+        waiters, self._waiters = self._waiters, {}
+        for fut in waiters.values():
+            if not fut.done():
+                fut.set_exception(exc)
+
+    def execute_command(  # type: ignore
+        self,
+        msg: RequestT,
+        block=True,
+        timeout: Optional[float] = None
+    ) -> Awaitable[ResponseT]:
+        return self._request(msg, timeout)
+
+    async def _request(
+        self,
+        msg: RequestT,
+        timeout: Optional[float] = None
+    ) -> ResponseT:
+        loop = self._get_loop()
+        fut = loop.create_future()
+        rid = self._conn.next_request_id()
+        self._conn.send((rid, *msg))
+        self._waiters[rid] = fut
+        try:
+            if timeout is None:
+                return await fut
+            try:
+                return await asyncio.wait_for(fut, timeout)
+            except asyncio.TimeoutError:
+                raise ReceiveTimeout from None
+        finally:
+            self._waiters.pop(rid, None)
+
+    async def empty(self) -> bool:  # type: ignore
+        '''是否没有存入任何键'''
+        kind, result = await self._request(make_message(message.CALL, 'empty'))
+        return _handle_response(kind, result)
+
+    async def scan_iter(  # type: ignore
+        self,
+        match: Optional[str] = None,
+        count: int = 10,
+        type: Optional[str] = None,
+        block=True, timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        '''以异步生成器的形式遍历键空间，参见 ``PydisClient.scan_iter``'''
+        cursor = 0
+        while True:
+            cursor, keys = await self.scan(  # type: ignore
+                cursor, match, count, type, timeout=timeout)
+            for key in keys:
+                yield key
+            if not cursor:
+                return
+
+    def pipeline(self, transaction=False) -> 'AsyncPipeline':  # type: ignore
+        '''创建一个流水线，参见 ``PydisClient.pipeline``'''
+        return AsyncPipeline(self, transaction)
+
+    async def transaction(  # type: ignore
+        self,
+        func: Callable[['AsyncPipeline'], Awaitable[Any]],
+        *watches: str
+    ) -> List[Any]:
+        '''以乐观锁执行一个读-改-写事务，参见 ``PydisClient.transaction``
+
+        ``func`` 为协程函数，监视期间的读取需直接使用客户端进行
+        '''
+        async with self.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    if watches:
+                        await pipe.watch(*watches)
+                    await func(pipe)
+                    return await pipe.execute()
+                except WatchError:
+                    continue
+
+    def close(self):
+        if self._loop is not None:
+            self._fail_waiters(ConnectionClosedError('connection has been closed'))
+        super().close()
+
+
+class AsyncPipeline(Pipeline):
+    '''基于 asyncio 的命令流水线
+
+    命令只被缓存，因此仍是普通方法，``watch`` 和 ``execute`` 为协程。
+    与同步流水线不同，监视期间的命令同样会被缓存，需要立即执行的读取
+    请直接使用客户端
+    '''
+    client: AsyncPydisClient
+
+    async def __aenter__(self) -> 'AsyncPipeline':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.reset()
+
+    def execute_command(
+        self,
+        msg: RequestT,
+        block=True,
+        timeout: Optional[float] = None
+    ) -> ResponseT:
+        self.command_stack.append(msg)
+        return (message.RETURN, self)
+
+    async def watch(self, *keys: str):  # type: ignore
+        '''监视指定的键，参见 ``Pipeline.watch``'''
+        if self.explicit_transaction:
+            raise RuntimeError('cannot issue a WATCH after a MULTI')
+        versions = await self.client.versions(*keys)
+        self.watched.update(zip(keys, versions))
+
+    async def execute(  # type: ignore
+        self,
+        raise_on_error=True,
+        block=True, timeout: Optional[float] = None
+    ) -> List[Any]:
+        '''发送所有缓存的命令，参见 ``Pipeline.execute``'''
+        msg = self._pack()
+        if msg is None:
+            return []
+        resp = await self.client.execute_command(msg, block, timeout)
+        return self._unpack(resp, raise_on_error)
+
+
+def _handle_response(kind, result):
+    if kind == message.RETURN:
+        return result
+    elif kind == message.ERROR:
+        raise result
+    raise ValueError('message kind nuknown')
+
+
+def _coroutine(
+    method: Callable[..., Any],
+    public: Optional[Callable[..., Any]] = None
+) -> Callable[..., Awaitable[Any]]:
+    '''将 PydisClient 的命令包装为协程，名称和文档取自 ``public``，默认为 ``method``'''
+    build = method.__wrapped__  # type: ignore
+
+    @wraps(public or method)
+    async def wrapper(self, *args, **kwargs):
+        kind, result = await build(self, *args, **kwargs)
+        return _handle_response(kind, result)
+    return wrapper
+
+
+# 同步客户端的 get、mget 先查找本地缓存，再通过 _get、_mget 发送请求，
+# 异步客户端没有本地缓存，直接包装发送请求的方法
+_REQUEST_METHODS = {'get': '_get', 'mget': '_mget'}
+
+for _name in OPCODES:
+    _method = getattr(PydisClient, _REQUEST_METHODS.get(_name, _name), None)
+    if hasattr(_method, '__wrapped__'):
+        setattr(AsyncPydisClient, _name, _coroutine(_method, getattr(PydisClient, _name)))
+del _name, _method
@@ -1,10 +1,23 @@
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
 from datetime import timedelta
-from typing import Any, Collection, Dict, List, Optional, Set, Union
-
+from fnmatch import fnmatchcase, translate
+from heapq import heapify, heappop, heappush
+from re import compile as re_compile
+from time import monotonic, time
+from typing import (Any, Callable, Collection, Dict, Iterable, Iterator, List,
+                    Optional, Set, Tuple, Union)
+
+from .eviction import EvictionPolicy, get_policy
+from .exceptions import OutOfMemoryError
+from . import mapped, rdb
+from .keyindex import KeyIndex
+from .lazyfree import LazyFree
+from .mapped import MappedSnapshot
+from .tracking import Tracking
 from .utils import Singleton
-from .value import NOT_EXISTS, Value
+from .value import INF, NOT_EXISTS, Value
 
 default_timeout = None
 '''
@@ -13,22 +26,149 @@ default_timeout = None
 通过对 ``pydis.core.default_timeout`` 赋值改变它
 '''
 
+EXPIRES_COMPACT_MIN = 1024
+'''失效索引中的条目数超过此值，且超过键数量的两倍时，重建失效索引'''
+
+SCAN_EPOCHS = 16
+'''保留最近几次压缩键日志的位置换算表，更早的 scan 游标从头开始遍历'''
+
+SCAN_CHECKPOINT = 1024
+'''压缩键日志时，每隔多少个位置记录一次压缩后的位置，供换算 scan 游标'''
+
+_SCAN_POS_BITS = 40
+_SCAN_POS_MASK = (1 << _SCAN_POS_BITS) - 1
+
+SCAN_MAPPED_TIME = 0.001
+'''有映射的快照时，每次 scan 用于载入快照中剩余的键的时间上限（秒）'''
+
+TOMBSTONES_MAX = 1024
+'''记录删除时版本号的键的数量上限，超出时丢弃最早的记录，见 ``versions``'''
+
+KEYLOG_COMPACT_MIN = 1024
+'''键日志的长度超过此值，且超过键数量的两倍时，压缩键日志'''
+
+MAPPED_STEP = 256
+'''逐步载入映射快照时，每批检查的哈希表槽位数'''
+
+
+def _type_name(value: Any) -> str:
+    # scan 的参数 type 遮蔽了内置函数
+    return type(value).__name__
 
-class Core(metaclass=Singleton):
+
+def _glob_prefix(pattern: str) -> str:
+    '''glob 风格的模式中第一个通配符之前的部分'''
+    for i, char in enumerate(pattern):
+        if char in '*?[':
+            return pattern[:i]
+    return pattern
+
+
+class BaseCore:
     '''基于 dict 的内存管理工具
 
     可通过改变 ``pydis.core.default_timeout`` 改变全局失效时长，
     新的失效时长只对新存入的键有效，改变前存入的键不受影响
+
+    可通过 ``maxkeys`` 限制键的数量，达到上限后，存入新键前会按
+    ``maxkeys_policy`` 指定的策略淘汰已有的键，可选的策略见
+    ``pydis.eviction.POLICIES``，也可以传入 ``EvictionPolicy`` 的实例
+
+    ``key_index`` 为 True 时，额外维护一个按字典序排列的键索引，
+    以固定前缀开头的模式的 ``keys`` 和 ``delete_prefix`` 只需读取匹配的键，
+    代价是每次新增和删除键多一次 O(log n) 的索引维护
+
+    Attributes:
+        maxkeys (int): 键的数量上限，默认为 None，表示不限制
+        stat_evicted_keys (int): 被淘汰的键的数量
+        stat_expired_keys (int): 因失效被清理的键的数量
+        stat_keyspace_hits (int): 查找键时命中的次数
+        stat_keyspace_misses (int): 查找键时键不存在或已失效的次数
     '''
 
     def __init__(self) -> None:
+        self.maxkeys: Optional[int] = None
+        self.stat_evicted_keys = 0
+        self.stat_expired_keys = 0
+        self.stat_keyspace_hits = 0
+        self.stat_keyspace_misses = 0
+        self._last_version = 0
+        self._policy: EvictionPolicy = get_policy('noeviction')
         self._db: Dict[str, Value] = {}
-        self._expiry_key: Set[str] = set()
+        self._expires: List[Tuple[float, str]] = []
+        '''以失效时刻排序的最小堆，元素为 (失效时刻, 键)
+
+        采用惰性删除：键被覆盖、删除或重设失效时长后，旧条目仍留在堆中，
+        弹出时与 ``_db`` 中的失效时刻比对，不一致即为过期条目，直接丢弃
+        '''
+        self._volatile_keys = 0
+        '''``_db`` 中会失效的键的数量，随键的写入和删除维护，``info`` 读取时无需遍历'''
+        self._key_index: Optional[KeyIndex] = None
+        '''按字典序排列的键索引，没有启用时为 None'''
+        self._cow = 0
+        '''进行中的后台快照的数量，大于 0 时不能原地修改值，见 ``_cre``'''
+        self._keylog: List[str] = []
+        '''按新增的先后排列的键，供 scan 按位置遍历
+
+        同样采用惰性删除：键被删除后条目仍留在日志中，重新存入时追加新的条目，
+        只有位置与 ``Value.seq`` 一致的条目有效，过期条目太多时压缩，见 ``_compact_keylog``
+        '''
+        self._keylog_epoch = 0
+        '''键日志被压缩或清空的次数，scan 的游标中带有它，见 ``_scan_pos``'''
+        self._keylog_remaps: 'OrderedDict[int, List[int]]' = OrderedDict()
+        '''最近几次压缩的位置换算表：压缩前的第 i * SCAN_CHECKPOINT 个位置之前
+        保留下来的条目数，最后一项为保留的条目总数，以压缩前的 ``_keylog_epoch`` 索引
+        '''
+        self._mapped: Optional[MappedSnapshot] = None
+        '''映射的快照，其中的键全部载入后为 None，见 ``attach``'''
+        self._mapped_seen: Set[str] = set()
+        '''已经从快照中载入，或映射后被写入、查找过的键，这些键不再从快照中载入'''
+        self._mapped_pos = 0
+        '''逐步载入快照的进度，为哈希表的槽位序号'''
+        self._mapped_owns: Optional[Callable[[str], bool]] = None
+        '''只载入快照中满足条件的键，用于分片，见 ``ShardedCore.attach``'''
+        self._tombstones: 'OrderedDict[str, int]' = OrderedDict()
+        '''最近被删除、失效或淘汰的键，以及删除时的版本号，见 ``versions``'''
+        self._tombstone_floor = 0
+        '''被丢弃的删除记录中最新的版本号，没有记录的不存在的键以它为版本号'''
+        self._tracking: Optional[Tracking] = None
+        '''客户端缓存的跟踪表，键被修改或删除时通知读取过它的客户端，没有开启时为 None'''
 
     @property
     def empty(self) -> bool:
+        if self._mapped is not None:
+            self._materialize()
         return not self._db
 
+    def dbsize(self) -> int:
+        '''键的数量，包括已经失效但还没有被清理的键'''
+        if self._mapped is not None:
+            self._materialize()
+        return len(self._db)
+
+    @property
+    def key_index(self) -> bool:
+        '''是否维护按字典序排列的键索引，默认为 False'''
+        return self._key_index is not None
+
+    @key_index.setter
+    def key_index(self, enabled: bool):
+        if not enabled:
+            self._key_index = None
+        elif self._key_index is None:
+            self._key_index = KeyIndex(self._db)
+
+    @property
+    def maxkeys_policy(self) -> str:
+        '''达到 ``maxkeys`` 后的淘汰策略，默认为 noeviction'''
+        return self._policy.name
+
+    @maxkeys_policy.setter
+    def maxkeys_policy(self, policy: Union[str, EvictionPolicy]):
+        self._policy = get_policy(policy)
+        for value in self._db.values():
+            self._policy.init(value)
+
     def get(self, key: str) -> Union[Any, None]:
         '''获取指定 key 的值
 
@@ -46,13 +186,193 @@ class Core(metaclass=Singleton):
         try:
             value = self._db[key]
         except KeyError:
-            return NOT_EXISTS
+            value = self._fault(key) if self._mapped is not None else None
+            if value is None:
+                self.stat_keyspace_misses += 1
+                return NOT_EXISTS
         if value.expired:
             self._db.pop(key)
-            self._expiry_key.discard(key)
+            self._volatile_keys -= 1
+            if self._key_index is not None:
+                self._key_index.discard(key)
+            if self._tracking is not None:
+                self._tracking.invalidate(key)
+            self._bury(key)
+            self.stat_expired_keys += 1
+            self.stat_keyspace_misses += 1
             return NOT_EXISTS
+        self.stat_keyspace_hits += 1
+        if self.maxkeys is not None:
+            self._policy.touch(value)
         return value
 
+    def _store(self, key: str, value: Value):
+        '''存入 ``value``，并在其会失效时登记到失效索引
+
+        Raises:
+            OutOfMemoryError: 键的数量达到上限，并且没有可淘汰的键时引发
+        '''
+        db = self._db
+        old = db.get(key)
+        maxkeys = self.maxkeys
+        if maxkeys is not None:
+            if len(db) >= maxkeys and old is None:
+                self._free_keys(len(db) - maxkeys + 1)
+            self._policy.init(value)
+        if old is None and self._key_index is not None:
+            self._key_index.add(key)
+        if self._mapped is not None:
+            self._mapped_seen.add(key)
+        if self._tracking is not None:
+            self._tracking.invalidate(key)
+        self._last_version += 1
+        value.version = self._last_version
+        db[key] = value
+        if value.expire_at != INF:
+            self._add_expiry(key, value.expire_at)
+            self._volatile_keys += 1
+        if old is None:
+            log = self._keylog
+            seq = value.seq = len(log)
+            log.append(key)
+            # 与失效索引相同，频繁删除和新增键时避免键日志无限增长
+            if seq >= KEYLOG_COMPACT_MIN and seq >= 2 * len(db):
+                self._compact_keylog()
+        else:
+            value.seq = old.seq
+            if old.expire_at != INF:
+                self._volatile_keys -= 1
+
+    def _reserve(self, keys: Collection[str]):
+        '''为 ``keys`` 中的新键预先腾出空间，空间不足时在存入任何键之前引发异常
+
+        新键比 ``maxkeys`` 还多时，清空已有的键后，其余的交给 ``_store`` 逐个淘汰
+
+        Raises:
+            OutOfMemoryError: 键的数量达到上限，并且没有足够的可淘汰的键时引发
+        '''
+        maxkeys = self.maxkeys
+        if maxkeys is None:
+            return
+        db = self._db
+        while db:
+            # 淘汰的可能是 ``keys`` 中已有的键，它们随后也成为新键，因此重新计数
+            excess = len(db) + sum(1 for key in keys if key not in db) - maxkeys
+            if excess <= 0:
+                return
+            self._free_keys(min(excess, len(db)))
+
+    def _add_expiry(self, key: str, expire_at: float):
+        expires = self._expires
+        heappush(expires, (expire_at, key))
+        # 过期条目太多时重建，避免频繁覆盖带失效时长的键导致堆无限增长
+        if len(expires) > EXPIRES_COMPACT_MIN and \
+                len(expires) > 2 * len(self._db):
+            self._rebuild_expires()
+
+    def _check_keylog(self):
+        log = self._keylog
+        if len(log) > KEYLOG_COMPACT_MIN and len(log) > 2 * len(self._db):
+            self._compact_keylog()
+
+    def _compact_keylog(self):
+        '''丢弃键日志中的过期条目，并记录位置换算表，供换算之前发出的 scan 游标'''
+        db = self._db
+        log: List[str] = []
+        checkpoints: List[int] = []
+        for pos, key in enumerate(self._keylog):
+            if not pos % SCAN_CHECKPOINT:
+                checkpoints.append(len(log))
+            value = db.get(key)
+            if value is not None and value.seq == pos:
+                value.seq = len(log)
+                log.append(key)
+        checkpoints.append(len(log))
+        self._keylog = log
+        self._next_keylog_epoch(checkpoints)
+
+    def _next_keylog_epoch(self, checkpoints: List[int]):
+        remaps = self._keylog_remaps
+        remaps[self._keylog_epoch] = checkpoints
+        if len(remaps) > SCAN_EPOCHS:
+            remaps.popitem(last=False)
+        self._keylog_epoch += 1
+
+    def _free_keys(self, num: int):
+        '''腾出 ``num`` 个键的空间，优先清理已经失效的键，不足时按策略淘汰'''
+        now = monotonic()
+        if self._next_expiry() <= now:
+            expired, _ = self._expire_due(now, now + 0.001)
+            num -= expired
+        db, policy = self._db, self._policy
+        while num > 0:
+            key = policy.select(self)
+            if key is None:
+                raise OutOfMemoryError(
+                    'maxkeys reached (%s), policy: %s' % (self.maxkeys, policy.name))
+            if db.pop(key).expire_at != INF:
+                self._volatile_keys -= 1
+            if self._key_index is not None:
+                self._key_index.discard(key)
+            if self._tracking is not None:
+                self._tracking.invalidate(key)
+            self._bury(key)
+            self.stat_evicted_keys += 1
+            num -= 1
+
+    def _rebuild_expires(self):
+        expires = [
+            (value.expire_at, key)
+            for key, value in self._db.items()
+            if value.expire_at != INF
+        ]
+        heapify(expires)
+        self._expires = expires
+
+    def _expire_due(
+        self,
+        now: float,
+        deadline: float = INF
+    ) -> Tuple[int, bool]:
+        '''按失效时刻顺序清理在 ``now`` 时已经失效的键
+
+        每清理一批键检查一次时钟，超过 ``deadline`` 时退出
+
+        Args:
+            now (float): monotonic 时钟读数，失效时刻不晚于它的键会被清理
+            deadline (float, optional): 清理的截止时刻. 默认为 INF，表示清理全部
+
+        Returns:
+            Tuple[int, bool]: 清理的键的数量，以及是否因超时而退出
+        '''
+        db, expires, index = self._db, self._expires, self._key_index
+        tracking = self._tracking
+        expired = checked = 0
+        while expires and expires[0][0] <= now:
+            expire_at, key = heappop(expires)
+            value = db.get(key)
+            if value is not None and value.expire_at == expire_at:
+                del db[key]
+                if index is not None:
+                    index.discard(key)
+                if tracking is not None:
+                    tracking.invalidate(key)
+                self._bury(key)
+                expired += 1
+            checked += 1
+            if not checked & 0x3f and monotonic() >= deadline:
+                self.stat_expired_keys += expired
+                self._volatile_keys -= expired
+                return expired, bool(expires) and expires[0][0] <= now
+        self.stat_expired_keys += expired
+        self._volatile_keys -= expired
+        return expired, False
+
+    def _next_expiry(self) -> float:
+        '''最近的失效时刻，没有会失效的键时为 INF'''
+        expires = self._expires
+        return expires[0][0] if expires else INF
+
     def set(self, key: str, value: Any,
             ex: Optional[Union[float, timedelta]] = None) -> bool:
         '''将 ``key`` 的值设为 ``value``，``value`` 不能为 None
@@ -60,7 +380,7 @@ class Core(metaclass=Singleton):
         ex 用于指定失效时长，可接受 int、float 和 timedelta 类型，
         默认为 None 表示永远有效
 
-        本操作不会失败，因此返回值恒为 True
+        除键的数量达到上限且无法淘汰外，本操作不会失败，因此返回值恒为 True
 
         Args:
             key (str): 指定的 key
@@ -69,6 +389,7 @@ class Core(metaclass=Singleton):
 
         Raises:
             ValueError: 传入的 ``value`` 为 None 时引发
+            OutOfMemoryError: 键的数量达到上限，并且没有可淘汰的键时引发
 
         Returns:
             bool: True
@@ -77,9 +398,7 @@ class Core(metaclass=Singleton):
             raise ValueError('`None` is special to pydis, can not use it as a value')
         if ex is None:
             ex = default_timeout
-        else:
-            self._expiry_key.add(key)
-        self._db[key] = Value(value, ex)
+        self._store(key, Value(value, ex))
         return True
 
     def setnx(self, key: str, value: Any,
@@ -96,10 +415,6 @@ class Core(metaclass=Singleton):
         '''
         if self._get(key) is not NOT_EXISTS:
             return False
-        if ex is None:
-            ex = default_timeout
-        else:
-            self._expiry_key.add(key)
         return self.set(key, value, ex)
 
     def mget(self, keys: Collection[str]) -> List[Any]:
@@ -115,18 +430,36 @@ class Core(metaclass=Singleton):
             List[Any]: 与 ``keys`` 中的键对应的值，不存在的用 None 填充
         '''
         values, expired_keys = [], []
+        now = monotonic()  # 整批操作只读取一次时钟
+        touch = self._policy.touch if self.maxkeys is not None else None
+        fault = self._fault if self._mapped is not None else None
+        misses = 0
         for key in keys:
             try:
-                val = self._db[key]
-                if val.expired:
+                try:
+                    val = self._db[key]
+                except KeyError:
+                    if fault is None:
+                        raise
+                    val = fault(key)
+                    if val is None:
+                        raise
+                if now >= val.expire_at:
                     values.append(None)
                     expired_keys.append(key)
+                    misses += 1
                 else:
+                    if touch is not None:
+                        touch(val)
                     values.append(val.value)
             except KeyError:
                 values.append(None)
+                misses += 1
                 continue
-        self._delete_many(expired_keys)
+        self.stat_keyspace_hits += len(values) - misses
+        self.stat_keyspace_misses += misses
+        if expired_keys:
+            self.stat_expired_keys += self._delete_many(expired_keys)
         return values
 
     def mset(self, data: Dict[str, Any],
@@ -137,20 +470,26 @@ class Core(metaclass=Singleton):
 
         ``ex`` 用于指定失效时长，可接受 int、float 和 timedelta 类型
 
-        本操作不会失败，因此返回值恒为 True
+        除键的数量达到上限且无法淘汰外，本操作不会失败，因此返回值恒为 True，
+        失败时不会存入任何键
 
         Args:
             data (Dict[str, Any]): 待存入的键值对
             ex (Union[int, timedelta], optional): 失效时长. 默认为 None
 
+        Raises:
+            OutOfMemoryError: 键的数量达到上限，并且没有可淘汰的键时引发
+
         Returns:
             bool: True
         '''
         if ex is None:
             ex = default_timeout
-        else:
-            self._expiry_key.update(data)
-        self._db.update({key: Value(val, ex) for key, val in data.items()})
+        self._reserve(data)
+        now = monotonic()
+        store = self._store
+        for key, val in data.items():
+            store(key, Value(val, ex, now))
         return True
 
     def msetnx(self, data: Dict[str, Any],
@@ -164,15 +503,23 @@ class Core(metaclass=Singleton):
             data (Dict[str, Any]): 待存储的键值对
             ex (Union[float, timedelta], optional): 失效时长. 默认为 None.
 
+        Raises:
+            OutOfMemoryError: 键的数量达到上限，并且没有足够的可淘汰的键时引发，此时不会存入任何键
+
         Returns:
             int: 成功存储的键值对的数量
         '''
+        if self._mapped is not None:
+            for key in data:
+                self._fault(key)
         set_keys = set(data).difference(self._db)
         if ex is None:
             ex = default_timeout
-        else:
-            self._expiry_key.update(data)
-        self._db.update({key: Value(data[key], ex) for key in set_keys})
+        self._reserve(set_keys)
+        now = monotonic()
+        store = self._store
+        for key in set_keys:
+            store(key, Value(data[key], ex, now))
         return len(set_keys)
 
     def delete(self, key, *keys: str) -> int:
@@ -181,31 +528,120 @@ class Core(metaclass=Singleton):
         Returns:
             int: 成功操作的数量
         '''
+        if self._mapped is not None:
+            self._fault(key)
         count = 0
         try:
-            self._db.pop(key)
-            self._expiry_key.discard(key)
+            if self._db.pop(key).expire_at != INF:
+                self._volatile_keys -= 1
             count += 1
+            if self._key_index is not None:
+                self._key_index.discard(key)
+            if self._tracking is not None:
+                self._tracking.invalidate(key)
+            self._bury(key)
         except KeyError:
             pass
         if keys:
             count += self._delete_many(keys)
         return count
 
-    def _delete_many(self, keys: Collection[str]):
+    def unlink(self, key: str, *keys: str) -> int:
+        '''删除一个或多个键，大的值交给后台线程释放，见 ``pydis.lazyfree``
+
+        Returns:
+            int: 成功操作的数量
+        '''
+        return self._delete_many((key, *keys), lazy=True)
+
+    def _delete_many(self, keys: Collection[str], lazy: bool = False) -> int:
+        '''逐个删除 ``keys``，耗时只与 ``keys`` 的数量有关，与键的总数无关
+
+        ``lazy`` 为 True 时，大的值交给后台线程释放
+        '''
         if not keys:
             return 0
-        per_db = self._db
-        if len(self._db) > len(keys) * 10:  # 少量数据
+        if self._mapped is not None:
             for key in keys:
-                per_db.pop(key)
-                self._expiry_key.discard(key)
-            return len(keys)
+                self._fault(key)
+        db, index, tracking = self._db, self._key_index, self._tracking
+        bury = self._bury if len(keys) <= TOMBSTONES_MAX else None
+        free = LazyFree().free if lazy else None
+        count = volatile = 0
+        for key in keys:
+            value = db.pop(key, None)
+            if value is None:
+                continue
+            count += 1
+            if value.expire_at != INF:
+                volatile += 1
+            if index is not None:
+                index.discard(key)
+            if tracking is not None:
+                tracking.invalidate(key)
+            if bury is not None:
+                bury(key)
+            if free is not None:
+                free(value)
+        self._volatile_keys -= volatile
+        if bury is None and count:
+            self._bury_all()
+        return count
+
+    def delete_prefix(self, prefix: str) -> int:
+        '''删除所有以 ``prefix`` 开头的键，大的值交给后台线程释放
+
+        启用 ``key_index`` 时只读取匹配的键，否则需要检查所有键
+
+        Returns:
+            int: 删除的键的数量
+        '''
+        if self._mapped is not None:
+            self._materialize()
+        index = self._key_index
+        if index is not None:
+            keys: List[str] = index.prefix(prefix)
         else:
-            alive_keys = set(per_db).difference(keys)
-            self._db = {key: per_db[key] for key in alive_keys}
-            self._expiry_key.difference_update(keys)
-            return len(per_db) - len(alive_keys)
+            keys = [key for key in self._db if key.startswith(prefix)]
+        return self._delete_many(keys, lazy=True)
+
+    def versions(self, *keys: str) -> List[int]:
+        '''获取指定键的版本号
+
+        键的每次写入、删除和失效都会使它的版本号改变，
+        通过比较前后两次获取的版本号，可以判断期间键是否被修改过
+
+        不存在的键以删除它时的版本号为版本号，因此键被存入后又被删除，
+        前后两次获取的版本号也不相同。删除记录只保留最近的 ``TOMBSTONES_MAX`` 个，
+        没有记录的键以被丢弃的记录中最新的版本号为版本号，从没存入过的键为 0。
+        这可能使没有被修改过的键的版本号改变，但不会漏掉修改
+
+        Returns:
+            List[int]: 与 ``keys`` 中的键一一对应的版本号
+        '''
+        tombstones, floor = self._tombstones, self._tombstone_floor
+        ret = []
+        for key in keys:
+            version = self._get(key).version
+            if version == 0:  # 不存在或失效
+                version = tombstones.get(key, floor)
+            ret.append(version)
+        return ret
+
+    def _bury(self, key: str):
+        '''记录删除 ``key`` 时的版本号'''
+        self._last_version += 1
+        tombstones = self._tombstones
+        tombstones[key] = self._last_version
+        tombstones.move_to_end(key)
+        if len(tombstones) > TOMBSTONES_MAX:
+            _, self._tombstone_floor = tombstones.popitem(last=False)
+
+    def _bury_all(self):
+        '''删除了大量的键，不再逐个记录，所有不存在的键的版本号都改变'''
+        self._last_version += 1
+        self._tombstones.clear()
+        self._tombstone_floor = self._last_version
 
     ## TODO: 接受多个key
     def exists(self, key: str) -> bool:
@@ -219,22 +655,153 @@ class Core(metaclass=Singleton):
         '''
         return self.get(key) is not None  # 失效或不存在都认为不存在
 
-    def keys(self) -> List[str]:
-        '''获取所有合法的键
+    def keys(self, pattern: Optional[str] = None) -> List[str]:
+        '''获取所有合法的键，可以通过 glob 风格的 ``pattern`` 筛选
+
+        启用 ``key_index`` 且 ``pattern`` 以固定前缀开头时，如 'user:*'，
+        只读取以该前缀开头的键，结果按字典序排列；否则需要检查所有键
+
+        Args:
+            pattern (str, optional): glob 风格的模式. 默认为 None，表示所有键
 
         Returns:
             List[str]: 由键组成的列表
         '''
+        if self._mapped is not None:
+            self._materialize()
+        db = self._db
+        items: Iterable[Tuple[str, Value]] = db.items()
+        match = None
+        if pattern is not None and pattern != '*':
+            prefix = _glob_prefix(pattern)
+            index = self._key_index
+            if index is not None and prefix:
+                items = [(key, db[key]) for key in index.prefix(prefix)]
+            # 'user:*' 这样的模式，索引取出的键都匹配，无需再逐个检查
+            if index is None or not prefix or pattern != prefix + '*':
+                match = re_compile(translate(pattern)).match
         alive_keys, expired_keys = [], []
-        for key, value in self._db.items():
-            if value.expired:
+        now = monotonic()
+        for key, value in items:
+            if match is not None and not match(key):
+                continue
+            if now >= value.expire_at:
                 expired_keys.append(key)
             else:
                 alive_keys.append(key)
         if expired_keys:
-            self._delete_many(expired_keys)
+            self.stat_expired_keys += self._delete_many(expired_keys)
         return alive_keys
 
+    def scan(
+        self,
+        cursor: int = 0,
+        match: Optional[str] = None,
+        count: int = 10,
+        type: Optional[str] = None
+    ) -> Tuple[int, List[str]]:
+        '''增量地遍历键空间
+
+        以 ``cursor`` 为 0 开始一次遍历，之后每次传入上次返回的游标，
+        返回的游标为 0 时遍历结束。每次调用检查约 ``count`` 个键，
+        返回其中合法且符合条件的键，遍历中途清理遇到的已失效的键
+
+        按键日志中的位置遍历，游标中保存位置和键日志的压缩次数，服务端不保存
+        任何遍历的状态，开始遍历的开销与键的数量无关，同时进行的遍历的数量也不受限制。
+        遍历期间插入和删除键不会影响遍历：整个遍历期间都存在的键一定会被返回；
+        遍历期间键日志被压缩时，位置按换算表向前取整，可能重复返回少量的键，
+        游标过旧（压缩超过 ``SCAN_EPOCHS`` 次）时从头开始；遍历期间新增的键可能会被返回。
+        有映射的快照时，每次调用先在 ``SCAN_MAPPED_TIME`` 内载入快照中剩余的键，
+        全部载入之前不推进遍历，只返回空的结果
+
+        Args:
+            cursor (int, optional): 游标. 默认为 0，表示开始新的遍历
+            match (str, optional): glob 风格的模式，只返回匹配的键. 默认为 None
+            count (int, optional): 每次检查的键的数量. 默认为 10
+            type (str, optional): 只返回值的类型名称为 ``type`` 的键，如 'int'. 默认为 None
+
+        Raises:
+            ValueError: 游标不合法时引发
+
+        Returns:
+            Tuple[int, List[str]]: 下一次的游标，以及本次返回的键
+        '''
+        if count < 1:
+            raise ValueError("'count' must be a positive number")
+        pos, epoch = self._scan_pos(cursor), self._keylog_epoch
+        if self._mapped is not None:
+            pending = self._materialize(monotonic() + SCAN_MAPPED_TIME)
+            pos = self._remap(epoch, pos)  # 载入的键可能使键日志被压缩
+            if pending:
+                return self._scan_cursor(pos), []
+
+        db, log, ret, expired_keys = self._db, self._keylog, [], []
+        end = min(pos + count, len(log))
+        now = monotonic()
+        for seq in range(pos, end):
+            key = log[seq]
+            value = db.get(key)
+            if value is None or value.seq != seq:  # 键日志中的过期条目
+                continue
+            if now >= value.expire_at:
+                expired_keys.append(key)
+                continue
+            if match is not None and not fnmatchcase(key, match):
+                continue
+            if type is not None and _type_name(value.value) != type:
+                continue
+            ret.append(key)
+        if expired_keys:
+            self.stat_expired_keys += self._delete_many(expired_keys)
+
+        if end >= len(log):
+            return 0, ret
+        return self._scan_cursor(end), ret
+
+    def _scan_cursor(self, pos: int) -> int:
+        '''以键日志中的位置生成游标：高位为压缩次数，低位为位置加 1，因此游标不为 0'''
+        return self._keylog_epoch << _SCAN_POS_BITS | (pos + 1)
+
+    def _scan_pos(self, cursor: int) -> int:
+        '''取出游标对应的当前键日志中的位置，游标为 0 时为 0
+
+        Raises:
+            ValueError: 游标不合法时引发
+        '''
+        if cursor == 0:
+            return 0
+        epoch, pos = cursor >> _SCAN_POS_BITS, (cursor & _SCAN_POS_MASK) - 1
+        if cursor < 0 or pos < 0 or epoch > self._keylog_epoch or \
+                (epoch == self._keylog_epoch and pos > len(self._keylog)):
+            raise ValueError('invalid cursor: %r' % cursor)
+        return self._remap(epoch, pos)
+
+    def _remap(self, epoch: int, pos: int) -> int:
+        '''将第 ``epoch`` 次压缩前的位置换算为当前的位置，向前取整，不会跳过任何条目'''
+        remaps = self._keylog_remaps
+        while epoch < self._keylog_epoch:
+            checkpoints = remaps.get(epoch)
+            if checkpoints is None:  # 过旧的游标，从头开始
+                return 0
+            i = pos // SCAN_CHECKPOINT
+            pos = checkpoints[i] if i < len(checkpoints) else 0
+            epoch += 1
+        return pos
+
+    def scan_iter(
+        self,
+        match: Optional[str] = None,
+        count: int = 10,
+        type: Optional[str] = None
+    ) -> Iterator[str]:
+        '''以生成器的形式遍历键空间，参数见 ``scan``'''
+        cursor = 0
+        while True:
+            cursor, keys = self.scan(cursor, match, count, type)
+            yield from keys
+            if not cursor:
+                return
+
     def ttl(self, key: str) -> int:
         '''获取指定键的 TTL
 
@@ -268,6 +835,7 @@ class Core(metaclass=Singleton):
 
         Raises:
             ValueError: 指定键的值非 int 类型时引发
+            OutOfMemoryError: 键的数量达到上限，并且没有可淘汰的键时引发
 
         Returns:
             int: 操作后的值
@@ -309,17 +877,280 @@ class Core(metaclass=Singleton):
         if val is NOT_EXISTS:  # key 失效或不存在
             if ex is None:
                 ex = default_timeout
-            else:
-                self._expiry_key.add(key)
-            self._db[key] = Value(0, ex)
+            val = Value(0, ex)
+            self._store(key, val)
         elif ex is not None:  # key 存在，但需要重设失效时长
-            self._expiry_key.add(key)
-            self._db[key] = Value(val.value, ex)
-        return self._db[key].cre(amount)
+            val = Value(val.value, ex)
+            self._store(key, val)
+        elif self._cow:  # 快照可能仍引用着旧的 Value，换上一个副本再修改
+            new_val = Value(val.value, None)
+            new_val.expire_at, new_val.lru, new_val.seq = val.expire_at, val.lru, val.seq
+            self._db[key] = val = new_val
+        ret = val.cre(amount)
+        self._last_version += 1  # 原地修改，同样需要改变版本号
+        val.version = self._last_version
+        if self._tracking is not None:
+            self._tracking.invalidate(key)
+        return ret
+
+    def flushdb(self, asynchronous: bool = False):
+        '''清除所有存入的键
+
+        ``asynchronous`` 为 True 时，直接换上空的 dict，原有的数据交给
+        后台线程释放，耗时与键的数量无关
+
+        Args:
+            asynchronous (bool, optional): 是否在后台释放. 默认为 False
+        '''
+        if asynchronous:
+            lazyfree = LazyFree()
+            db, self._db = self._db, {}
+            expires, self._expires = self._expires, []
+            log, self._keylog = self._keylog, []
+            lazyfree.free(db, owned=True)
+            lazyfree.free(expires, owned=True)
+            lazyfree.free(log, owned=True)
+        else:
+            self._db.clear()
+            self._expires.clear()
+            self._keylog.clear()
+        self._volatile_keys = 0
+        self._next_keylog_epoch([])  # 之前的游标都从头开始
+        if self._key_index is not None:
+            self._key_index.clear()
+        if self._tracking is not None:
+            self._tracking.invalidate_all()
+        self._bury_all()
+        self._policy.reset()
+        self._detach()
+
+    def _items(self) -> List[Tuple[str, Value]]:
+        '''所有键值对的副本，有映射的快照时先载入其中剩余的键'''
+        if self._mapped is not None:
+            self._materialize()
+        return list(self._db.items())
+
+    def save(self, path: str) -> int:
+        '''将所有键保存为快照文件，见 ``pydis.rdb``
+
+        Returns:
+            int: 保存的键的数量
+        '''
+        return rdb.save(self._items(), path)
+
+    def save_mapped(self, path: str) -> int:
+        '''将所有键保存为可以映射的快照文件，见 ``pydis.mapped`` 和 ``attach``
+
+        Returns:
+            int: 保存的键的数量
+        '''
+        return mapped.write(self._items(), path)
+
+    def attach(self, path: str) -> int:
+        '''映射 ``save_mapped`` 保存的快照文件，应在启动时、存入任何键之前调用
+
+        映射只读取文件头，之后立即可以读写：键在第一次被访问时才从文件中
+        反序列化，其余的键由 ``_materialize`` 逐步载入，Server 在服务线程的
+        空闲时间里载入。需要所有键的操作（keys、scan、delete_prefix、save 等）
+        会先载入剩余的键。映射之后写入或删除的键不会再从文件中载入，
+        已经失效的键会被跳过，载入的键不受 ``maxkeys`` 的限制
+
+        Raises:
+            RuntimeError: 已经存有键时引发
+            RdbError: 文件不是可以映射的快照或已损坏时引发
+
+        Returns:
+            int: 文件中的键的数量
+        '''
+        if self._db or self._mapped is not None:
+            raise RuntimeError('can only attach a snapshot to an empty database')
+        snapshot = MappedSnapshot(path)
+        self._attach(snapshot)
+        return snapshot.count
+
+    def _attach(
+        self,
+        snapshot: MappedSnapshot,
+        owns: Optional[Callable[[str], bool]] = None
+    ):
+        self._mapped = snapshot
+        self._mapped_seen = set()
+        self._mapped_pos = 0
+        self._mapped_owns = owns
+
+    def _detach(self):
+        '''不再从快照中载入键，快照由最后一个引用它的分片释放'''
+        self._mapped = None
+        self._mapped_seen = set()
+        self._mapped_owns = None
+
+    @property
+    def mapped_pending(self) -> bool:
+        '''映射的快照中是否还有没有载入的键'''
+        return self._mapped is not None
+
+    def _fault(self, key: str) -> Optional[Value]:
+        '''从映射的快照中载入 ``key``，不存在、已失效或已经载入过时返回 None'''
+        seen = self._mapped_seen
+        if key in seen:
+            return None
+        seen.add(key)
+        found = self._mapped.lookup(key)  # type: ignore
+        if found is None:
+            return None
+        val, expire_at = found
+        now = monotonic()
+        if expire_at != INF:
+            expire_at += now - time()
+            if expire_at <= now:
+                return None
+        return self._restore(key, val, expire_at)
+
+    def _restore(self, key: str, val: Any, expire_at: float) -> Value:
+        '''存入从快照中载入的键，``expire_at`` 为 monotonic 时钟读数'''
+        value = Value.__new__(Value)
+        value.value, value.expire_at, value.lru = val, expire_at, 0
+        self._last_version += 1
+        value.version = self._last_version
+        if self.maxkeys is not None:
+            self._policy.init(value)
+        if self._key_index is not None:
+            self._key_index.add(key)
+        value.seq = len(self._keylog)
+        self._keylog.append(key)
+        self._db[key] = value
+        if expire_at != INF:
+            self._add_expiry(key, expire_at)
+            self._volatile_keys += 1
+        self._check_keylog()
+        return value
+
+    def _materialize(self, deadline: float = INF) -> bool:
+        '''从上次的进度开始载入映射的快照中的键，超过 ``deadline`` 时退出
+
+        每检查 ``MAPPED_STEP`` 个槽位检查一次时钟，全部载入后不再映射快照
 
-    def flushdb(self):
-        '''清除所有存入的键'''
-        self._db.clear()
+        Returns:
+            bool: 是否还有没有载入的键
+        '''
+        snapshot = self._mapped
+        if snapshot is None:
+            return False
+        pos, slots = self._mapped_pos, snapshot.slots
+        with rdb.gc_paused():
+            while pos < slots:
+                self._restore_entries(snapshot.entries(pos, pos + MAPPED_STEP))
+                pos += MAPPED_STEP
+                if pos < slots and monotonic() >= deadline:
+                    self._mapped_pos = pos
+                    return True
+        self._detach()
+        return False
+
+    def _restore_entries(self, entries: Iterable[Tuple[str, int, int, float]]) -> int:
+        '''载入 ``MappedSnapshot.entries`` 取出的键，跳过已经载入过的键，返回载入的键的数量'''
+        snapshot = self._mapped
+        if snapshot is None:
+            return 0
+        seen, owns = self._mapped_seen, self._mapped_owns
+        db, expires, index = self._db, self._expires, self._key_index
+        log = self._keylog
+        init = self._policy.init if self.maxkeys is not None else None
+        loads, new = snapshot.value, Value.__new__
+        now = monotonic()
+        offset = now - time()
+        version = self._last_version
+        count = volatile = 0
+        for key, start, length, expire_at in entries:
+            if key in seen or (owns is not None and not owns(key)):
+                continue
+            seen.add(key)
+            if expire_at != INF:
+                expire_at += offset
+                if expire_at <= now:
+                    continue
+                heappush(expires, (expire_at, key))
+                volatile += 1
+            value = new(Value)
+            value.value, value.expire_at, value.lru = loads(start, length), expire_at, 0
+            version += 1
+            value.version = version
+            if init is not None:
+                init(value)
+            if index is not None:
+                index.add(key)
+            value.seq = len(log)
+            log.append(key)
+            db[key] = value
+            count += 1
+        self._last_version = version
+        self._volatile_keys += volatile
+        self._check_keylog()
+        return count
+
+    def load(self, path: str) -> int:
+        '''载入快照文件，覆盖同名的键，已经失效的键会被跳过
+
+        先读取并校验整个文件，文件损坏时不会载入任何键。
+        载入时直接填充 ``Value`` 的属性，不经过 ``Value.__init__`` 和 ``_store``，
+        也不受 ``maxkeys`` 的限制
+
+        Raises:
+            RdbError: 文件不是快照或已损坏时引发
+
+        Returns:
+            int: 载入的键的数量
+        '''
+        with rdb.gc_paused():
+            with open(path, 'rb') as f:
+                batches = list(rdb.load(f))
+            return self._load_batches(batches)
+
+    def _load_batches(self, batches: Iterable[List[rdb.EntryT]]) -> int:
+        if self._mapped is not None:
+            self._materialize()
+        db, index, log, tracking = self._db, self._key_index, self._keylog, self._tracking
+        expires: List[Tuple[float, str]] = []
+        init = self._policy.init if self.maxkeys is not None else None
+        new = Value.__new__
+        now = monotonic()
+        offset = now - time()
+        version = self._last_version
+        count = 0
+        for batch in batches:
+            for key, val, expire_at in batch:
+                if expire_at != INF:
+                    expire_at += offset
+                    if expire_at <= now:
+                        continue
+                    expires.append((expire_at, key))
+                value = new(Value)
+                value.value, value.expire_at, value.lru = val, expire_at, 0
+                old = db.get(key)
+                if old is None:
+                    if index is not None:
+                        index.add(key)
+                    value.seq = len(log)
+                    log.append(key)
+                else:
+                    value.seq = old.seq
+                    if old.expire_at != INF:
+                        self._volatile_keys -= 1
+                if tracking is not None:  # 客户端可能缓存了旧的值，或键不存在的结果
+                    tracking.invalidate(key)
+                version += 1
+                value.version = version
+                if init is not None:
+                    init(value)
+                db[key] = value
+                count += 1
+        self._last_version = version
+        self._volatile_keys += len(expires)
+        self._check_keylog()
+        if expires:
+            self._expires.extend(expires)
+            heapify(self._expires)
+        return count
 
     def expire(self, key: str, time: Union[int, timedelta],
                nx: bool = False, xx: bool = False) -> bool:
@@ -350,6 +1181,9 @@ class Core(metaclass=Singleton):
             return False
         if xx and not val.expiry:
             return False
-        self._expiry_key.add(key)
-        self._db[key] = Value(val.value, time)
+        self._store(key, Value(val.value, time))
         return True
+
+
+class Core(BaseCore, metaclass=Singleton):
+    '''单例的 BaseCore，见 ``BaseCore``'''
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+'''键数量达到上限时的淘汰策略
+
+仿照 redis 的近似 LRU/LFU：每次随机抽取少量候选键，按策略打分后放入
+一个小的淘汰池，从池中淘汰得分最高的键。访问信息以一个整数保存在
+``Value.lru`` 中：
+
+- LRU 策略下为最近一次访问的时刻（毫秒）
+- LFU 策略下高 16 位为最近一次衰减的时刻（分钟），低 8 位为对数访问计数
+'''
+
+from bisect import insort
+from copy import copy
+from heapq import heappop
+from random import random, randrange
+from time import monotonic
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple, Type, Union
+
+from .value import INF, Value
+
+if TYPE_CHECKING:
+    from .core import Core
+
+EVPOOL_SIZE = 16       # 淘汰池的大小
+SAMPLE_TRIES = 8       # 抽样时每个键最多尝试的次数
+LFU_INIT_VAL = 5       # 新键的访问计数，避免新键刚存入就被淘汰
+LFU_LOG_FACTOR = 10    # 访问计数增长的对数因子
+LFU_DECAY_TIME = 1     # 访问计数每衰减 1 所需的分钟数
+
+
+def lru_clock() -> int:
+    '''LRU 时钟，以毫秒计'''
+    return int(monotonic() * 1000)
+
+
+def lfu_clock() -> int:
+    '''LFU 时钟，以分钟计，只保留低 16 位'''
+    return int(monotonic() / 60) & 0xFFFF
+
+
+def lfu_decr(lru: int) -> int:
+    '''按距上次衰减经过的时长衰减访问计数，返回衰减后的计数'''
+    counter = lru & 0xFF
+    if LFU_DECAY_TIME:
+        periods = ((lfu_clock() - (lru >> 8)) & 0xFFFF) // LFU_DECAY_TIME
+        if periods:
+            counter = counter - periods if counter > periods else 0
+    return counter
+
+
+def lfu_log_incr(counter: int) -> int:
+    '''以对数概率增加访问计数，计数越大越难增长，最大为 255'''
+    if counter == 255:
+        return 255
+    baseval = counter - LFU_INIT_VAL
+    if baseval < 0:
+        baseval = 0
+    if random() < 1.0 / (baseval * LFU_LOG_FACTOR + 1):
+        counter += 1
+    return counter
+
+
+class KeySampler:
+    '''从键空间中随机抽取键
+
+    dict 不支持 O(1) 的随机访问，因此在 ``Core`` 的键日志（只抽取会失效的键时
+    为失效索引）中按随机位置抽取，跳过其中的过期条目，不需要复制键。
+    两者的过期条目通常不超过有效条目的数量，抽取一个键的期望开销为常数；
+    过期条目过多导致命中率太低时，压缩后重新抽取
+    '''
+
+    def __init__(self, volatile: bool = False) -> None:
+        self.volatile = volatile
+
+    def sample(self, core: 'Core', count: int) -> List[str]:
+        '''抽取至多 ``count`` 个不重复的、仍然存在的键，键空间为空时返回空列表'''
+        count = min(count, len(core._db))
+        pick = self._pick_volatile if self.volatile else self._pick
+        ret: List[str] = []
+        seen: Set[str] = set()
+        for retry in (False, True):
+            tries = count * SAMPLE_TRIES
+            misses = 0
+            while len(ret) < count and tries:
+                tries -= 1
+                key = pick(core)
+                if key is None:
+                    misses += 1
+                elif key not in seen:
+                    seen.add(key)
+                    ret.append(key)
+            # 没有抽够，并且多数尝试落在了过期条目上
+            if len(ret) >= count or retry or misses * 2 <= count * SAMPLE_TRIES:
+                break
+            if self.volatile:
+                core._rebuild_expires()
+            else:
+                core._compact_keylog()
+        return ret
+
+    @staticmethod
+    def _pick(core: 'Core') -> Optional[str]:
+        log = core._keylog
+        if not log:
+            return None
+        seq = randrange(len(log))
+        key = log[seq]
+        value = core._db.get(key)
+        if value is None or value.seq != seq:
+            return None
+        return key
+
+    @staticmethod
+    def _pick_volatile(core: 'Core') -> Optional[str]:
+        expires = core._expires
+        if not expires:
+            return None
+        expire_at, key = expires[randrange(len(expires))]
+        value = core._db.get(key)
+        if value is None or value.expire_at != expire_at:
+            return None
+        return key
+
+
+class EvictionPolicy:
+    '''淘汰策略的基类
+
+    子类通过 ``init`` 和 ``touch`` 维护 ``Value.lru`` 中的访问信息，
+    通过 ``score`` 为候选键打分，得分越高越先被淘汰。
+    ``select`` 返回 None 表示没有可淘汰的键
+
+    Attributes:
+        name (str): 策略名称
+        volatile (bool): 是否只淘汰会失效的键
+        samples (int): 每次淘汰时抽样的键的数量
+    '''
+    name = ''
+    volatile = False
+
+    def __init__(self, samples: int = 5) -> None:
+        self.samples = samples
+        self.sampler = KeySampler(self.volatile)
+        self.pool: List[Tuple[float, str]] = []
+
+    def init(self, value: Value):
+        '''新值存入时调用'''
+
+    def touch(self, value: Value):
+        '''值被访问时调用'''
+
+    def score(self, value: Value) -> float:
+        '''候选键的得分，默认为随机数，即在抽取的键中随机淘汰'''
+        return random()
+
+    def select(self, core: 'Core') -> Optional[str]:
+        db, pool = core._db, self.pool
+        for key in self.sampler.sample(core, self.samples):
+            score = self.score(db[key])
+            if len(pool) >= EVPOOL_SIZE:
+                if score <= pool[0][0]:
+                    continue
+                del pool[0]
+            for i, (_, k) in enumerate(pool):
+                if k == key:
+                    del pool[i]
+                    break
+            insort(pool, (score, key))
+        while pool:
+            _, key = pool.pop()
+            if key in db:
+                return key
+        return None
+
+    def reset(self):
+        '''键空间被清空时调用'''
+
+    def clone(self) -> 'EvictionPolicy':
+        '''复制出设置相同的新实例，抽样器和淘汰池重新创建，见 ``ShardedCore.maxkeys_policy``
+
+        子类带有其他会在淘汰时改变的状态时，需要覆盖此方法
+        '''
+        policy = copy(self)
+        policy.sampler = KeySampler(self.volatile)
+        policy.pool = []
+        return policy
+        self.pool.clear()
+
+
+class NoEviction(EvictionPolicy):
+    '''不淘汰任何键，达到上限时写入操作引发 OutOfMemoryError'''
+    name = 'noeviction'
+
+    def select(self, core: 'Core') -> Optional[str]:
+        return None
+
+
+class AllKeysLRU(EvictionPolicy):
+    '''淘汰最久没有被访问的键'''
+    name = 'allkeys-lru'
+
+    def init(self, value: Value):
+        value.lru = lru_clock()
+
+    touch = init
+
+    def score(self, value: Value) -> float:
+        return lru_clock() - value.lru
+
+
+class AllKeysLFU(EvictionPolicy):
+    '''淘汰访问频率最低的键'''
+    name = 'allkeys-lfu'
+
+    def init(self, value: Value):
+        value.lru = (lfu_clock() << 8) | LFU_INIT_VAL
+
+    def touch(self, value: Value):
+        counter = lfu_log_incr(lfu_decr(value.lru))
+        value.lru = (lfu_clock() << 8) | counter
+
+    def score(self, value: Value) -> float:
+        return 255 - lfu_decr(value.lru)
+
+
+class AllKeysRandom(EvictionPolicy):
+    '''随机淘汰键'''
+    name = 'allkeys-random'
+
+    def select(self, core: 'Core') -> Optional[str]:
+        keys = self.sampler.sample(core, 1)
+        return keys[0] if keys else None
+
+
+class VolatileLRU(AllKeysLRU):
+    '''在会失效的键中淘汰最久没有被访问的键'''
+    name = 'volatile-lru'
+    volatile = True
+
+
+class VolatileLFU(AllKeysLFU):
+    '''在会失效的键中淘汰访问频率最低的键'''
+    name = 'volatile-lfu'
+    volatile = True
+
+
+class VolatileRandom(EvictionPolicy):
+    '''在会失效的键中随机淘汰'''
+    name = 'volatile-random'
+    volatile = True
+
+    def select(self, core: 'Core') -> Optional[str]:
+        keys = self.sampler.sample(core, 1)
+        return keys[0] if keys else None
+
+
+class VolatileTTL(EvictionPolicy):
+    '''淘汰最先失效的键
+
+    失效索引本身以失效时刻排序，因此无需抽样，直接取堆顶
+    '''
+    name = 'volatile-ttl'
+    volatile = True
+
+    def select(self, core: 'Core') -> Optional[str]:
+        db, expires = core._db, core._expires
+        while expires:
+            expire_at, key = heappop(expires)
+            value = db.get(key)
+            if value is not None and value.expire_at == expire_at:
+                return key
+        return None
+
+
+POLICIES: Dict[str, Type[EvictionPolicy]] = {
+    policy.name: policy for policy in (
+        NoEviction,
+        AllKeysLRU,
+        AllKeysLFU,
+        AllKeysRandom,
+        VolatileLRU,
+        VolatileLFU,
+        VolatileRandom,
+        VolatileTTL,
+    )
+}
+
+
+def get_policy(policy: Union[str, EvictionPolicy]) -> EvictionPolicy:
+    '''通过名称获取淘汰策略，也可以直接传入 EvictionPolicy 的实例
+
+    Raises:
+        ValueError: 策略名称未知时引发
+    '''
+    if isinstance(policy, EvictionPolicy):
+        return policy
+    try:
+        return POLICIES[policy]()
+    except KeyError:
+        raise ValueError('unknown eviction policy: %s' % policy) from None
@@ -6,6 +6,27 @@ class ReceiveTimeout(Exception):
 
 class ConnectionClosedError(Exception):
     '''连接被关闭'''
-    
+
+
+class PoolTimeout(Exception):
+    '''等待连接池中的空闲连接超时'''
+
+
 class ServerStopped(Exception):
     '''服务已被关闭'''
+
+
+class OutOfMemoryError(Exception):
+    '''键的数量达到上限，并且没有可以淘汰的键'''
+
+
+class WatchError(Exception):
+    '''事务监视的键在执行前被修改，事务被放弃'''
+
+
+class RdbError(Exception):
+    '''快照文件不合法或已损坏'''
+
+
+class AofError(Exception):
+    '''命令日志文件不合法或已损坏'''
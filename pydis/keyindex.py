@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+'''按字典序排列的键索引
+
+键分块保存在若干个有序列表中，``_maxes`` 保存每块的最大键，
+先二分定位块，再在块内二分。插入和删除只移动一块内的元素，
+块的长度超过 ``2 * CHUNK_SIZE`` 时一分为二
+
+取出某个前缀下的所有键只需定位到第一个不小于前缀的键，
+之后顺序读取到不以前缀开头的键为止，耗时与匹配的键的数量成正比
+'''
+
+from bisect import bisect_left
+from typing import Iterable, Iterator, List
+
+CHUNK_SIZE = 512
+
+
+class KeyIndex:
+    '''按字典序排列的键的集合，键必须为 str'''
+
+    def __init__(self, keys: Iterable[str] = ()) -> None:
+        keys = sorted(keys)
+        self._chunks: List[List[str]] = [
+            keys[i:i + CHUNK_SIZE] for i in range(0, len(keys), CHUNK_SIZE)
+        ]
+        self._maxes: List[str] = [chunk[-1] for chunk in self._chunks]
+        self._len = len(keys)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[str]:
+        for chunk in self._chunks:
+            yield from chunk
+
+    def __contains__(self, key: str) -> bool:
+        maxes = self._maxes
+        i = bisect_left(maxes, key)
+        if i == len(maxes):
+            return False
+        chunk = self._chunks[i]
+        j = bisect_left(chunk, key)
+        return chunk[j] == key
+
+    def add(self, key: str) -> bool:
+        '''加入 ``key``，返回是否为新加入的键'''
+        chunks, maxes = self._chunks, self._maxes
+        if not maxes:
+            chunks.append([key])
+            maxes.append(key)
+            self._len = 1
+            return True
+        i = bisect_left(maxes, key)
+        if i == len(maxes):  # 比所有键都大，追加到最后一块
+            i -= 1
+            chunk = chunks[i]
+            chunk.append(key)
+            maxes[i] = key
+        else:
+            chunk = chunks[i]
+            j = bisect_left(chunk, key)
+            if chunk[j] == key:
+                return False
+            chunk.insert(j, key)
+        self._len += 1
+        if len(chunk) > 2 * CHUNK_SIZE:
+            chunks[i:i + 1] = [chunk[:CHUNK_SIZE], chunk[CHUNK_SIZE:]]
+            maxes[i:i + 1] = [chunk[CHUNK_SIZE - 1], chunk[-1]]
+        return True
+
+    def discard(self, key: str) -> bool:
+        '''移除 ``key``，返回 ``key`` 是否在索引中'''
+        chunks, maxes = self._chunks, self._maxes
+        i = bisect_left(maxes, key)
+        if i == len(maxes):
+            return False
+        chunk = chunks[i]
+        j = bisect_left(chunk, key)
+        if chunk[j] != key:
+            return False
+        del chunk[j]
+        self._len -= 1
+        if not chunk:
+            del chunks[i]
+            del maxes[i]
+        elif j == len(chunk):
+            maxes[i] = chunk[-1]
+        return True
+
+    def prefix(self, prefix: str) -> List[str]:
+        '''以 ``prefix`` 开头的所有键，按字典序排列'''
+        chunks, maxes = self._chunks, self._maxes
+        i = bisect_left(maxes, prefix)
+        if i == len(maxes):
+            return []
+        ret: List[str] = []
+        j = bisect_left(chunks[i], prefix)
+        for i in range(i, len(chunks)):
+            chunk = chunks[i]
+            if chunk[-1].startswith(prefix):  # 整块都以前缀开头
+                ret.extend(chunk[j:] if j else chunk)
+            else:
+                for key in chunk[j:]:
+                    if not key.startswith(prefix):
+                        return ret
+                    ret.append(key)
+                return ret
+            j = 0
+        return ret
+
+    def clear(self):
+        self._chunks.clear()
+        self._maxes.clear()
+        self._len = 0
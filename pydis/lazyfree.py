@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+'''惰性释放
+
+仿照 redis 的 lazyfree：删除大的值或清空整个数据库时，调用方的线程只摘下引用，
+真正的释放交给后台线程，命令的耗时与被删除的数据的大小无关
+
+清空数据库时交给后台线程的是整个 dict，后台线程逐个弹出其中的键值对，
+两次弹出之间解释器可以切换回其他线程，不会一次性长时间占用 GIL。
+用户存入的值可能仍被用户持有，不会被原地修改，单个大的值的释放仍是一次完成的
+
+释放的工作量不超过 ``LAZYFREE_THRESHOLD`` 的对象直接在调用方的线程中释放，
+交给后台线程反而更慢
+'''
+
+from queue import SimpleQueue
+from threading import Lock, Thread
+from time import monotonic, sleep
+from typing import Any
+
+from .utils import Singleton
+from .value import Value
+
+LAZYFREE_THRESHOLD = 64
+'''释放的工作量超过此值时才交给后台线程'''
+
+
+def free_effort(obj: Any) -> int:
+    '''释放 ``obj`` 的工作量，容器为元素的数量，其他对象为 1'''
+    if isinstance(obj, Value):
+        obj = obj.value
+    if isinstance(obj, (dict, list, set)):
+        return len(obj)
+    return 1
+
+
+class LazyFree(metaclass=Singleton):
+    '''后台释放对象的线程，所有实例共享
+
+    Attributes:
+        pending (int): 等待释放的对象的数量
+        freed (int): 后台线程已经释放的对象的数量
+    '''
+
+    def __init__(self) -> None:
+        self.pending = 0
+        self.freed = 0
+        self._mutex = Lock()
+        self._queue: SimpleQueue = SimpleQueue()
+        Thread(target=self._run, name='pydis-lazyfree', daemon=True).start()
+
+    def free(self, obj: Any, owned: bool = False) -> bool:
+        '''释放 ``obj``，工作量较大时交给后台线程，返回是否交给了后台线程
+
+        ``owned`` 为 True 表示 ``obj`` 是 pydis 内部的容器（如整个 dict），
+        后台线程会逐个弹出其中的元素。调用方不能再使用 ``obj``
+        '''
+        if free_effort(obj) <= LAZYFREE_THRESHOLD:
+            return False
+        with self._mutex:
+            self.pending += 1
+        self._queue.put((obj, owned))
+        return True
+
+    def _run(self):
+        queue = self._queue
+        while True:
+            obj, owned = queue.get()
+            if owned:
+                pop = obj.popitem if isinstance(obj, dict) else obj.pop
+                while obj:
+                    pop()
+            del obj
+            with self._mutex:
+                self.pending -= 1
+                self.freed += 1
+
+    def wait(self, timeout: float = 1.0) -> bool:
+        '''等待所有对象释放完毕，返回是否在 ``timeout`` 秒内完成'''
+        deadline = monotonic() + timeout
+        while self.pending:
+            if monotonic() >= deadline:
+                return False
+            sleep(0.001)
+        return True
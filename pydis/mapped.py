@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+'''可以直接 mmap 的快照格式
+
+与 ``pydis.rdb`` 不同，本格式不需要在使用前读取整个文件：文件末尾是一张
+开放寻址的哈希表，按键查找只需读取几个槽位，值在第一次访问时才被反序列化。
+启动时映射文件后即可提供服务，其余的键可以在空闲时逐步载入
+
+文件布局，数值均为小端序：
+
+- 文件头: 魔数 ``MAPPED_MAGIC``、格式版本（uint16）、键的数量（uint64）、
+  哈希表的偏移（uint64）、哈希表的槽位数（uint64，2 的幂）
+- 数据区: 每个键依次为 utf-8 编码的键和 pickle 后的值
+- 哈希表: 每个槽位为键的 crc32（uint32）、键的长度（uint32）、
+  键在文件中的偏移（uint64，0 表示空槽位）、值的长度（uint32）、
+  失效时刻（unix 时间戳，double，永不失效为 INF）。冲突时线性探测
+'''
+
+import mmap
+import os
+import pickle
+from struct import Struct
+from threading import get_ident
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+from zlib import crc32
+
+from . import rdb
+from .exceptions import RdbError
+from .value import Value
+
+MAPPED_MAGIC = b'PYDISMAP'
+MAPPED_VERSION = 1
+
+_HEADER = Struct('<8sHQQQ')
+_SLOT = Struct('<IIQId')
+
+
+def write(items: Iterable[Tuple[str, Value]], path: str) -> int:
+    '''将 ``items`` 保存到 ``path``，已经失效的键会被跳过，返回写入的键的数量
+
+    与 ``rdb.save`` 相同，先写入临时文件，完成后再替换 ``path``
+    '''
+    tmp = '%s.tmp-%d-%d' % (path, os.getpid(), get_ident())
+    dumps, protocol = pickle.dumps, pickle.HIGHEST_PROTOCOL
+    slots: List[Tuple[int, int, int, int, float]] = []
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(bytes(_HEADER.size))  # 最后再写入文件头
+            offset = _HEADER.size
+            for batch in rdb.entries(items):
+                chunk = []
+                for key, value, expire_at in batch:
+                    key_bytes = key.encode('utf-8', 'surrogatepass')
+                    data = dumps(value, protocol)
+                    slots.append((
+                        crc32(key_bytes), len(key_bytes), offset, len(data), expire_at))
+                    chunk.append(key_bytes)
+                    chunk.append(data)
+                    offset += len(key_bytes) + len(data)
+                f.write(b''.join(chunk))
+            size = 1
+            while size < 2 * len(slots):
+                size <<= 1
+            table = bytearray(size * _SLOT.size)
+            mask, unpack_from, pack_into = size - 1, _SLOT.unpack_from, _SLOT.pack_into
+            for slot in slots:
+                i = slot[0] & mask
+                while unpack_from(table, i * _SLOT.size)[2]:
+                    i = (i + 1) & mask
+                pack_into(table, i * _SLOT.size, *slot)
+            f.write(table)
+            f.seek(0)
+            f.write(_HEADER.pack(MAPPED_MAGIC, MAPPED_VERSION, len(slots), offset, size))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return len(slots)
+
+
+class MappedSnapshot:
+    '''映射到内存中的快照，只读
+
+    Attributes:
+        count (int): 快照中的键的数量
+    '''
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # 空文件
+                raise RdbError('truncated header') from None
+        if len(self._mm) < _HEADER.size:
+            self.close()
+            raise RdbError('truncated header')
+        magic, version, count, table, size = _HEADER.unpack_from(self._mm)
+        if magic != MAPPED_MAGIC:
+            self.close()
+            raise RdbError('not a pydis mapped snapshot')
+        if version > MAPPED_VERSION or table + size * _SLOT.size > len(self._mm):
+            self.close()
+            raise RdbError('unsupported or truncated mapped snapshot')
+        self.count = count
+        self._table = table
+        self._size = size
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def slots(self) -> int:
+        '''哈希表的槽位数'''
+        return self._size
+
+    def lookup(self, key: str) -> Optional[Tuple[Any, float]]:
+        '''查找 ``key``，返回 (值, 失效时刻)，不存在时返回 None'''
+        key_bytes = key.encode('utf-8', 'surrogatepass')
+        h = crc32(key_bytes)
+        mm, table, mask = self._mm, self._table, self._size - 1
+        unpack_from, slot_size = _SLOT.unpack_from, _SLOT.size
+        i = h & mask
+        while True:
+            slot_hash, key_len, offset, value_len, expire_at = unpack_from(
+                mm, table + i * slot_size)
+            if not offset:
+                return None
+            if slot_hash == h and key_len == len(key_bytes) and \
+                    mm[offset:offset + key_len] == key_bytes:
+                start = offset + key_len
+                return pickle.loads(mm[start:start + value_len]), expire_at
+            i = (i + 1) & mask
+
+    def entries(self, start: int, stop: int) -> Iterator[Tuple[str, int, int, float]]:
+        '''哈希表中 [start, stop) 范围内的非空槽位，元素为 (键, 值的偏移, 值的长度, 失效时刻)'''
+        mm, table = self._mm, self._table
+        stop = min(stop, self._size)
+        if start >= stop:
+            return
+        slots = mm[table + start * _SLOT.size:table + stop * _SLOT.size]
+        for _, key_len, offset, value_len, expire_at in _SLOT.iter_unpack(slots):
+            if offset:
+                key = mm[offset:offset + key_len].decode('utf-8', 'surrogatepass')
+                yield key, offset + key_len, value_len, expire_at
+
+    def value(self, offset: int, length: int) -> Any:
+        '''反序列化 ``offset`` 处的值'''
+        return pickle.loads(self._mm[offset:offset + length])
+
+    def close(self):
+        self._mm.close()
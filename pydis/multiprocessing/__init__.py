@@ -0,0 +1,2 @@
+from .client import ConnectionPool, PydisClient as Pydis
+from .server import serve, start_server
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+'''启动服务进程
+
+    python -m pydis.multiprocessing [--path PATH] [--snapshot FILE] [--resp HOST:PORT|PATH]
+'''
+
+import argparse
+import logging
+
+from .connection import DEFAULT_PATH
+from .server import serve
+
+parser = argparse.ArgumentParser(prog='python -m pydis.multiprocessing')
+parser.add_argument('--path', default=DEFAULT_PATH, help='监听的 Unix 套接字路径')
+parser.add_argument('--mode', default='600', help='套接字文件的权限，八进制')
+parser.add_argument('--snapshot', help='启动时映射、退出前保存的快照文件')
+parser.add_argument('--resp', help='RESP 协议的监听地址，HOST:PORT 或 Unix 套接字路径')
+args = parser.parse_args()
+resp = args.resp
+if resp is not None and '/' not in resp:
+    host, _, port = resp.rpartition(':')
+    resp = (host.strip('[]') or '127.0.0.1', int(port))
+logging.basicConfig(level=logging.INFO)
+serve(args.path, mode=int(args.mode, 8), snapshot=args.snapshot, resp=resp)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+from functools import partial
+from typing import Optional, Union
+
+from ..multithreading import client, pool
+from .connection import DEFAULT_PATH, SocketConnection, connect
+
+
+class ConnectionPool(pool.ConnectionPool):
+    '''到服务进程的连接池，见 ``pydis.multithreading.ConnectionPool``
+
+    eg:
+        pool = ConnectionPool(max_connections=4, path='/run/pydis.sock')
+        client = PydisClient(connection_pool=pool)  # 可以在线程间共享
+    '''
+
+    def __init__(
+        self,
+        max_connections: int = 8,
+        timeout: Optional[float] = None,
+        path: str = DEFAULT_PATH
+    ) -> None:
+        super().__init__(max_connections, timeout, partial(connect, path))
+        self.path = path
+
+
+class PydisClient(client.PydisClient):
+    '''连接到服务进程的客户端，服务进程见 ``pydis.multiprocessing.server``
+
+    接口与 ``pydis.multithreading.PydisClient`` 相同，多个进程可以通过
+    监听 ``path`` 的同一个服务进程共享数据。值和参数需要能被 pickle，
+    服务进程和客户端需使用相同版本的 Python
+
+    eg:
+        client = PydisClient(path='/run/pydis.sock')
+        client.set('key', 'val')
+        client = PydisClient(path='/run/pydis.sock', client_cache=10000)
+
+    Attributes:
+        path (str): 服务进程监听的 Unix 套接字路径
+    '''
+
+    def __init__(
+        self,
+        default_timout: Optional[Union[float, timedelta]] = None,
+        connection_pool: Optional[pool.ConnectionPool] = None,
+        path: str = DEFAULT_PATH,
+        client_cache: int = 0
+    ) -> None:
+        self.path = path
+        super().__init__(default_timout, connection_pool, client_cache)
+
+    def _open_connection(self) -> SocketConnection:
+        return connect(self.path)
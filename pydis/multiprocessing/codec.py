@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+'''消息的编码和分帧
+
+每条消息编码为一帧：数据长度（uint32）、编码方式（uint8）和数据，数值为小端序。
+只由内置类型（str、int、tuple、dict 等）组成的消息以 marshal 编码，
+比 pickle 快数倍；其他消息（如自定义类的值、异常）以 pickle 编码
+
+marshal 的格式随 Python 版本变化，服务进程和客户端需使用相同版本的 Python
+'''
+
+import marshal
+import pickle
+from struct import Struct
+from typing import Any, List
+
+MARSHAL = 0
+PICKLE = 1
+MAX_FRAME_SIZE = 512 * 1024 * 1024
+'''单帧数据长度的上限，超出时视为协议错误'''
+
+_FRAME = Struct('<IB')
+_LOADS = (marshal.loads, pickle.loads)
+
+
+def encode(obj: Any) -> bytes:
+    '''将 ``obj`` 编码为一帧'''
+    try:
+        data = marshal.dumps(obj)
+        codec = MARSHAL
+    except ValueError:  # 含有 marshal 不支持的对象
+        data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        codec = PICKLE
+    return _FRAME.pack(len(data), codec) + data
+
+
+class FrameDecoder:
+    '''增量地从字节流中解码消息
+
+    收到的数据追加到缓冲区中，每次取出所有完整的帧，不完整的帧留待下次，
+    解码直接读取缓冲区的 memoryview，不复制帧的数据
+    '''
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+
+    def __len__(self) -> int:
+        '''缓冲区中未解码的字节数'''
+        return len(self._buf)
+
+    def feed(self, data: bytes) -> List[Any]:
+        '''追加收到的数据，返回其中完整的消息
+
+        Raises:
+            ValueError: 帧的长度超过 ``MAX_FRAME_SIZE`` 或编码方式未知时引发
+        '''
+        buf = self._buf
+        buf += data
+        size, unpack_from = _FRAME.size, _FRAME.unpack_from
+        ret: List[Any] = []
+        pos, end = 0, len(buf)
+        with memoryview(buf) as view:
+            while end - pos >= size:
+                length, codec = unpack_from(buf, pos)
+                if length > MAX_FRAME_SIZE or codec >= len(_LOADS):
+                    raise ValueError('invalid frame: length %d, codec %d' % (length, codec))
+                stop = pos + size + length
+                if stop > end:
+                    break
+                ret.append(_LOADS[codec](view[pos + size:stop]))
+                pos = stop
+        if pos:
+            del buf[:pos]
+        return ret
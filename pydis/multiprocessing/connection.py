@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+import socket
+from collections import deque
+from itertools import count
+from time import monotonic
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from ..exceptions import ConnectionClosedError, ReceiveTimeout
+from ..multithreading.connection import Connection
+from ..multithreading.typing import MessageT, ResponseT
+from .codec import FrameDecoder, encode
+
+DEFAULT_PATH = '/tmp/pydis.sock'
+'''服务进程默认监听的 Unix 套接字路径'''
+
+RECV_SIZE = 256 * 1024
+
+
+class SocketConnection(Connection):
+    '''到服务进程的连接，基于 Unix 套接字
+
+    接口与 ``pydis.multithreading.connection.Connection`` 相同，
+    消息的编码见 ``pydis.multiprocessing.codec``。请求 ID 的分配和
+    响应的匹配沿用 ``Connection.send_request``、``recv_response``
+
+    线程不安全，不要在线程间共享
+    '''
+
+    def __init__(self, sock: socket.socket) -> None:
+        self._socket = sock
+        self._decoder = FrameDecoder()
+        self._inbox: Deque[Any] = deque()
+        self._is_closed = False
+        self._request_ids = count(1)
+        self.id = 0
+        self._waiting: Set[int] = set()
+        self._replies: Dict[int, ResponseT] = {}
+        self.on_invalidate = None
+
+    def send(self, data: MessageT):
+        '''发送数据，连接被关闭时引发 ConnectionClosedError'''
+        if self._is_closed:
+            raise ConnectionClosedError('connection has been closed')
+        try:
+            self._socket.settimeout(None)
+            self._socket.sendall(encode(data))
+        except OSError:
+            self.close()
+            raise ConnectionClosedError('connection has been closed') from None
+
+    def recv(
+        self, block=True, timeout: Optional[float] = None
+    ) -> MessageT:
+        '''从连接中接收数据，超时引发 ReceiveTimeout，连接被关闭时引发 ConnectionClosedError'''
+        inbox = self._inbox
+        if inbox:
+            return inbox.popleft()
+        if self._is_closed:
+            raise ConnectionClosedError('connection has been closed')
+        deadline = None if not block or timeout is None else monotonic() + timeout
+        sock = self._socket
+        while not inbox:
+            if not block:
+                sock.settimeout(0)
+            elif deadline is not None:
+                sock.settimeout(max(deadline - monotonic(), 0))
+            else:
+                sock.settimeout(None)
+            try:
+                data = sock.recv(RECV_SIZE)
+            except (socket.timeout, BlockingIOError, InterruptedError):
+                raise ReceiveTimeout from None
+            except OSError:
+                data = b''
+            if not data:
+                self.close()
+                raise ConnectionClosedError('connection has been closed')
+            try:
+                inbox.extend(self._decoder.feed(data))
+            except Exception:
+                self.close()
+                raise
+        return inbox.popleft()
+
+    def recv_many(self, limit: int) -> List[MessageT]:
+        '''非阻塞地取出至多 ``limit`` 条数据，没有数据时返回空列表'''
+        ret: List[MessageT] = []
+        while len(ret) < limit:
+            try:
+                ret.append(self.recv(block=False))
+            except ReceiveTimeout:
+                break
+        return ret
+
+    @property
+    def pending(self) -> bool:
+        '''是否还有已经收到、未取出的数据'''
+        return bool(self._inbox)
+
+    def poll(self):
+        '''非阻塞地读取并处理已经到达的消息，见 ``Connection.poll``'''
+        while True:
+            try:
+                msg = self.recv(block=False)
+            except ReceiveTimeout:
+                return
+            self._dispatch(msg)
+
+    def close(self):
+        self._is_closed = True
+        self._socket.close()
+
+    @property
+    def closed(self):
+        return self._is_closed
+
+
+def connect(path: str = DEFAULT_PATH, timeout: Optional[float] = None) -> SocketConnection:
+    '''连接到监听 ``path`` 的服务进程
+
+    Raises:
+        OSError: 服务进程没有启动或拒绝连接时引发
+    '''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(path)
+    except BaseException:
+        sock.close()
+        raise
+    return SocketConnection(sock)
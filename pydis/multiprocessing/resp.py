@@ -0,0 +1,570 @@
+# -*- coding: utf-8 -*-
+
+'''兼容 RESP 协议的前端
+
+redis-cli、redis-benchmark、redis-py 等工具可以直接连接服务进程。RESP 命令被翻译为
+``Server`` 的命令消息，与其他连接的请求一样由服务线程执行，结果再编码为 RESP 响应。
+支持 RESP2 和 RESP3（通过 HELLO 3 切换），一次读取到的多条命令（流水线）会被一起处理
+
+键以 UTF-8 解码为 str，无法解码的字节通过 surrogateescape 保留；值保存为 bytes，
+十进制整数形式的值保存为 int，以便 INCR 等命令直接使用
+'''
+
+import logging
+from collections import deque
+from itertools import count
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from ..exceptions import ConnectionClosedError, OutOfMemoryError
+from ..multithreading.commands import OPCODES
+from ..multithreading.message import message
+from ..multithreading.typing import MessageT
+from .server import Peer
+
+logger = logging.getLogger(__name__)
+
+MAX_BULK_SIZE = 512 * 1024 * 1024
+'''单个参数长度的上限，与 redis 的 proto-max-bulk-len 相同'''
+
+MAX_MULTIBULK = 1024 * 1024
+'''单条命令参数数量的上限'''
+
+MAX_INLINE_SIZE = 64 * 1024
+'''inline 命令（如 telnet 中输入的 ``PING``）长度的上限'''
+
+_CRLF = b'\r\n'
+_OK = b'+OK\r\n'
+
+
+class RespParser:
+    '''增量地从字节流中解析 RESP 命令
+
+    收到的数据追加到缓冲区中，每次取出所有完整的命令，不完整的命令留待下次。
+    解析只在缓冲区上查找分隔符，参数直接从缓冲区的 memoryview 中取出，
+    不复制中间数据；已知下一条命令的长度时，数据不够之前不会重复解析
+    '''
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+        self._need = 0
+
+    def __len__(self) -> int:
+        '''缓冲区中未解析的字节数'''
+        return len(self._buf)
+
+    def feed(self, data: bytes) -> List[List[bytes]]:
+        '''追加收到的数据，返回其中完整的命令，每条命令为参数的列表，第一个参数为命令名
+
+        Raises:
+            ValueError: 数据不符合协议或超出长度限制时引发
+        '''
+        buf = self._buf
+        buf += data
+        end = len(buf)
+        ret: List[List[bytes]] = []
+        if end < self._need:
+            return ret
+        self._need = 0
+        find = buf.find
+        pos = 0
+        with memoryview(buf) as view:
+            while pos < end:
+                if buf[pos] != 42:  # '*' 开头的是 multibulk，否则为 inline 命令
+                    eol = find(b'\n', pos)
+                    if eol < 0:
+                        if end - pos > MAX_INLINE_SIZE:
+                            raise ValueError('too big inline request')
+                        break
+                    args = bytes(view[pos:eol]).split()
+                    pos = eol + 1
+                    if args:
+                        ret.append(args)
+                    continue
+                eol = find(_CRLF, pos)
+                if eol < 0:
+                    break
+                n = int(buf[pos + 1:eol])
+                if n > MAX_MULTIBULK:
+                    raise ValueError('invalid multibulk length')
+                p = eol + 2
+                args = []
+                for _ in range(n):
+                    eol = find(_CRLF, p)
+                    if eol < 0:
+                        break
+                    if buf[p] != 36:  # '$'
+                        raise ValueError("expected '$', got %r" % chr(buf[p]))
+                    length = int(buf[p + 1:eol])
+                    if not 0 <= length <= MAX_BULK_SIZE:
+                        raise ValueError('invalid bulk length')
+                    start = eol + 2
+                    p = start + length + 2
+                    if p > end:
+                        self._need = p - pos
+                        break
+                    args.append(bytes(view[start:p - 2]))
+                else:
+                    pos = p
+                    if args:
+                        ret.append(args)
+                    continue
+                break
+        if pos:
+            del buf[:pos]
+        return ret
+
+
+def encode(obj: Any, resp3: bool = False) -> bytes:
+    '''将 ``obj`` 编码为 RESP 响应
+
+    bytes、str 编码为 bulk string，int 为整数，list、tuple 为数组，
+    dict 在 RESP3 中为 map、在 RESP2 中为键值交替的数组，异常为错误
+    '''
+    if obj is None:
+        return b'_\r\n' if resp3 else b'$-1\r\n'
+    if isinstance(obj, bytes):
+        return b'$%d\r\n%s\r\n' % (len(obj), obj)
+    if isinstance(obj, str):
+        obj = obj.encode('utf-8', 'surrogateescape')
+        return b'$%d\r\n%s\r\n' % (len(obj), obj)
+    if isinstance(obj, bool):
+        if resp3:
+            return b'#t\r\n' if obj else b'#f\r\n'
+        return b':1\r\n' if obj else b':0\r\n'
+    if isinstance(obj, int):
+        return b':%d\r\n' % obj
+    if isinstance(obj, float):
+        if resp3:
+            return b',%s\r\n' % repr(obj).encode()
+        return encode(repr(obj))
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        head = b'~%d\r\n' if resp3 and isinstance(obj, (set, frozenset)) else b'*%d\r\n'
+        return b''.join([head % len(obj)] + [encode(item, resp3) for item in obj])
+    if isinstance(obj, dict):
+        if resp3:
+            head = b'%%%d\r\n' % len(obj)
+        else:
+            head = b'*%d\r\n' % (len(obj) * 2)
+        parts = [head]
+        for k, v in obj.items():
+            parts.append(encode(k, resp3))
+            parts.append(encode(v, resp3))
+        return b''.join(parts)
+    if isinstance(obj, BaseException):
+        return error(obj)
+    return encode(repr(obj))
+
+
+def error(e: BaseException) -> bytes:
+    '''将异常编码为 RESP 错误'''
+    prefix = 'OOM' if isinstance(e, OutOfMemoryError) else 'ERR'
+    msg = ' '.join(str(e).split()) or type(e).__name__
+    return ('-%s %s\r\n' % (prefix, msg)).encode('utf-8', 'replace')
+
+
+def _error(msg: str) -> bytes:
+    return ('-ERR %s\r\n' % msg).encode('utf-8', 'replace')
+
+
+def _bulk_value(value: Any, resp3: bool) -> bytes:
+    '''将存入的值编码为 bulk string，数值以十进制表示'''
+    if value is None or isinstance(value, (bytes, str)):
+        return encode(value, resp3)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return encode(str(value))
+    return encode(repr(value))
+
+
+def _key(arg: bytes) -> str:
+    return arg.decode('utf-8', 'surrogateescape')
+
+
+def _value(arg: bytes) -> Any:
+    '''将参数转为存入的值，十进制整数形式的参数转为 int'''
+    if 0 < len(arg) < 20 and (arg.isdigit() or arg[:1] == b'-' and arg[1:].isdigit()):
+        number = int(arg)
+        if b'%d' % number == arg:
+            return number
+    return arg
+
+
+def _int(arg: bytes) -> int:
+    try:
+        return int(arg)
+    except ValueError:
+        raise _CommandError('value is not an integer or out of range') from None
+
+
+class _CommandError(Exception):
+    '''命令的参数不合法，直接以错误响应，不交给服务线程'''
+
+
+# 响应的编码函数，参数为命令的结果和是否为 RESP3
+ReplyT = Callable[[Any, bool], bytes]
+# 命令的翻译结果：直接响应的数据，或交给服务线程的消息和响应的编码函数
+TranslatedT = Any
+
+
+def _reply_ok(result: Any, resp3: bool) -> bytes:
+    return _OK
+
+
+def _reply_value(result: Any, resp3: bool) -> bytes:
+    return _bulk_value(result, resp3)
+
+
+def _reply_values(result: List[Any], resp3: bool) -> bytes:
+    return b''.join([b'*%d\r\n' % len(result)] + [_bulk_value(v, resp3) for v in result])
+
+
+def _reply_int(result: Any, resp3: bool) -> bytes:
+    return b':%d\r\n' % result
+
+
+def _reply_set_nx(result: bool, resp3: bool) -> bytes:
+    return _OK if result else encode(None, resp3)
+
+
+def _reply_exists(result: List[Tuple[int, Any]], resp3: bool) -> bytes:
+    return b':%d\r\n' % sum(1 for kind, r in result if kind == message.RETURN and r)
+
+
+def _reply_info(result: Dict[str, Dict[str, Any]], resp3: bool) -> bytes:
+    lines = []
+    for section, fields in result.items():
+        lines.append('# %s' % section.capitalize())
+        for name, value in fields.items():
+            if isinstance(value, dict):
+                value = ','.join('%s=%s' % item for item in value.items())
+            elif isinstance(value, bool):
+                value = int(value)
+            lines.append('%s:%s' % (name, value))
+        lines.append('')
+    text = '\r\n'.join(lines).encode('utf-8', 'replace')
+    if resp3:
+        return b'=%d\r\ntxt:%s\r\n' % (len(text) + 4, text)
+    return encode(text)
+
+
+def _call(name: str, reply: ReplyT, *args, **kwargs) -> TranslatedT:
+    return (message.CALL, OPCODES[name], (args, kwargs)), reply
+
+
+def _arity(args: List[bytes], arity: int) -> None:
+    n = len(args)
+    if n != arity if arity >= 0 else n < -arity:
+        raise _CommandError(
+            "wrong number of arguments for '%s' command" % _key(args[0]).lower())
+
+
+def _get(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, 2)
+    return _call('get', _reply_value, _key(args[1]))
+
+
+# redis 的 SET 支持、但 pydis 的 set 没有对应参数的选项
+_SET_UNSUPPORTED = (b'XX', b'GET', b'KEEPTTL', b'EXAT', b'PXAT')
+
+
+def _set(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, -3)
+    ex: Optional[float] = None
+    nx = False
+    i = 3
+    while i < len(args):
+        option = args[i].upper()
+        if option == b'NX':
+            nx = True
+        elif option in (b'EX', b'PX') and i + 1 < len(args):
+            i += 1
+            ex = _int(args[i])
+            if ex <= 0:
+                raise _CommandError("invalid expire time in 'set' command")
+            if option == b'PX':
+                ex /= 1000
+        elif option in _SET_UNSUPPORTED:
+            raise _CommandError("unsupported option '%s' in 'set' command" % _key(option))
+        else:
+            raise _CommandError('syntax error')
+        i += 1
+    if nx:
+        return _call('setnx', _reply_set_nx, _key(args[1]), _value(args[2]), ex)
+    return _call('set', _reply_ok, _key(args[1]), _value(args[2]), ex)
+
+
+def _setnx(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, 3)
+    return _call('setnx', _reply_int, _key(args[1]), _value(args[2]))
+
+
+def _setex(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, 4)
+    ex = _int(args[2])
+    if ex <= 0:
+        raise _CommandError("invalid expire time in 'setex' command")
+    return _call('set', _reply_ok, _key(args[1]), _value(args[3]), ex)
+
+
+def _mget(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, -2)
+    return _call('mget', _reply_values, [_key(k) for k in args[1:]])
+
+
+def _mset(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, -3)
+    if len(args) % 2 == 0:
+        raise _CommandError("wrong number of arguments for 'mset' command")
+    data = {_key(args[i]): _value(args[i + 1]) for i in range(1, len(args), 2)}
+    return _call('mset', _reply_ok, data)
+
+
+def _incr(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, 2)
+    name = 'incr' if args[0].lower() == b'incr' else 'decr'
+    return _call(name, _reply_int, _key(args[1]))
+
+
+def _incrby(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, 3)
+    name = 'incr' if args[0].lower() == b'incrby' else 'decr'
+    return _call(name, _reply_int, _key(args[1]), _int(args[2]))
+
+
+def _expire(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, -3)
+    nx = xx = False
+    for option in args[3:]:
+        option = option.upper()
+        if option == b'NX':
+            nx = True
+        elif option == b'XX':
+            xx = True
+        else:
+            raise _CommandError('Unsupported option %s' % _key(option))
+    return _call('expire', _reply_int, _key(args[1]), _int(args[2]), nx, xx)
+
+
+def _ttl(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, 2)
+    return _call('ttl', _reply_int, _key(args[1]))
+
+
+def _keys(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, 2)
+    return _call('keys', _reply_values, _key(args[1]))
+
+
+def _delete(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, -2)
+    name = 'delete' if args[0].lower() == b'del' else 'unlink'
+    return _call(name, _reply_int, *[_key(k) for k in args[1:]])
+
+
+def _exists(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, -2)
+    opcode = OPCODES['exists']
+    msgs = [(message.CALL, opcode, ((_key(k),), {})) for k in args[1:]]
+    return (message.PIPELINE, None, msgs), _reply_exists
+
+
+def _flushdb(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, -1)
+    if len(args) > 2:
+        raise _CommandError('syntax error')
+    option = args[1].upper() if len(args) == 2 else b'SYNC'
+    if option not in (b'SYNC', b'ASYNC'):
+        raise _CommandError('syntax error')
+    return _call('flushdb', _reply_ok, option == b'ASYNC')
+
+
+def _dbsize(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, 1)
+    return _call('dbsize', _reply_int)
+
+
+def _info(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    section = _key(args[1]).lower() if len(args) > 1 else None
+    if section in ('all', 'default', 'everything'):
+        section = None
+    return _call('info', _reply_info, section)
+
+
+def _ping(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, -1)
+    if len(args) > 2:
+        raise _CommandError("wrong number of arguments for 'ping' command")
+    return encode(args[1]) if len(args) == 2 else b'+PONG\r\n'
+
+
+def _echo(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, 2)
+    return encode(args[1])
+
+
+def _hello(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    if len(args) > 1:
+        version = _int(args[1])
+        if version not in (2, 3):
+            return b'-NOPROTO unsupported protocol version\r\n'
+        peer.resp3 = version == 3
+    return encode({
+        'server': 'pydis',
+        'version': '0.0.0',
+        'proto': 3 if peer.resp3 else 2,
+        'id': peer.id,
+        'mode': 'standalone',
+        'role': 'master',
+        'modules': [],
+    }, peer.resp3)
+
+
+def _select(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, 2)
+    return _OK if _int(args[1]) == 0 else _error('DB index is out of range')
+
+
+def _quit(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    peer.quit()
+    return _OK
+
+
+def _client(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    _arity(args, -2)
+    sub = args[1].lower()
+    if sub == b'id':
+        return b':%d\r\n' % peer.id
+    if sub == b'getname':
+        return encode(peer.name, peer.resp3)
+    if sub == b'setname' and len(args) == 3:
+        peer.name = args[2]
+        return _OK
+    if sub == b'setinfo':
+        return _OK
+    return _error("unknown subcommand '%s'" % _key(args[1]))
+
+
+def _command(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    # redis-cli 启动时获取命令文档用于提示，返回空结果即可
+    if len(args) > 1 and args[1].lower() == b'count':
+        return b':%d\r\n' % len(RESP_COMMANDS)
+    return encode({} if len(args) > 1 and args[1].lower() == b'docs' else [], peer.resp3)
+
+
+def _config(peer: 'RespPeer', args: List[bytes]) -> TranslatedT:
+    # redis-benchmark 启动时读取 save、appendonly 等配置，返回空结果即可
+    _arity(args, -2)
+    if args[1].lower() == b'get':
+        return encode({}, peer.resp3)
+    return _error("unknown subcommand '%s'" % _key(args[1]))
+
+
+RESP_COMMANDS: Dict[bytes, Callable[['RespPeer', List[bytes]], TranslatedT]] = {
+    b'get': _get,
+    b'set': _set,
+    b'setnx': _setnx,
+    b'setex': _setex,
+    b'mget': _mget,
+    b'mset': _mset,
+    b'incr': _incr,
+    b'decr': _incr,
+    b'incrby': _incrby,
+    b'decrby': _incrby,
+    b'expire': _expire,
+    b'ttl': _ttl,
+    b'keys': _keys,
+    b'del': _delete,
+    b'unlink': _delete,
+    b'exists': _exists,
+    b'flushdb': _flushdb,
+    b'flushall': _flushdb,
+    b'dbsize': _dbsize,
+    b'info': _info,
+    b'ping': _ping,
+    b'echo': _echo,
+    b'hello': _hello,
+    b'select': _select,
+    b'quit': _quit,
+    b'client': _client,
+    b'command': _command,
+    b'config': _config,
+}
+'''支持的 RESP 命令（小写）及其翻译函数'''
+
+
+class RespPeer(Peer):
+    '''使用 RESP 协议的客户端连接
+
+    读取到的命令被翻译为 ``Server`` 的命令消息交给服务线程执行，PING、HELLO 等
+    与数据无关的命令和参数不合法的命令直接在连接中响应。RESP 没有请求 ID，
+    所有响应按命令的顺序写出
+    '''
+
+    def __init__(self, sock, id: int) -> None:
+        super().__init__(sock, id)
+        self._decoder = RespParser()  # type: ignore
+        self._request_ids = count(1)
+        self._replies: Deque[List[Any]] = deque()
+        '''按命令顺序排列的响应：[请求 ID, 编码后的响应或 None, 编码函数]'''
+        self._waiting: Dict[int, List[Any]] = {}
+        self.resp3 = False
+        self.name: Optional[bytes] = None
+
+    def recv_many(self, limit: int) -> List[MessageT]:
+        '''读取已到达的命令，翻译出至多 ``limit`` 条请求
+
+        Raises:
+            ConnectionClosedError: 对端已经关闭并且没有积压的命令，或数据不合法时引发
+        '''
+        self._fill(limit)
+        backlog = self._backlog
+        ret: List[MessageT] = []
+        while backlog and len(ret) < limit:
+            args = backlog.popleft()
+            handler = RESP_COMMANDS.get(args[0].lower())
+            try:
+                if handler is None:
+                    raise _CommandError("unknown command '%s'" % _key(args[0])[:128])
+                translated = handler(self, args)
+            except _CommandError as e:
+                translated = _error(str(e))
+            if isinstance(translated, bytes):
+                self._replies.append([None, translated, None])
+                continue
+            request, reply = translated
+            rid = next(self._request_ids)
+            entry = [rid, None, reply]
+            self._replies.append(entry)
+            self._waiting[rid] = entry
+            ret.append((rid, *request))
+        self._drain()
+        if not ret and self._eof and not backlog:
+            raise ConnectionClosedError('connection has been closed')
+        return ret
+
+    def send(self, data: MessageT):
+        '''编码服务线程返回的结果，轮到这条命令时写出'''
+        if self.closed:
+            raise ConnectionClosedError('connection has been closed')
+        rid, kind, result = data  # type: ignore
+        entry = self._waiting.pop(rid)
+        if kind == message.ERROR:
+            entry[1] = error(result)
+        else:
+            try:
+                entry[1] = entry[2](result, self.resp3)
+            except Exception as e:
+                logger.exception('failed to encode reply for client %d', self.id)
+                entry[1] = error(e)
+        self._drain()
+
+    def _drain(self):
+        '''将已经得到结果的响应按顺序移入发送缓存'''
+        replies, buffer = self._replies, self._buffer
+        while replies and replies[0][1] is not None:
+            buffer(replies.popleft()[1])
+
+    def quit(self):
+        '''响应 QUIT：丢弃之后的命令，不再读取，写完已有的响应（包括 +OK）后关闭连接，
+        见 ``SocketServer._flush``'''
+        self._eof = True
+        self._backlog.clear()
@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import selectors
+import signal
+import socket
+from collections import deque
+from threading import Event, Lock, get_ident
+from time import monotonic as time, perf_counter
+from typing import Any, Callable, Deque, List, NamedTuple, Optional, Tuple, Union
+
+from ..exceptions import ConnectionClosedError
+from ..multithreading.latency import EVENT_LOOP
+from ..multithreading.server import MATERIALIZE_TIME_PERC, Server, Set
+from ..multithreading.typing import MessageT
+from .codec import FrameDecoder, encode
+from .connection import DEFAULT_PATH, RECV_SIZE
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_HIGH_WATER = 1 << 20
+'''连接缓存的响应达到此字节数时，暂停读取它的请求，直到响应全部写出'''
+
+
+class Peer:
+    '''服务进程中的客户端连接
+
+    实现了 ``Server.handle_request`` 用到的 ``recv_many``、``send``、``pending``，
+    套接字为非阻塞的：读取时取出所有已到达的数据并解码，
+    响应先缓存起来，由 ``flush`` 一次写出，写不完的部分等套接字可写时再写。
+    缓存的响应达到 ``OUTPUT_HIGH_WATER`` 时，服务线程暂停读取这个连接的请求
+    '''
+
+    def __init__(self, sock: socket.socket, id: int) -> None:
+        sock.setblocking(False)
+        self._socket = sock
+        self.id = id
+        self._decoder = FrameDecoder()
+        self._backlog: Deque[Any] = deque()
+        self._out: List[bytes] = []
+        self._out_size = 0
+        self._eof = False
+        self.closed = False
+        self.events = selectors.EVENT_READ
+        '''在 selector 中关注的事件'''
+
+    def fileno(self) -> int:
+        return self._socket.fileno()
+
+    def recv_many(self, limit: int) -> List[MessageT]:
+        '''读取已到达的数据，取出至多 ``limit`` 条请求
+
+        Raises:
+            ConnectionClosedError: 对端已经关闭并且没有积压的请求，或数据不合法时引发
+        '''
+        self._fill(limit)
+        backlog = self._backlog
+        if not backlog:
+            if self._eof:
+                raise ConnectionClosedError('connection has been closed')
+            return []
+        popleft = backlog.popleft
+        return [popleft() for _ in range(min(limit, len(backlog)))]
+
+    def _fill(self, limit: int):
+        '''读取已到达的数据，解码后放入积压的请求中，直到积压的请求达到 ``limit``'''
+        backlog = self._backlog
+        if not self._eof:
+            try:
+                while len(backlog) < limit:
+                    data = self._socket.recv(RECV_SIZE)
+                    if not data:
+                        self._eof = True
+                        break
+                    backlog.extend(self._decoder.feed(data))
+                    if len(data) < RECV_SIZE:
+                        break
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self._eof = True
+            except Exception:
+                logger.exception('invalid data from client %d', self.id)
+                self.close()
+                raise ConnectionClosedError('invalid data') from None
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._backlog)
+
+    @property
+    def eof(self) -> bool:
+        '''对端已经关闭，并且没有积压的请求'''
+        return self._eof and not self._backlog
+
+    @property
+    def throttled(self) -> bool:
+        '''缓存的响应达到了 ``OUTPUT_HIGH_WATER``'''
+        return self._out_size >= OUTPUT_HIGH_WATER
+
+    def send(self, data: MessageT):
+        if self.closed:
+            raise ConnectionClosedError('connection has been closed')
+        self._buffer(encode(data))
+
+    def _buffer(self, data: bytes):
+        self._out.append(data)
+        self._out_size += len(data)
+
+    def flush(self) -> bool:
+        '''写出缓存的响应，返回是否全部写出'''
+        if not self._out:
+            return True
+        data = b''.join(self._out) if len(self._out) > 1 else self._out[0]
+        try:
+            sent = self._socket.send(data)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:  # 对端已经关闭，丢弃没有写出的响应
+            self._out = []
+            self._out_size = 0
+            self._eof = True
+            return True
+        self._out = [data[sent:]] if sent < len(data) else []
+        self._out_size = len(data) - sent
+        return not self._out
+
+    def close(self):
+        self.closed = True
+        self._socket.close()
+
+
+class _Listener(NamedTuple):
+    '''监听的套接字，以及为接受的连接创建 ``Peer`` 的函数'''
+    socket: socket.socket
+    factory: Callable[[socket.socket, int], Peer]
+
+
+class SocketServer(Server):
+    '''在独立进程中运行的服务，通过 Unix 套接字接受其他进程的连接
+
+    命令的执行、统计、持久化等都与 ``Server`` 相同，只是连接由套接字上的 ``Peer``
+    代替，服务线程直接在套接字上等待请求，没有额外的线程。``bind_resp`` 可以再监听
+    一个使用 RESP 协议的地址，供 redis-cli 等工具连接，见 ``pydis.multiprocessing.resp``
+
+    请求和响应会被 pickle，能够连接到套接字的进程可以在服务进程中执行任意代码，
+    套接字文件的权限默认为只有属主可以访问
+    '''
+
+    _connections: Set[Peer] = Set()  # type: ignore
+    _selector = selectors.DefaultSelector()
+    _mutex = Lock()
+    _stop_evt = Event()
+
+    def __init__(self):
+        super().__init__()
+        self.path: Optional[str] = None
+        '''监听的套接字路径'''
+        self._listeners: List[_Listener] = []
+
+    def bind(self, path: str = DEFAULT_PATH, mode: int = 0o600, backlog: int = 128):
+        '''监听 ``path``，已经存在的套接字文件会被替换'''
+        self._listen(_bind_unix(path, mode), Peer, backlog)
+        self.path = path
+
+    def bind_resp(
+        self,
+        address: Union[str, Tuple[str, int]],
+        mode: int = 0o600,
+        backlog: int = 128
+    ):
+        '''监听使用 RESP 协议的地址，可以与 ``bind`` 同时使用
+
+        Args:
+            address (str | tuple): Unix 套接字路径，或 TCP 的 (host, port)
+            mode (int, optional): Unix 套接字文件的权限. 默认为 0o600
+            backlog (int, optional): 等待接受的连接数的上限. 默认为 128
+        '''
+        from .resp import RespPeer
+        if isinstance(address, str):
+            self._listen(_bind_unix(address, mode), RespPeer, backlog)
+        else:
+            self._listen(_bind_tcp(address), RespPeer, backlog)
+
+    def _listen(self, sock: socket.socket, factory: Callable[[socket.socket, int], Peer],
+                backlog: int):
+        try:
+            sock.listen(backlog)
+            sock.setblocking(False)
+        except BaseException:
+            sock.close()
+            raise
+        listener = _Listener(sock, factory)
+        self._selector.register(sock, selectors.EVENT_READ, listener)
+        self._listeners.append(listener)
+
+    def _accept(self, listener: _Listener):
+        while True:
+            try:
+                sock, _ = listener.socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            if sock.family != socket.AF_UNIX:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            peer = listener.factory(sock, next(self._client_ids))
+            with self._mutex:
+                self._selector.register(peer, selectors.EVENT_READ, peer)
+                self._connections.add(peer)
+
+    def serve_forever(self):
+        '''服务进程的主循环，与 ``Server.serve_forever`` 相同，但在套接字上等待请求'''
+        self._thread_ident = get_ident()
+        selector = self._selector
+        while not self._stop_evt.is_set():
+            start = self._busy_since = perf_counter()
+            self.active_expire_cycle()
+            if self._mapped is not None:
+                self._materialize(time() + MATERIALIZE_TIME_PERC)
+            timeout = 0 if self._pending else self._poll_timeout()
+            busy = perf_counter() - start
+            self._busy_since = None
+            events = selector.select(timeout)
+            start = self._busy_since = perf_counter()
+            peers = dict.fromkeys(self._pending)
+            self._pending = []
+            for key, mask in events:
+                peer = key.data
+                if isinstance(peer, _Listener):
+                    self._accept(peer)
+                    continue
+                if mask & selectors.EVENT_READ:
+                    peers[peer] = None
+                elif mask & selectors.EVENT_WRITE:
+                    self._flush(peer)
+            for peer in peers:
+                if peer.closed or peer.throttled:  # 响应写完后由 _flush 放回 _pending
+                    continue
+                if self.handle_request(peer):  # type: ignore
+                    self._pending.append(peer)
+                self._flush(peer)
+            busy += perf_counter() - start
+            self._busy_since = None
+            self.latency.add(EVENT_LOOP, busy)
+        self._close_connections()
+
+    def _flush(self, peer: Peer):
+        '''写出 ``peer`` 缓存的响应，对端已经关闭并且响应已经写完（或无法再写）时移除连接
+
+        没有写完时关注可写事件；缓存的响应达到上限或对端已经关闭时只关注可写事件，
+        不再读取请求，写完之后积压的请求重新放回 ``_pending``
+        '''
+        if peer.closed:
+            self._remove_connection(peer)  # type: ignore
+            return
+        done = peer.flush()
+        if done and peer.eof:
+            self._remove_connection(peer)  # type: ignore
+            return
+        if done:
+            events = selectors.EVENT_READ
+            if peer.pending and peer not in self._pending:
+                self._pending.append(peer)  # type: ignore
+        elif peer.throttled or peer.eof:
+            events = selectors.EVENT_WRITE
+        else:
+            events = selectors.EVENT_READ | selectors.EVENT_WRITE
+        if events != peer.events:
+            peer.events = events
+            self._selector.modify(peer, events, peer)
+
+    def _send_invalidations(self) -> List[Peer]:  # type: ignore
+        '''推送失效消息，并写出正在处理的连接以外的连接的缓存'''
+        peers = super()._send_invalidations()
+        for peer in peers:
+            if peer is not self._current_client:
+                self._flush(peer)  # type: ignore
+        return peers  # type: ignore
+
+    def _unbind(self):
+        '''关闭所有监听的套接字并删除套接字文件'''
+        while self._listeners:
+            sock = self._listeners.pop().socket
+            try:
+                self._selector.unregister(sock)
+            except (KeyError, ValueError):
+                pass
+            path = sock.getsockname() if sock.family == socket.AF_UNIX else None
+            sock.close()
+            if path:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+
+def _bind_unix(path: str, mode: int) -> socket.socket:
+    '''创建绑定到 ``path`` 的 Unix 套接字，已经存在的套接字文件会被替换'''
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.bind(path)
+        os.chmod(path, mode)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+def _bind_tcp(address: Tuple[str, int]) -> socket.socket:
+    '''创建绑定到 ``address`` 的 TCP 套接字'''
+    family = socket.AF_INET6 if ':' in address[0] else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(address)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+def serve(
+    path: str = DEFAULT_PATH,
+    ready: Optional[Any] = None,
+    mode: int = 0o600,
+    snapshot: Optional[str] = None,
+    resp: Optional[Union[str, Tuple[str, int]]] = None
+):
+    '''在当前进程中运行服务，直到收到 SIGTERM 或 SIGINT
+
+    指定 ``snapshot`` 时，启动时映射这个快照（文件存在时），退出前再保存到这个文件，
+    重启后立即可以提供服务，见 ``BaseCore.attach``。指定 ``resp`` 时，
+    同时在这个地址上接受 RESP 协议的连接，见 ``SocketServer.bind_resp``
+
+    Args:
+        path (str, optional): 监听的套接字路径. 默认为 ``DEFAULT_PATH``
+        ready (Event, optional): 开始监听后设置的事件，用于通知父进程
+        mode (int, optional): 套接字文件的权限. 默认为 0o600
+        snapshot (str, optional): 快照文件的路径. 默认为 None，表示不保存
+        resp (str | tuple, optional): RESP 协议的监听地址. 默认为 None，表示不监听
+    '''
+    server = SocketServer()
+    if snapshot is not None:
+        server.dbfilename = snapshot
+        server.dbformat = 'mapped'
+        if os.path.exists(snapshot):
+            server.attach(snapshot)
+    server.bind(path, mode)
+    if resp is not None:
+        server.bind_resp(resp, mode)
+    SocketServer._stop_evt.clear()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        # 信号处理函数在服务线程中执行，不能获取 _mutex
+        signal.signal(signum, lambda *_: SocketServer._stop_evt.set())
+    if ready is not None:
+        ready.set()
+    try:
+        server._run_server()
+    finally:
+        server._unbind()
+        if snapshot is not None:
+            server.save()
+
+
+def start_server(
+    path: str = DEFAULT_PATH,
+    mode: int = 0o600,
+    snapshot: Optional[str] = None,
+    timeout: float = 10,
+    resp: Optional[Union[str, Tuple[str, int]]] = None
+):
+    '''以 spawn 方式启动服务进程，开始监听后返回 ``multiprocessing.Process``
+
+    停止服务调用返回值的 ``terminate``，服务进程退出前会关闭所有连接并删除套接字文件
+
+    Raises:
+        RuntimeError: 服务进程在 ``timeout`` 秒内没有开始监听时引发
+    '''
+    import multiprocessing
+    ctx = multiprocessing.get_context('spawn')
+    ready = ctx.Event()
+    process = ctx.Process(
+        target=serve, args=(path, ready, mode, snapshot, resp), name='pydis-server', daemon=True)
+    process.start()
+    deadline = time() + timeout
+    while not ready.wait(0.05):
+        if not process.is_alive() or time() >= deadline:
+            process.terminate()
+            raise RuntimeError('pydis server failed to start')
+    return process
@@ -1 +1,2 @@
-from .client import PydisClient as Pydis
\ No newline at end of file
+from .client import PydisClient as Pydis
+from .pool import ConnectionPool
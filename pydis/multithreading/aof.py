@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+'''追加写的命令日志（AOF）
+
+服务线程执行成功的每条写命令都被序列化为一条记录，交给后台的写线程，
+写线程批量写入文件，并按 ``fsync`` 策略刷入磁盘，服务线程不会等待磁盘：
+
+- always: 每批记录写入后立即 fsync
+- everysec: 距上次 fsync 超过 1 秒时 fsync
+- no: 不主动 fsync，由操作系统决定
+
+文件由文件头（魔数 ``AOF_MAGIC`` 和格式版本）和若干记录组成，
+每条记录为长度（uint32）、crc32（uint32）和 pickle 后的 (命令名称, 位置参数, 关键字参数)。
+命令中相对的失效时长在记录时换算为 unix 时间戳，重放时再换算回剩余的时长，
+因此重放后键的失效时刻与原来相同，重放时已经失效的键会立即失效
+
+重写时以当前的数据生成新文件，数据以 ``RESTORE`` 记录分块保存，
+格式与快照相同，见 ``pydis.rdb``。重写期间新的记录同时追加到旧文件和
+重写缓冲区中，新文件写完后追加缓冲区中的记录，再替换旧文件
+'''
+
+import logging
+import os
+import pickle
+from datetime import timedelta
+from struct import Struct
+from threading import Condition, Lock, Thread, get_ident
+from time import monotonic, sleep, time
+from typing import (Any, BinaryIO, Callable, Dict, Iterable, Iterator, List,
+                    Optional, Tuple)
+from zlib import crc32
+
+from .. import rdb
+from ..exceptions import AofError
+from ..value import Value
+
+AOF_MAGIC = b'PYDISAOF'
+AOF_VERSION = 1
+FSYNC_POLICIES = ('always', 'everysec', 'no')
+RESTORE = '_restore'
+'''重写生成的数据记录，参数为 (键, 值, 失效时刻) 的列表'''
+
+EXPIRY_ARGS: Dict[str, Tuple[int, str]] = {
+    # 带有失效时长的写命令，值为失效时长参数的位置和名称
+    'set': (2, 'ex'),
+    'setnx': (2, 'ex'),
+    'mset': (1, 'ex'),
+    'msetnx': (1, 'ex'),
+    'incr': (2, 'ex'),
+    'decr': (2, 'ex'),
+    'expire': (1, 'time'),
+}
+
+_HEADER = Struct('<8sH')
+_RECORD = Struct('<II')
+
+RecordT = Tuple[str, Tuple[Any, ...], Dict[str, Any]]
+
+logger = logging.getLogger(__name__)
+
+
+def _shift(
+    name: str,
+    args: Tuple[Any, ...],
+    kwargs: Dict[str, Any],
+    offset: float
+) -> Tuple[Tuple[Any, ...], Dict[str, Any]]:
+    '''将命令的失效时长参数加上 ``offset``，没有失效时长时原样返回'''
+    spec = EXPIRY_ARGS.get(name)
+    if spec is None:
+        return args, kwargs
+    pos, kw = spec
+    if len(args) > pos:
+        ex = args[pos]
+        if ex is not None:
+            if isinstance(ex, timedelta):
+                ex = ex.total_seconds()
+            args = (*args[:pos], ex + offset, *args[pos + 1:])
+    elif kwargs.get(kw) is not None:
+        ex = kwargs[kw]
+        if isinstance(ex, timedelta):
+            ex = ex.total_seconds()
+        kwargs = {**kwargs, kw: ex + offset}
+    return args, kwargs
+
+
+def _pack(record: RecordT) -> bytes:
+    data = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+    return _RECORD.pack(len(data), crc32(data)) + data
+
+
+def read_records(f: BinaryIO) -> Iterator[RecordT]:
+    '''逐条读取记录，失效时长仍为 unix 时间戳
+
+    文件末尾不完整的记录（写入时进程退出）会被忽略
+
+    Raises:
+        AofError: 文件不是命令日志，或记录损坏时引发
+    '''
+    header = f.read(_HEADER.size)
+    if not header:
+        return
+    if len(header) < _HEADER.size or _HEADER.unpack(header)[0] != AOF_MAGIC:
+        raise AofError('not a pydis append only file')
+    if _HEADER.unpack(header)[1] > AOF_VERSION:
+        raise AofError('unsupported aof version: %d' % _HEADER.unpack(header)[1])
+    read, loads, size = f.read, pickle.loads, _RECORD.size
+    count = 0
+    while True:
+        head = read(size)
+        if not head:
+            return
+        if len(head) < size:
+            break
+        length, checksum = _RECORD.unpack(head)
+        data = read(length)
+        if len(data) < length:
+            break
+        if crc32(data) != checksum:
+            raise AofError('corrupted record #%d' % count)
+        count += 1
+        yield loads(data)
+    logger.warning('ignored truncated record at the end of the append only file')
+
+
+def replay(
+    f: BinaryIO,
+    call: Callable[[str, Tuple[Any, ...], Dict[str, Any]], Any],
+    restore: Callable[[List[rdb.EntryT]], Any]
+) -> int:
+    '''重放 ``f`` 中的记录，返回重放的记录的数量
+
+    数据记录交给 ``restore``，其他记录的失效时长换算回剩余的时长后交给 ``call``，
+    执行失败的命令会被记录到日志并跳过，``call`` 引发 AofError 时停止重放
+
+    Raises:
+        AofError: 文件不是命令日志、记录损坏，或 ``call`` 拒绝执行记录时引发
+    '''
+    count = 0
+    for name, args, kwargs in read_records(f):
+        count += 1
+        if name == RESTORE:
+            restore(args[0])
+            continue
+        args, kwargs = _shift(name, args, kwargs, -time())
+        try:
+            call(name, args, kwargs)
+        except AofError:
+            raise
+        except Exception:
+            logger.exception('failed to replay %r', name)
+    return count
+
+
+class AppendOnlyFile:
+    '''追加写的命令日志，由后台的写线程写入文件
+
+    Attributes:
+        path (str): 文件路径
+        fsync (str): fsync 策略，见 ``FSYNC_POLICIES``
+        rewrite_in_progress (bool): 是否正在重写
+        last_rewrite_status (str): 上次重写的结果，'ok' 或 'err'
+    '''
+
+    def __init__(self, path: str, fsync: str = 'everysec') -> None:
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError('unknown fsync policy %r' % fsync)
+        self.path = path
+        self.fsync = fsync
+        self.rewrite_in_progress = False
+        self.last_rewrite_status = 'ok'
+        self._file = self._open(path)
+        self._buf: List[bytes] = []
+        self._rewrite_buf: Optional[List[bytes]] = None
+        self._cond = Condition()
+        self._file_lock = Lock()
+        '''写线程写入文件与重写替换文件互斥，获取顺序为先 _file_lock 后 _cond'''
+        self._closed = False
+        self._writer = Thread(target=self._run, name='pydis-aof', daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def _open(path: str) -> BinaryIO:
+        f = open(path, 'ab')
+        if not f.tell():
+            f.write(_HEADER.pack(AOF_MAGIC, AOF_VERSION))
+            f.flush()
+        return f  # type: ignore
+
+    @property
+    def pending(self) -> int:
+        '''等待写入的记录的数量'''
+        return len(self._buf)
+
+    def append(self, name: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]):
+        '''追加一条写命令，在服务线程中调用，只序列化而不写入文件'''
+        args, kwargs = _shift(name, args, kwargs, time())
+        record = _pack((name, args, kwargs))
+        with self._cond:
+            self._buf.append(record)
+            if self._rewrite_buf is not None:
+                self._rewrite_buf.append(record)
+            self._cond.notify()
+
+    def _run(self):
+        dirty = False
+        last_fsync = monotonic()
+        while True:
+            with self._cond:
+                while not self._buf and not self._closed:
+                    # everysec 有未刷入的数据时，最多等到下一次 fsync
+                    timeout = max(last_fsync + 1 - monotonic(), 0) \
+                        if dirty and self.fsync == 'everysec' else None
+                    if not self._cond.wait(timeout) and timeout is not None:
+                        break
+            with self._file_lock:
+                with self._cond:
+                    buf, self._buf = self._buf, []
+                    closed = self._closed
+                f = self._file
+                if buf:
+                    f.write(b''.join(buf))
+                    f.flush()
+                    dirty = True
+                if dirty and (self.fsync == 'always' or closed or (
+                        self.fsync == 'everysec' and monotonic() - last_fsync >= 1)):
+                    os.fsync(f.fileno())
+                    dirty = False
+                    last_fsync = monotonic()
+                if closed:
+                    f.close()
+                    return
+
+    def flush(self, timeout: float = 1.0) -> bool:
+        '''等待已追加的记录全部写入文件，返回是否在 ``timeout`` 秒内完成'''
+        deadline = monotonic() + timeout
+        while True:
+            with self._file_lock:
+                if not self._buf:
+                    return True
+            if monotonic() >= deadline:
+                return False
+            sleep(0.001)
+
+    def rewrite(self, items: Iterable[Tuple[str, Value]], done: Callable[[], Any]):
+        '''以 ``items`` 为基础在后台线程中重写文件，完成后调用 ``done``
+
+        ``items`` 为调用时刻数据的副本，调用方需保证此后的修改不会影响它，
+        见 ``BaseCore._cow``
+
+        Raises:
+            RuntimeError: 已有重写在进行时引发
+        '''
+        if self.rewrite_in_progress:
+            raise RuntimeError('append only file rewrite already in progress')
+        self.rewrite_in_progress = True
+        with self._cond:
+            self._rewrite_buf = []
+        Thread(target=self._rewrite, args=(items, done),
+               name='pydis-aof-rewrite', daemon=True).start()
+
+    def _rewrite(self, items: Iterable[Tuple[str, Value]], done: Callable[[], Any]):
+        tmp = '%s.rewrite-%d-%d' % (self.path, os.getpid(), get_ident())
+        try:
+            new = open(tmp, 'wb')
+            try:
+                new.write(_HEADER.pack(AOF_MAGIC, AOF_VERSION))
+                for batch in rdb.entries(items):
+                    new.write(_pack((RESTORE, (batch,), {})))
+                with self._file_lock:
+                    # 持有 _file_lock 期间写线程不会取走 _buf，其中的记录
+                    # 都在重写缓冲区的末尾；服务线程仍可以继续追加记录
+                    with self._cond:
+                        tail = self._rewrite_buf[:]  # type: ignore
+                    new.write(b''.join(tail))
+                    new.flush()
+                    os.fsync(new.fileno())
+                    os.replace(tmp, self.path)
+                    self._file.close()
+                    self._file = new  # type: ignore
+                    with self._cond:
+                        self._buf = self._rewrite_buf[len(tail):]  # type: ignore
+                        self._rewrite_buf = None
+            except BaseException:
+                new.close()
+                raise
+        except Exception:
+            logger.exception('append only file rewrite failed')
+            with self._cond:
+                self._rewrite_buf = None
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            self.last_rewrite_status = 'err'
+        else:
+            self.last_rewrite_status = 'ok'
+        finally:
+            self.rewrite_in_progress = False
+            done()
+
+    def close(self):
+        '''写入所有记录并关闭文件'''
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._writer.join()
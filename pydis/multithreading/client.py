@@ -2,20 +2,37 @@
 
 from datetime import timedelta
 from functools import wraps
-from typing import Any, Collection, Dict, List, Optional, Union
-
+from typing import (Any, Callable, Collection, Dict, Iterator, List, Optional,
+                    Tuple, Union)
+
+from ..exceptions import WatchError
+from .commands import OPCODES
+from .connection import Connection
+from .nearcache import MISSING, NearCache
+from .pool import ConnectionPool
 from .server import Server
 from .typing import RequestT, ResponseT
 from .message import message
 
 
 class Client:
-    def __init__(self) -> None:
-        self._conn = Server.open_connection()
+    def __init__(self, connection_pool: Optional[ConnectionPool] = None) -> None:
+        self.connection_pool = connection_pool
+        if connection_pool is None:
+            self._conn: Optional[Connection] = self._open_connection()
+        else:
+            self._conn = None  # 每条命令从连接池中取出连接
+
+    def _open_connection(self) -> Connection:
+        '''打开客户端独占的连接，默认连接到本进程的服务线程'''
+        conn = Server.open_connection()
         Server().start()
+        return conn
 
     def close(self):
-        self._conn.close()
+        # 连接池可能被多个客户端共享，由创建者负责关闭
+        if self._conn is not None:
+            self._conn.close()
 
     def __del__(self):
         self.close()
@@ -26,8 +43,11 @@ class Client:
         block=True,
         timeout: Optional[float] = None
     ) -> ResponseT:
-        self._conn.send(msg)
-        return self._conn.recv(block, timeout)  # type: ignore
+        conn = self._conn
+        if conn is None:
+            with self.connection_pool.connection(timeout) as conn:  # type: ignore
+                return conn.recv_response(conn.send_request(msg), block, timeout)
+        return conn.recv_response(conn.send_request(msg), block, timeout)
 
 
 def general_response_handler(func):
@@ -44,7 +64,7 @@ def general_response_handler(func):
 
 
 def make_message(kind, name, *args, **kwargs):
-    return (kind, name, (args, kwargs))
+    return (kind, OPCODES[name], (args, kwargs))
 
 
 class PydisClient(Client):
@@ -59,19 +79,155 @@ class PydisClient(Client):
     都与 queue.Queue.get 相同，但超时时会由底层连接引发 ReceiveTimeout
     异常，这个异常在 ``pydis.exceptions`` 中定义
 
-    线程不安全，不要在线程间共享
+    默认独占一个连接，线程不安全，不要在线程间共享。传入 ``connection_pool``
+    时每条命令从连接池中取出连接，执行后归还，此时可以在线程间共享
+
+    ``client_cache`` 大于 0 时开启本地缓存，``get``、``mget`` 读取到的值最多缓存
+    ``client_cache`` 个键，键在服务端被修改后由服务线程推送失效消息，
+    见 ``pydis.multithreading.nearcache``。本地缓存需要独占的连接，不能与连接池同时使用
+
+    eg:
+        pool = ConnectionPool(max_connections=4)
+        client = PydisClient(connection_pool=pool)
+        client = PydisClient(client_cache=10000)
 
     Attributes:
         default_timeout (float): 
             本实例的默认失效时长，默认为 None，表示永远有效
+        client_cache (NearCache): 本地缓存，没有开启时为 None
     '''
 
     def __init__(
         self,
-        default_timout: Optional[Union[float, timedelta]] = None
+        default_timout: Optional[Union[float, timedelta]] = None,
+        connection_pool: Optional[ConnectionPool] = None,
+        client_cache: int = 0
     ) -> None:
         self.default_timout = default_timout
-        super().__init__()
+        self.client_cache: Optional[NearCache] = None
+        super().__init__(connection_pool)
+        if client_cache:
+            if connection_pool is not None:
+                raise ValueError('client_cache requires a dedicated connection')
+            self.client_tracking(True)
+            self.client_cache = NearCache(client_cache)
+            self._conn.on_invalidate = self.client_cache.invalidate  # type: ignore
+
+    def pipeline(self, transaction=False) -> 'Pipeline':
+        '''创建一个流水线，缓存多条命令，一次性发送给服务线程执行
+
+        Args:
+            transaction (bool, optional):
+                是否以事务执行，事务会检查被监视的键. 默认为 False
+
+        Returns:
+            Pipeline: 流水线，可用作上下文管理器
+        '''
+        return Pipeline(self, transaction)
+
+    def transaction(
+        self,
+        func: Callable[['Pipeline'], Any],
+        *watches: str
+    ) -> List[Any]:
+        '''以乐观锁执行一个读-改-写事务
+
+        监视 ``watches`` 中的键，然后以事务流水线调用 ``func``。
+        ``func`` 中在调用 ``pipe.multi()`` 前的命令会被立即执行，
+        之后的命令在 ``func`` 返回后作为事务执行。如果期间被监视的键
+        被修改，将自动重试
+
+        eg:
+            def incr_by_two(pipe):
+                value = pipe.get('key') or 0
+                pipe.multi()
+                pipe.set('key', value + 2)
+            client.transaction(incr_by_two, 'key')
+
+        Returns:
+            List[Any]: 事务中各命令的结果
+        '''
+        with self.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    if watches:
+                        pipe.watch(*watches)
+                    func(pipe)
+                    return pipe.execute()
+                except WatchError:
+                    continue
+
+    @general_response_handler
+    def bgrewriteaof(self, block=True, timeout: Optional[float] = None) -> bool:
+        '''在服务的后台线程中重写命令日志
+
+        Raises:
+            RuntimeError: 没有开启命令日志，或已有重写在进行时引发
+        '''
+        msg = make_message(message.CALL, 'bgrewriteaof')
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def bgsave(
+        self,
+        path: Optional[str] = None,
+        block=True, timeout: Optional[float] = None
+    ) -> bool:
+        '''在服务的后台线程中保存快照，``path`` 默认为配置项 ``dbfilename``
+
+        Raises:
+            RuntimeError: 已有后台保存在进行时引发
+        '''
+        msg = make_message(message.CALL, 'bgsave', path)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def client_tracking(
+        self,
+        on: bool,
+        block=True, timeout: Optional[float] = None
+    ) -> bool:
+        '''开启或关闭本连接的客户端缓存跟踪，见 ``Server.client_tracking``
+
+        开启后服务线程会推送失效消息，通常通过 ``client_cache`` 参数开启
+        '''
+        msg = make_message(message.CALL, 'client_tracking', on)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def config_get(
+        self,
+        name: str,
+        block=True, timeout: Optional[float] = None
+    ) -> Any:
+        '''获取服务的配置项，如 ``maxkeys``、``maxkeys_policy``
+
+        Raises:
+            ValueError: 配置项不存在时引发
+        '''
+        msg = make_message(message.CALL, 'config_get', name)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def config_set(
+        self,
+        name: str,
+        value: Any,
+        block=True, timeout: Optional[float] = None
+    ) -> bool:
+        '''设置服务的配置项，如 ``maxkeys``、``maxkeys_policy``
+
+        Raises:
+            ValueError: 配置项不存在，或值不合法时引发
+        '''
+        msg = make_message(message.CALL, 'config_set', name, value)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def dbsize(self, block=True, timeout: Optional[float] = None) -> int:
+        '''键的数量，见 ``BaseCore.dbsize``'''
+        msg = make_message(message.CALL, 'dbsize')
+        return self.execute_command(msg, block, timeout)  # type: ignore
 
     @general_response_handler
     def decr(
@@ -122,10 +278,24 @@ class PydisClient(Client):
         )
         return self.execute_command(msg, block, timeout)  # type: ignore
 
+    @general_response_handler
+    def delete_prefix(
+        self,
+        prefix: str,
+        block=True, timeout: Optional[float] = None
+    ) -> int:
+        '''删除所有以 ``prefix`` 开头的键
+
+        Returns:
+            int: 删除的键的数量
+        '''
+        msg = make_message(message.CALL, 'delete_prefix', prefix)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
     @property
     @general_response_handler
     def empty(self):
-        msg = (message.GET, 'empty', None)
+        msg = make_message(message.CALL, 'empty')
         return self.execute_command(msg, block=False)  # type: ignore
 
     @general_response_handler
@@ -180,12 +350,128 @@ class PydisClient(Client):
         return self.execute_command(msg, block, timeout)  # type: ignore
 
     @general_response_handler
-    def flushdb(self, block=True, timeout: Optional[float] = None):
-        '''清除所有存入的键'''
-        msg = make_message(message.CALL, 'flushdb')
+    def evalsha(
+        self,
+        digest: str,
+        *args,
+        block=True, timeout: Optional[float] = None,
+        **kwargs
+    ) -> Any:
+        '''通过摘要调用注册在服务中的函数，参见 ``function_load``'''
+        msg = make_message(message.CALL, 'evalsha', digest, *args, **kwargs)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def fcall(
+        self,
+        name: str,
+        *args,
+        block=True, timeout: Optional[float] = None,
+        **kwargs
+    ) -> Any:
+        '''调用注册在服务中的函数，参见 ``function_load``
+
+        Raises:
+            ValueError: 函数不存在时引发
+        '''
+        msg = make_message(message.CALL, 'fcall', name, *args, **kwargs)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def fcall_ro(
+        self,
+        name: str,
+        *args,
+        block=True, timeout: Optional[float] = None,
+        **kwargs
+    ) -> Any:
+        '''调用注册在服务中的只读函数，参见 ``function_load``
+
+        Raises:
+            ValueError: 函数不存在，或函数不是只读函数时引发
+        '''
+        msg = make_message(message.CALL, 'fcall_ro', name, *args, **kwargs)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def flushdb(
+        self,
+        asynchronous: bool = False,
+        block=True, timeout: Optional[float] = None
+    ):
+        '''清除所有存入的键，``asynchronous`` 为 True 时在后台释放数据'''
+        if asynchronous:
+            msg = make_message(message.CALL, 'flushdb', True)
+        else:
+            msg = make_message(message.CALL, 'flushdb')
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def function_delete(
+        self,
+        name: str,
+        block=True, timeout: Optional[float] = None
+    ) -> bool:
+        '''删除注册在服务中的函数
+
+        Returns:
+            bool: 函数是否存在
+        '''
+        msg = make_message(message.CALL, 'function_delete', name)
         return self.execute_command(msg, block, timeout)  # type: ignore
 
     @general_response_handler
+    def function_list(
+        self,
+        block=True, timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        '''列出所有注册在服务中的函数的名称、摘要与只读标记'''
+        msg = make_message(message.CALL, 'function_list')
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def function_load(
+        self,
+        func: Callable[..., Any],
+        name: Optional[str] = None,
+        readonly: bool = False,
+        replace: bool = False,
+        block=True, timeout: Optional[float] = None
+    ) -> str:
+        '''将函数注册到服务中
+
+        函数在服务线程中执行，第一个参数为服务实例，可以直接调用其上的
+        所有命令，执行期间不会处理其他请求，因此函数内的所有操作是原子的，
+        一次调用只需要一次通信
+
+        eg:
+            def rate_limit(server, key, limit, period):
+                count = server.incr(key)
+                if count == 1:
+                    server.expire(key, period)
+                return count <= limit
+            client.function_load(rate_limit, readonly=False)
+            client.fcall('rate_limit', 'user:1', 10, 60)
+
+        Args:
+            func (Callable): 待注册的函数
+            name (str, optional): 函数名称. 默认为 ``func.__name__``
+            readonly (bool, optional): 是否只读，只读函数可通过 fcall_ro 调用. 默认为 False
+            replace (bool, optional): 是否替换同名的函数. 默认为 False
+
+        Raises:
+            ValueError: 名称已被使用，并且 ``replace`` 为 False 时引发
+
+        Returns:
+            str: 函数代码的 SHA1 摘要，可用于 ``evalsha``
+        '''
+        msg = make_message(
+            message.CALL,
+            'function_load',
+            func, name, readonly=readonly, replace=replace
+        )
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
     def get(
         self,
         key: str,
@@ -193,7 +479,7 @@ class PydisClient(Client):
     ) -> Union[Any, None]:
         '''获取指定 key 的值
 
-        当传入的 key 不存在或失效时返回 None.
+        当传入的 key 不存在或失效时返回 None. 开启本地缓存时先查找缓存
 
         Args:
             key (str): 用于取值的 key.
@@ -201,6 +487,22 @@ class PydisClient(Client):
         Returns:
             Union[Any, None]: key 对于的值，不存在或失效为 None
         '''
+        cache = self.client_cache
+        if cache is None:
+            return self._get(key, block, timeout)
+        self._conn.poll()  # type: ignore
+        value = cache.get(key)
+        if value is MISSING:
+            value = self._get(key, block, timeout)
+            cache.put(key, value)
+        return value
+
+    @general_response_handler
+    def _get(
+        self,
+        key: str,
+        block=True, timeout: Optional[float] = None
+    ) -> Union[Any, None]:
         msg = make_message(message.CALL, 'get', key)
         return self.execute_command(msg, block, timeout)  # type: ignore
 
@@ -234,19 +536,78 @@ class PydisClient(Client):
         )
         return self.execute_command(msg, block, timeout)  # type: ignore
 
+    @general_response_handler
+    def info(
+        self,
+        section: Optional[str] = None,
+        block=True, timeout: Optional[float] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        '''获取服务的运行信息，见 ``Server.info``
+
+        Args:
+            section (str, optional): 只获取指定的部分. 默认为 None，表示全部
+
+        Raises:
+            ValueError: 部分不存在时引发
+        '''
+        msg = make_message(message.CALL, 'info', section)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
     @general_response_handler
     def keys(
             self,
+            pattern: Optional[str] = None,
             block=True, timeout: Optional[float] = None) -> List[str]:
-        '''获取所有合法的键
+        '''获取所有合法的键，可以通过 glob 风格的 ``pattern`` 筛选
 
         Returns:
             List[str]: 由键组成的列表
         '''
-        msg = make_message(message.CALL, 'keys')
+        if pattern is None:
+            msg = make_message(message.CALL, 'keys')
+        else:
+            msg = make_message(message.CALL, 'keys', pattern)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def lastsave(self, block=True, timeout: Optional[float] = None) -> float:
+        '''最近一次成功保存快照的时刻，unix 时间戳，没有保存过时为 0'''
+        msg = make_message(message.CALL, 'lastsave')
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def latency_history(
+        self,
+        event: str,
+        block=True, timeout: Optional[float] = None
+    ) -> List[Tuple[int, int]]:
+        '''指定延迟事件的所有样本，元素为 (时刻, 耗时毫秒)，见 ``pydis.multithreading.latency``'''
+        msg = make_message(message.CALL, 'latency_history', event)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def latency_latest(
+        self,
+        block=True, timeout: Optional[float] = None
+    ) -> Dict[str, Dict[str, int]]:
+        '''各延迟事件最近一个样本的时刻和耗时，以及历史最大耗时
+
+        只记录不低于 ``latency_monitor_threshold`` 毫秒的耗时，
+        这个配置项默认为 0，表示不记录，可通过 ``config_set`` 设置
+        '''
+        msg = make_message(message.CALL, 'latency_latest')
         return self.execute_command(msg, block, timeout)  # type: ignore
 
     @general_response_handler
+    def latency_reset(
+        self,
+        *events: str,
+        block=True, timeout: Optional[float] = None
+    ) -> int:
+        '''清除指定延迟事件的样本，没有指定时清除全部'''
+        msg = make_message(message.CALL, 'latency_reset', *events)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
     def mget(
         self,
         keys: Collection[str],
@@ -255,7 +616,8 @@ class PydisClient(Client):
         '''获取通过 ``keys`` 指定的键的值
 
         返回一个列表，长度与 ``keys`` 的长度相等，值的位置
-        与 ``keys`` 中键的位置一一对应，不存在或失效的键其值用 None 填充
+        与 ``keys`` 中键的位置一一对应，不存在或失效的键其值用 None 填充。
+        开启本地缓存时只向服务线程请求没有缓存的键
 
         Args:
             keys (Collection[str]): 键的集合
@@ -263,6 +625,26 @@ class PydisClient(Client):
         Returns:
             List[Any]: 与 ``keys`` 中的键对应的值，不存在的用 None 填充
         '''
+        cache = self.client_cache
+        if cache is None:
+            return self._mget(keys, block, timeout)
+        self._conn.poll()  # type: ignore
+        keys = list(keys)
+        values = [cache.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is MISSING]
+        if missing:
+            fetched = self._mget([keys[i] for i in missing], block, timeout)
+            for i, value in zip(missing, fetched):
+                values[i] = value
+                cache.put(keys[i], value)
+        return values
+
+    @general_response_handler
+    def _mget(
+        self,
+        keys: Collection[str],
+        block=True, timeout: Optional[float] = None
+    ) -> List[Any]:
         msg = make_message(
             message.CALL,
             'mget',
@@ -270,6 +652,12 @@ class PydisClient(Client):
         )
         return self.execute_command(msg, block, timeout)  # type: ignore
 
+    @general_response_handler
+    def metrics(self, block=True, timeout: Optional[float] = None) -> str:
+        '''以 Prometheus 文本格式导出服务的运行信息'''
+        msg = make_message(message.CALL, 'metrics')
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
     @general_response_handler
     def mset(
         self,
@@ -329,6 +717,52 @@ class PydisClient(Client):
         )
         return self.execute_command(msg, block, timeout)  # type: ignore
 
+    @general_response_handler
+    def save(
+        self,
+        path: Optional[str] = None,
+        block=True, timeout: Optional[float] = None
+    ) -> int:
+        '''在服务线程中保存快照，保存期间服务不处理其他请求，返回保存的键的数量'''
+        msg = make_message(message.CALL, 'save', path)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def scan(
+        self,
+        cursor: int = 0,
+        match: Optional[str] = None,
+        count: int = 10,
+        type: Optional[str] = None,
+        block=True, timeout: Optional[float] = None
+    ) -> Tuple[int, List[str]]:
+        '''增量地遍历键空间，每次只返回一小批键，见 ``Core.scan``
+
+        Returns:
+            Tuple[int, List[str]]: 下一次的游标，为 0 时遍历结束，以及本次返回的键
+        '''
+        msg = make_message(message.CALL, 'scan', cursor, match, count, type)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    def scan_iter(
+        self,
+        match: Optional[str] = None,
+        count: int = 10,
+        type: Optional[str] = None,
+        block=True, timeout: Optional[float] = None
+    ) -> Iterator[str]:
+        '''以生成器的形式遍历键空间，参数见 ``scan``
+
+        每批键取完后才会发出下一次请求，服务线程不会被长时间占用
+        '''
+        cursor = 0
+        while True:
+            cursor, keys = self.scan(
+                cursor, match, count, type, block=block, timeout=timeout)
+            yield from keys
+            if not cursor:
+                return
+
     @general_response_handler
     def set(
             self,
@@ -390,6 +824,38 @@ class PydisClient(Client):
         )
         return self.execute_command(msg, block, timeout)  # type: ignore
 
+    @general_response_handler
+    def slowlog_get(
+        self,
+        count: int = 10,
+        block=True, timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        '''获取最近的 ``count`` 条慢查询记录，新的在前，见 ``Server.slowlog_get``
+
+        慢查询的阈值和日志容量通过 ``config_set`` 设置，对应的配置项为
+        ``slowlog_log_slower_than``（微秒）和 ``slowlog_max_len``
+        '''
+        msg = make_message(message.CALL, 'slowlog_get', count)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def slowlog_len(self, block=True, timeout: Optional[float] = None) -> int:
+        '''慢查询日志中记录的数量'''
+        msg = make_message(message.CALL, 'slowlog_len')
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def slowlog_reset(self, block=True, timeout: Optional[float] = None) -> bool:
+        '''清空慢查询日志'''
+        msg = make_message(message.CALL, 'slowlog_reset')
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def stats_reset(self, block=True, timeout: Optional[float] = None) -> bool:
+        '''重置服务的所有统计'''
+        msg = make_message(message.CALL, 'stats_reset')
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
     @general_response_handler
     def ttl(
         self,
@@ -410,3 +876,174 @@ class PydisClient(Client):
         '''
         msg = make_message(message.CALL, 'ttl', key)
         return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def unlink(
+        self,
+        *keys: str,
+        block=True, timeout: Optional[float] = None
+    ) -> int:
+        '''删除一个或多个键，大的值在服务的后台线程中释放
+
+        Returns:
+            int: 成功操作的数量
+        '''
+        msg = make_message(message.CALL, 'unlink', *keys)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+    @general_response_handler
+    def versions(
+        self,
+        *keys: str,
+        block=True, timeout: Optional[float] = None
+    ) -> List[int]:
+        '''获取指定键的版本号，不存在或失效的键版本号为 0
+
+        Returns:
+            List[int]: 与 ``keys`` 中的键一一对应的版本号
+        '''
+        msg = make_message(message.CALL, 'versions', *keys)
+        return self.execute_command(msg, block, timeout)  # type: ignore
+
+
+class Pipeline(PydisClient):
+    '''命令流水线
+
+    接口与 PydisClient 相同，但调用命令时只将命令缓存起来并返回流水线本身，
+    以便链式调用。调用 ``execute`` 时，所有缓存的命令作为一条消息发送，
+    服务线程依次执行它们，期间不会处理其他连接的请求，并一次性返回结果
+
+    命令的 ``block`` 和 ``timeout`` 参数会被忽略，改由 ``execute`` 的参数控制
+
+    调用 ``watch`` 后，流水线进入监视状态，此后的命令会被立即执行并返回结果，
+    直到调用 ``multi`` 才重新开始缓存命令。``execute`` 时如果被监视的键
+    已被修改，将放弃执行并引发 WatchError
+
+    线程不安全，不要在线程间共享
+
+    eg:
+        with client.pipeline() as pipe:
+            pipe.set('key', 'val').incr('counter')
+            pipe.get('key')
+            pipe.execute()  # [True, 1, 'val']
+    '''
+
+    def __init__(self, client: PydisClient, transaction=False) -> None:
+        self.client = client
+        self.default_timout = client.default_timout
+        self.client_cache = None  # 流水线中的读取不经过本地缓存
+        self.transaction = transaction
+        self.command_stack: List[RequestT] = []
+        self.watched: Dict[str, int] = {}
+        self.explicit_transaction = False
+
+    def __len__(self) -> int:
+        return len(self.command_stack)
+
+    def __enter__(self) -> 'Pipeline':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.reset()
+
+    def reset(self):
+        '''丢弃所有缓存的命令，并取消监视'''
+        self.command_stack = []
+        self.watched = {}
+        self.explicit_transaction = False
+
+    @property
+    def watching(self) -> bool:
+        return bool(self.watched)
+
+    def watch(self, *keys: str):
+        '''监视指定的键，执行事务前它们被修改过时，事务将被放弃
+
+        Raises:
+            RuntimeError: 在 ``multi`` 之后调用时引发
+        '''
+        if self.explicit_transaction:
+            raise RuntimeError('cannot issue a WATCH after a MULTI')
+        versions = self.client.versions(*keys)
+        self.watched.update(zip(keys, versions))
+
+    def unwatch(self):
+        '''取消对所有键的监视'''
+        self.watched = {}
+
+    def multi(self):
+        '''开始缓存事务中的命令，只在 ``watch`` 之后需要显式调用
+
+        Raises:
+            RuntimeError: 重复调用或已有缓存的命令时引发
+        '''
+        if self.explicit_transaction:
+            raise RuntimeError('cannot issue nested calls to MULTI')
+        if self.command_stack:
+            raise RuntimeError(
+                'commands without an initial WATCH have already been issued')
+        self.explicit_transaction = True
+
+    def close(self):
+        # 流水线借用 client 的连接，不需要关闭
+        self.reset()
+
+    def execute_command(
+        self,
+        msg: RequestT,
+        block=True,
+        timeout: Optional[float] = None
+    ) -> ResponseT:
+        if self.watched and not self.explicit_transaction:
+            return self.client.execute_command(msg, block, timeout)
+        self.command_stack.append(msg)
+        return (message.RETURN, self)
+
+    def execute(
+        self,
+        raise_on_error=True,
+        block=True, timeout: Optional[float] = None
+    ) -> List[Any]:
+        '''发送所有缓存的命令，并按顺序返回它们的结果
+
+        所有命令都会被执行，某条命令出错不影响其他命令
+
+        Args:
+            raise_on_error (bool, optional):
+                为 True 时，如果有命令出错，引发第一个错误；
+                否则将错误作为结果返回. 默认为 True
+
+        Raises:
+            WatchError: 被监视的键在执行前被修改时引发
+
+        Returns:
+            List[Any]: 各命令的结果
+        '''
+        msg = self._pack()
+        if msg is None:
+            return []
+        resp = self.client.execute_command(msg, block, timeout)
+        return self._unpack(resp, raise_on_error)
+
+    def _pack(self) -> Optional[RequestT]:
+        '''将缓存的命令打包为一条消息，并重置流水线，没有命令时返回 None'''
+        stack, watched = self.command_stack, self.watched
+        self.reset()
+        if not stack:
+            return None
+        if self.transaction or watched:
+            return (message.EXEC, None, (watched, stack))
+        return (message.PIPELINE, None, stack)
+
+    def _unpack(self, resp: ResponseT, raise_on_error: bool) -> List[Any]:
+        kind, result = resp
+        if kind == message.ERROR:
+            raise result
+        if result is None:
+            raise WatchError('watched keys have been changed')
+        values = []
+        for kind, value in result:
+            if kind == message.ERROR and raise_on_error:
+                raise value
+            values.append(value)
+        return values
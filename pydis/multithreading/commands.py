@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+'''服务线程支持的命令表
+
+消息中以整数操作码表示命令，服务线程启动时按本表预先解析出每条命令的
+处理函数，执行时只需一次字典查找，不再对任意名称调用 getattr
+
+命令的元数据仿照 redis 的命令表：
+
+- arity: 与 redis 相同，为参数的数量（位置参数与关键字参数之和）加上命令本身，
+  负数表示至少 ``-arity`` 个
+- flags: 命令的标志，见 ``READONLY`` 等常量
+- first_key、last_key、key_step: 键在位置参数中的分布，``last_key`` 为负数时
+  从末尾倒数，``key_step`` 为 0 表示命令不含键。带有 ``KEYS_IN_CONTAINER``
+  标志的命令，``first_key`` 处的参数是键的集合（list 或 dict）
+'''
+
+from typing import Any, Dict, List, NamedTuple, Sequence
+
+READONLY = 1 << 0           # 只读取数据
+WRITE = 1 << 1              # 可能修改数据
+ADMIN = 1 << 2              # 管理命令，不直接读写键
+KEYS_IN_CONTAINER = 1 << 3  # 键位于作为参数的容器中，如 mget、mset
+
+
+class Command(NamedTuple):
+    '''命令的元数据'''
+    opcode: int
+    name: str
+    arity: int
+    flags: int
+    first_key: int = 0
+    last_key: int = 0
+    key_step: int = 0
+
+    @property
+    def readonly(self) -> bool:
+        return bool(self.flags & READONLY)
+
+    @property
+    def write(self) -> bool:
+        return bool(self.flags & WRITE)
+
+    def check_arity(self, nargs: int) -> bool:
+        '''检查参数的数量（不含命令本身）是否符合要求'''
+        arity = self.arity
+        return nargs + 1 == arity if arity >= 0 else nargs + 1 >= -arity
+
+    def get_keys(self, args: Sequence[Any]) -> List[str]:
+        '''从位置参数中取出命令涉及的键'''
+        if not self.key_step or len(args) <= self.first_key:
+            return []
+        if self.flags & KEYS_IN_CONTAINER:
+            return list(args[self.first_key])
+        last = self.last_key
+        if last < 0:
+            last += len(args)
+        return list(args[self.first_key:last + 1:self.key_step])
+
+
+COMMANDS: List[Command] = [
+    Command(1, 'get', 2, READONLY, 0, 0, 1),
+    Command(2, 'set', -3, WRITE, 0, 0, 1),
+    Command(3, 'setnx', -3, WRITE, 0, 0, 1),
+    Command(4, 'mget', 2, READONLY | KEYS_IN_CONTAINER, 0, 0, 1),
+    Command(5, 'mset', -2, WRITE | KEYS_IN_CONTAINER, 0, 0, 1),
+    Command(6, 'msetnx', -2, WRITE | KEYS_IN_CONTAINER, 0, 0, 1),
+    Command(7, 'delete', -2, WRITE, 0, -1, 1),
+    Command(8, 'exists', 2, READONLY, 0, 0, 1),
+    Command(9, 'keys', -1, READONLY),
+    Command(10, 'ttl', 2, READONLY, 0, 0, 1),
+    Command(11, 'incr', -2, WRITE, 0, 0, 1),
+    Command(12, 'decr', -2, WRITE, 0, 0, 1),
+    Command(13, 'expire', -3, WRITE, 0, 0, 1),
+    Command(14, 'flushdb', -1, WRITE),
+    Command(15, 'versions', -2, READONLY, 0, -1, 1),
+    Command(16, 'empty', 1, READONLY),
+    Command(17, 'scan', -1, READONLY),
+    Command(18, 'delete_prefix', 2, WRITE),
+    Command(19, 'unlink', -2, WRITE, 0, -1, 1),
+    Command(20, 'dbsize', 1, READONLY),
+    Command(32, 'fcall', -2, WRITE),
+    Command(33, 'fcall_ro', -2, READONLY),
+    Command(34, 'evalsha', -2, WRITE),
+    Command(35, 'function_load', -2, ADMIN),
+    Command(36, 'function_delete', 2, ADMIN),
+    Command(37, 'function_list', 1, ADMIN),
+    Command(38, 'function_flush', 1, ADMIN),
+    Command(48, 'config_get', 2, ADMIN),
+    Command(49, 'config_set', 3, ADMIN),
+    Command(50, 'info', -1, ADMIN),
+    Command(51, 'metrics', 1, ADMIN),
+    Command(52, 'stats_reset', 1, ADMIN),
+    Command(53, 'slowlog_get', -1, ADMIN),
+    Command(54, 'slowlog_len', 1, ADMIN),
+    Command(55, 'slowlog_reset', 1, ADMIN),
+    Command(56, 'latency_latest', 1, ADMIN),
+    Command(57, 'latency_history', 2, ADMIN),
+    Command(58, 'latency_reset', -1, ADMIN),
+    Command(59, 'save', -1, ADMIN),
+    Command(60, 'bgsave', -1, ADMIN),
+    Command(61, 'lastsave', 1, ADMIN),
+    Command(62, 'bgrewriteaof', 1, ADMIN),
+    Command(63, 'client_tracking', 2, ADMIN),
+]
+
+COMMANDS_BY_OPCODE: Dict[int, Command] = {c.opcode: c for c in COMMANDS}
+OPCODES: Dict[str, int] = {c.name: c.opcode for c in COMMANDS}
@@ -1,20 +1,43 @@
 # -*- coding: utf-8 -*-
 
 import socket
+from itertools import count
 from queue import Empty, Queue
 from threading import Event
-from typing import Optional, Tuple
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 from ..exceptions import ConnectionClosedError, ReceiveTimeout
-from .typing import MessageT
+from .message import message
+from .typing import MessageT, RequestT, ResponseT
 
 
 CLOSE = '#CLS'
 
 
+class MessageQueue(Queue):
+    '''记录放入元素前是否为空的 Queue，用于合并唤醒字节'''
+
+    was_empty = True
+
+    def _put(self, item):
+        # 在 Queue 的锁中执行，与读取端的 get 互斥
+        self.was_empty = not self.queue
+        self.queue.append(item)
+
+
 class Connection:
     '''基于 Queue 抽象的连接端点
 
+    数据通过 Queue 传递，socketpair 只用于唤醒 select：只有在队列
+    由空变为非空时才写入一个唤醒字节，读取时一次性读出所有唤醒字节，
+    再从队列中取出数据，因此可读事件不会多于队列中的数据批次
+
+    请求通过 ``send_request`` 发送，会被附上一个连接内唯一的请求 ID，
+    响应通过 ``recv_response`` 按 ID 取回。多个请求可以同时在途，
+    先到达的其他请求的响应会被暂存；已经超时放弃的请求，其响应到达时
+    直接丢弃，不会被后续的请求误读。服务端推送的失效消息交给 ``on_invalidate``
+
     线程不安全，不要在线程间共享
     '''
 
@@ -29,6 +52,13 @@ class Connection:
         self._closed = close_evt
         socket.setblocking(False)
         self._socket = socket
+        self._request_ids = count(1)
+        self.id = 0
+        '''连接的 ID，由服务端在打开连接时分配，用于在日志中标识客户端'''
+        self._waiting: Set[int] = set()
+        self._replies: Dict[int, ResponseT] = {}
+        self.on_invalidate: Optional[Callable[[Optional[List[str]]], Any]] = None
+        '''处理服务端推送的失效消息的函数，参数为失效的键，None 表示全部失效'''
 
     def send(self, data: MessageT):
         '''发送数据
@@ -38,8 +68,25 @@ class Connection:
         '''
         if self.closed:
             raise ConnectionClosedError('connection has been closed')
-        self.q_send.put(data)
-        self._socket.send(b'x')
+        q_send = self.q_send
+        q_send.put(data)
+        if getattr(q_send, 'was_empty', True):
+            self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self._socket.send(b'x')
+        except (BlockingIOError, InterruptedError):
+            pass  # 缓冲区已满，说明对端还有未读取的唤醒字节
+        except OSError:
+            pass  # 对端已经关闭，由 closed 标志通知调用方
+
+    def _drain_wakeups(self):
+        # 唤醒字节已被合并，一次读取即可取出全部
+        try:
+            self._socket.recv(4096)
+        except socket.error:
+            pass
 
     def recv(
         self, block=True, timeout: Optional[float] = None
@@ -54,10 +101,7 @@ class Connection:
         '''
         if self.closed:
             raise ConnectionClosedError('connection has been closed')
-        try:
-            self._socket.recv(1)
-        except socket.error:
-            pass
+        self._drain_wakeups()
         try:
             ret = self.q_recv.get(block, timeout)
             if ret is CLOSE:
@@ -67,6 +111,85 @@ class Connection:
         except Empty:
             raise ReceiveTimeout
 
+    def next_request_id(self) -> int:
+        return next(self._request_ids)
+
+    def send_request(self, request: RequestT) -> int:
+        '''为请求分配 ID 并发送，返回请求 ID'''
+        rid = next(self._request_ids)
+        self.send((rid, *request))
+        self._waiting.add(rid)
+        return rid
+
+    def recv_response(
+        self, rid: int, block=True, timeout: Optional[float] = None
+    ) -> ResponseT:
+        '''接收 ID 为 ``rid`` 的请求的响应
+
+        ``block``、``timeout`` 的含义与 ``recv`` 相同，``timeout`` 为总的等待时长。
+        超时后该请求被视为放弃，它的响应到达时会被丢弃
+
+        Raises:
+            ReceiveTimeout: 超时时引发
+            ConnectionClosedError: 连接被关闭时引发
+        '''
+        waiting, replies = self._waiting, self._replies
+        if rid in replies:
+            waiting.discard(rid)
+            return replies.pop(rid)
+        deadline = None
+        if block and timeout is not None:
+            deadline = monotonic() + timeout
+        try:
+            while True:
+                if deadline is not None:
+                    timeout = max(deadline - monotonic(), 0)
+                msg = self.recv(block, timeout)
+                if msg[0] == rid:
+                    return msg[1:]  # type: ignore
+                self._dispatch(msg)
+        finally:
+            waiting.discard(rid)
+
+    def poll(self):
+        '''非阻塞地处理已经到达的消息，用于在读取本地缓存前取出推送的失效消息'''
+        while self.pending:
+            self._dispatch(self.recv(block=False))
+
+    def _dispatch(self, msg: MessageT):
+        '''处理不是正在等待的响应的消息：暂存其他在途请求的响应，处理推送消息'''
+        reply_id, kind, result = msg  # type: ignore
+        if reply_id in self._waiting:
+            self._replies[reply_id] = (kind, result)
+        elif kind == message.INVALIDATE and self.on_invalidate is not None:
+            self.on_invalidate(result)
+        # 其余为已放弃的请求迟到的响应，直接丢弃
+
+    def recv_many(self, limit: int) -> List[MessageT]:
+        '''非阻塞地取出至多 ``limit`` 条数据，没有数据时返回空列表
+
+        当连接被关闭时，抛出 ConnectionClosedError
+        '''
+        if self.closed:
+            raise ConnectionClosedError('connection has been closed')
+        self._drain_wakeups()
+        q_recv, ret = self.q_recv, []
+        queue = q_recv.queue  # 只有本端读取，非空时 get_nowait 必定成功
+        while queue and len(ret) < limit:
+            data = q_recv.get_nowait()
+            q_recv.task_done()
+            if data is CLOSE:
+                if not ret:
+                    raise ConnectionClosedError('connection has been closed')
+                break
+            ret.append(data)
+        return ret
+
+    @property
+    def pending(self) -> bool:
+        '''是否还有未取出的数据'''
+        return not self.q_recv.empty()
+
     def fileno(self):
         return self._socket.fileno()
 
@@ -74,7 +197,10 @@ class Connection:
         if not self.closed:
             self._closed.set()
             self.q_send.put(CLOSE)
-            self._socket.send(b'x')
+            try:
+                self._socket.send(b'x')
+            except OSError:
+                pass  # 对端已经关闭
         self._socket.close()
 
     def __del__(self):
@@ -91,7 +217,7 @@ def open_connection() -> Tuple[Connection, Connection]:
     Returns:
         Tuple[Connection, Connection]: 一个连接的两端
     '''
-    q1, q2 = Queue(), Queue()
+    q1, q2 = MessageQueue(), MessageQueue()
     evt = Event()
     sock1, sock2 = socket.socketpair()
     return Connection(q1, q2, evt, sock1), Connection(q2, q1, evt, sock2)
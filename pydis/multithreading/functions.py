@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import marshal
+from hashlib import sha1
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+
+class Function(NamedTuple):
+    '''注册到服务中的函数
+
+    Attributes:
+        name (str): 函数名称
+        func (Callable): 函数本身，第一个参数为服务实例
+        digest (str): 函数代码的 SHA1 摘要
+        readonly (bool): 是否只读，只读函数不应修改数据
+    '''
+    name: str
+    func: Callable[..., Any]
+    digest: str
+    readonly: bool
+
+
+def digest(func: Callable[..., Any]) -> str:
+    '''计算函数代码的 SHA1 摘要，代码相同的函数摘要相同'''
+    code = getattr(func, '__code__', None)
+    if code is None:
+        raise TypeError('can not compute digest of %r' % func)
+    return sha1(marshal.dumps(code)).hexdigest()
+
+
+class FunctionRegistry:
+    '''以名称和摘要两种方式索引的函数表'''
+
+    def __init__(self) -> None:
+        self._by_name: Dict[str, Function] = {}
+        self._by_digest: Dict[str, Function] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def load(
+        self,
+        func: Callable[..., Any],
+        name: Optional[str] = None,
+        readonly: bool = False,
+        replace: bool = False
+    ) -> Function:
+        '''注册函数
+
+        Raises:
+            ValueError: 名称已被使用，并且 ``replace`` 为 False 时引发
+        '''
+        if name is None:
+            name = func.__name__
+        if not replace and name in self._by_name:
+            raise ValueError('function %r already exists' % name)
+        self.delete(name)
+        function = Function(name, func, digest(func), readonly)
+        self._by_name[name] = function
+        self._by_digest[function.digest] = function
+        return function
+
+    def delete(self, name: str) -> bool:
+        function = self._by_name.pop(name, None)
+        if function is None:
+            return False
+        if self._by_digest.get(function.digest) is function:
+            del self._by_digest[function.digest]
+        return True
+
+    def get(self, name: str) -> Function:
+        '''
+        Raises:
+            ValueError: 函数不存在时引发
+        '''
+        try:
+            return self._by_name[name]
+        except KeyError:
+            raise ValueError('function %r not found' % name) from None
+
+    def get_by_digest(self, digest: str) -> Function:
+        '''
+        Raises:
+            ValueError: 函数不存在时引发
+        '''
+        try:
+            return self._by_digest[digest]
+        except KeyError:
+            raise ValueError('no function matching digest %r' % digest) from None
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [
+            {'name': f.name, 'digest': f.digest, 'readonly': f.readonly}
+            for f in self._by_name.values()
+        ]
+
+    def clear(self):
+        self._by_name.clear()
+        self._by_digest.clear()
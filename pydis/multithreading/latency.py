@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+'''服务线程的延迟监控
+
+仿照 redis 的 LATENCY 命令，按事件类别记录超过阈值的耗时：
+
+- ``event-loop``: 服务线程一轮循环中实际工作的时长，不含等待请求的时间
+- ``expire-cycle``: 一次定期清理的时长
+- ``bulk-free``: 一次批量删除或清空数据的时长
+
+每个类别保存最近的 ``LATENCY_HISTORY_LEN`` 个样本和历史最大值，
+同一秒内的多个样本只保留最大的一个
+
+``Watchdog`` 在单独的线程中检查服务线程的一轮循环是否超时，
+超时时通过 logging 输出服务线程的调用栈
+'''
+
+import logging
+import sys
+import traceback
+from collections import deque
+from threading import Event, Thread
+from time import perf_counter, time
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+EVENT_LOOP = 'event-loop'
+EXPIRE_CYCLE = 'expire-cycle'
+BULK_FREE = 'bulk-free'
+LATENCY_HISTORY_LEN = 160
+
+logger = logging.getLogger(__name__)
+
+
+class LatencySample(NamedTuple):
+    timestamp: int  # unix 时间戳，以秒计
+    latency: int    # 以毫秒计
+
+
+class _EventHistory:
+    __slots__ = ['samples', 'max']
+
+    def __init__(self) -> None:
+        self.samples: Deque[LatencySample] = deque(maxlen=LATENCY_HISTORY_LEN)
+        self.max = 0
+
+
+class LatencyMonitor:
+    '''按事件类别记录超过阈值的耗时
+
+    Attributes:
+        threshold (int): 阈值，以毫秒计，不低于此值的耗时才会被记录，0 表示不记录
+    '''
+
+    def __init__(self, threshold: int = 0) -> None:
+        self.threshold = threshold
+        self._events: Dict[str, _EventHistory] = {}
+
+    def add(self, event: str, seconds: float):
+        '''记录一次耗时，未达到阈值时直接返回'''
+        threshold = self.threshold
+        if not threshold:
+            return
+        latency = int(seconds * 1000)
+        if latency < threshold:
+            return
+        history = self._events.get(event)
+        if history is None:
+            history = self._events[event] = _EventHistory()
+        now = int(time())
+        samples = history.samples
+        if samples and samples[-1].timestamp == now:
+            if samples[-1].latency < latency:
+                samples[-1] = LatencySample(now, latency)
+        else:
+            samples.append(LatencySample(now, latency))
+        if latency > history.max:
+            history.max = latency
+
+    def latest(self) -> Dict[str, Dict[str, int]]:
+        '''各类别最近一个样本的时刻和耗时，以及历史最大耗时'''
+        return {
+            event: {
+                'timestamp': history.samples[-1].timestamp,
+                'latest': history.samples[-1].latency,
+                'max': history.max,
+            }
+            for event, history in self._events.items() if history.samples
+        }
+
+    def history(self, event: str) -> List[Tuple[int, int]]:
+        '''指定类别的所有样本，元素为 (时刻, 耗时)，旧的在前'''
+        history = self._events.get(event)
+        if history is None:
+            return []
+        return [tuple(sample) for sample in history.samples]  # type: ignore
+
+    def reset(self, *events: str) -> int:
+        '''清除指定类别的样本，没有指定时清除全部，返回被清除的类别的数量'''
+        if not events:
+            count = len(self._events)
+            self._events.clear()
+            return count
+        return sum(1 for event in events if self._events.pop(event, None))
+
+
+class Watchdog:
+    '''检查服务线程是否停顿的看门狗
+
+    ``busy_since`` 返回服务线程本轮循环开始工作的时刻（perf_counter 读数），
+    空闲时返回 None。工作时长超过 ``period`` 时，输出一次服务线程的调用栈
+
+    Attributes:
+        period (float): 超时时长，以秒计
+        stalls (int): 发现停顿的次数
+        last_stack (str): 最近一次停顿时服务线程的调用栈
+    '''
+
+    def __init__(
+        self,
+        busy_since: Callable[[], Optional[float]],
+        thread_ident: Callable[[], Optional[int]],
+        period: float
+    ) -> None:
+        self.period = period
+        self.stalls = 0
+        self.last_stack = ''
+        self._busy_since = busy_since
+        self._thread_ident = thread_ident
+        self._stop_evt = Event()
+        Thread(target=self._run, name='pydis-watchdog', daemon=True).start()
+
+    def _run(self):
+        reported = None
+        while not self._stop_evt.wait(self.period / 2):
+            since = self._busy_since()
+            if since is None or since == reported:
+                continue
+            elapsed = perf_counter() - since
+            if elapsed < self.period:
+                continue
+            reported = since  # 同一轮循环只报告一次
+            frame = sys._current_frames().get(self._thread_ident())  # type: ignore
+            stack = ''.join(traceback.format_stack(frame)) if frame else ''
+            self.stalls += 1
+            self.last_stack = stack
+            logger.warning(
+                'server thread has been busy for %.1f ms\n%s', elapsed * 1000, stack)
+
+    def stop(self):
+        self._stop_evt.set()
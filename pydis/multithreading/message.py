@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
 
-from enum import Enum
 
-
-class message(Enum):
-    GET = 1
-    SET = 2
+class message:
+    '''消息种类，以整数表示，比较时不需要经过 Enum'''
     CALL = 3
+    PIPELINE = 4
+    EXEC = 5
     RETURN = 10
     ERROR = 11
+    INVALIDATE = 12  # 服务端推送的失效消息，请求 ID 为 0，见 ``Server.client_tracking``
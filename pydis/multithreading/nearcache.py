@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+'''客户端本地缓存
+
+开启后客户端通过 ``client_tracking`` 让服务线程记录它读取过的键，读取到的值保存在
+本地的 LRU 缓存中，再次读取时只需一次字典查找。键在服务端被修改、删除、失效或淘汰时，
+服务线程推送失效消息，客户端在下一次读取缓存前处理这些消息，见 ``pydis.tracking``
+
+失效消息先于写命令的响应送达，因此同一个客户端总能读到自己写入的值；
+其他客户端的写入在推送送达之后可见。已经失效但还没有被服务端清理的键，
+在定期清理（``active_expire_cycle``）之前仍可能从缓存中读到
+'''
+
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional
+
+MISSING = object()
+'''缓存中没有指定的键'''
+
+
+class NearCache:
+    '''容量有限的 LRU 缓存，超出容量时丢弃最久没有读取的键
+
+    Attributes:
+        maxsize (int): 缓存的键的数量上限
+        hits (int): 命中的次数
+        misses (int): 没有命中的次数
+    '''
+
+    def __init__(self, maxsize: int) -> None:
+        if maxsize <= 0:
+            raise ValueError('maxsize must be positive')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable) -> Any:
+        '''获取缓存的值，没有缓存时返回 ``MISSING``'''
+        data = self._data
+        try:
+            value = data[key]
+        except KeyError:
+            self.misses += 1
+            return MISSING
+        data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        data = self._data
+        data[key] = value
+        data.move_to_end(key)
+        if len(data) > self.maxsize:
+            data.popitem(last=False)
+
+    def invalidate(self, keys: Optional[List[str]]):
+        '''处理失效消息，``keys`` 为 None 时清空缓存'''
+        if keys is None:
+            self._data.clear()
+            return
+        pop = self._data.pop
+        for key in keys:
+            pop(key, None)
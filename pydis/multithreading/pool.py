@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+from contextlib import contextmanager
+from threading import Condition, local
+from time import monotonic
+from typing import Callable, Iterator, List, Optional, Set
+
+from ..exceptions import ConnectionClosedError, PoolTimeout
+from .connection import Connection
+from .server import Server
+
+
+def server_connection() -> Connection:
+    '''打开一个到服务线程的连接，并确保服务线程已启动'''
+    conn = Server.open_connection()
+    Server().start()
+    return conn
+
+
+class ConnectionPool:
+    '''线程安全的连接池
+
+    连接在第一次需要时才打开，总数不超过 ``max_connections``。
+    连接用尽时 ``get_connection`` 阻塞等待，超时引发 PoolTimeout
+
+    每个线程优先取回自己上一次使用的连接。取出和归还时检查连接是否已关闭，已关闭的连接被丢弃，不占用名额
+
+    eg:
+        pool = ConnectionPool(max_connections=4)
+        client = PydisClient(connection_pool=pool)  # 可以在线程间共享
+
+    Attributes:
+        max_connections (int): 连接数量的上限
+        timeout (float): 等待空闲连接的默认超时，默认为 None，表示永远等待
+    '''
+
+    def __init__(
+        self,
+        max_connections: int = 8,
+        timeout: Optional[float] = None,
+        connection_factory: Callable[[], Connection] = server_connection
+    ) -> None:
+        if max_connections < 1:
+            raise ValueError("'max_connections' must be a positive number")
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.connection_factory = connection_factory
+        self._cond = Condition()
+        self._idle: List[Connection] = []
+        self._in_use: Set[Connection] = set()
+        self._local = local()
+        self._closed = False
+
+    def __len__(self) -> int:
+        '''已打开的连接的数量'''
+        with self._cond:
+            return len(self._idle) + len(self._in_use)
+
+    def get_connection(self, timeout: Optional[float] = None) -> Connection:
+        '''取出一个连接，用完后需要通过 ``release`` 归还
+
+        Args:
+            timeout (float, optional): 等待空闲连接的超时. 默认为 ``self.timeout``
+
+        Raises:
+            PoolTimeout: 超时仍没有空闲连接时引发
+            ConnectionClosedError: 连接池已被关闭时引发
+        '''
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise ConnectionClosedError('connection pool has been closed')
+                conn = self._pop_idle()
+                if conn is not None:
+                    break
+                if len(self._idle) + len(self._in_use) < self.max_connections:
+                    # 在锁中打开，保证连接数量不超过上限
+                    conn = self.connection_factory()
+                    break
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise PoolTimeout('no connection available')
+                self._cond.wait(remaining)
+            self._in_use.add(conn)
+        self._local.conn = conn
+        return conn
+
+    def _pop_idle(self) -> Optional[Connection]:
+        # 优先取回本线程上一次使用的连接，否则取最近归还的连接
+        idle = self._idle
+        preferred = getattr(self._local, 'conn', None)
+        if preferred is not None and not preferred.closed:
+            for i, conn in enumerate(idle):
+                if conn is preferred:
+                    del idle[i]
+                    return conn
+        while idle:
+            conn = idle.pop()
+            if not conn.closed:
+                return conn
+        return None
+
+    def release(self, conn: Connection):
+        '''归还通过 ``get_connection`` 取出的连接
+
+        Raises:
+            ValueError: 连接不属于本连接池时引发
+        '''
+        with self._cond:
+            try:
+                self._in_use.remove(conn)
+            except KeyError:
+                raise ValueError('connection does not belong to this pool') from None
+            if self._closed:
+                conn.close()
+            elif not conn.closed:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[Connection]:
+        '''以上下文管理器的方式取出并归还连接'''
+        conn = self.get_connection(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        '''关闭所有空闲的连接，正在使用的连接在归还时关闭'''
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
@@ -1,19 +1,34 @@
 # -*- coding: utf-8 -*-
 
-from random import sample as random_sample
-from select import select
-from threading import Event, Lock, Thread, Condition
-from time import monotonic as time
-from typing import Generic, TypeVar
-
+import logging
+import selectors
+from threading import Event, Lock, Thread, Condition, get_ident
+from time import monotonic as time, perf_counter, time as unix_time
+from functools import partial
+from itertools import count
+from typing import (Any, Callable, Collection, Dict, List, Generic, Optional,
+                    Tuple, TypeVar)
+
+from .. import mapped, rdb
 from ..core import Core
-from ..exceptions import ConnectionClosedError, ReceiveTimeout, ServerStopped
+from ..exceptions import AofError, ConnectionClosedError, ServerStopped
+from ..lazyfree import LazyFree
+from ..tracking import TRACKING_MAX_KEYS, Tracking
+from .aof import FSYNC_POLICIES, AppendOnlyFile, replay
+from .commands import COMMANDS, COMMANDS_BY_OPCODE, OPCODES, READONLY, WRITE, Command
 from .connection import Connection, open_connection
+from .functions import FunctionRegistry
+from .latency import (BULK_FREE, EVENT_LOOP, EXPIRE_CYCLE, LatencyMonitor,
+                      Watchdog)
 from .message import message
-from .typing import RequestT
+from .slowlog import SlowLog
+from .stats import CommandStats, to_prometheus
+from .typing import RequestT, ResponseT, TaggedRequestT
 
 T = TypeVar('T')
 
+logger = logging.getLogger(__name__)
+
 
 class Set(set, Generic[T]):
     '''扩充 set 的功能'''
@@ -77,26 +92,106 @@ class Set(set, Generic[T]):
             self.not_empty.notify()
 
 
-LOOKUPS_PER_LOOP = 20  # 每轮抽查的键的数量
-ACCEPTABLE_STALE = 10  # 10%
 TIME_PERC = 25 / 1000  # 25ms
 MAX_TIME_SPAN = 0.1    # 100ms
+MAX_REQUESTS_PER_CONN = 64  # 每轮从一个连接中最多处理的请求数量
+MATERIALIZE_TIME_PERC = 5 / 1000  # 每轮载入映射快照的耗时上限，5ms
+DB_FORMATS = ('rdb', 'mapped')  # 快照文件的格式，见 pydis.rdb 和 pydis.mapped
+CONFIG_PARAMS = (  # 可以通过 config_set 修改的配置项
+    'maxkeys',
+    'maxkeys_policy',
+    'key_index',
+    'stats_enabled',
+    'slowlog_log_slower_than',
+    'slowlog_max_len',
+    'latency_monitor_threshold',
+    'watchdog_period',
+    'dbfilename',
+    'dbformat',
+    'appendonly',
+    'appendfilename',
+    'appendfsync',
+    'tracking_table_max_keys',
+)
+
+
+class _TrackedReads:
+    '''开启跟踪的客户端调用函数时，代替服务实例传给函数
+
+    函数通过它调用的只读命令读取的键同样记录到跟踪表，其他属性直接取自服务实例
+    '''
+
+    def __init__(self, server: 'Server', tracking: Tracking, client: Any) -> None:
+        self._server = server
+        self._tracking = tracking
+        self._client = client
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._server, name)
+        command = COMMANDS_BY_OPCODE.get(OPCODES.get(name))  # type: ignore
+        if command is None or not command.flags & READONLY:
+            return attr
+
+        def tracked(*args, **kwargs):
+            ret = attr(*args, **kwargs)
+            self._tracking.track(self._client, command.get_keys(args))
+            return ret
+        return tracked
 
 
 class Server(Core):
     '''用于处理数据的服务'''
 
     _connections: Set[Connection] = Set()
+    _selector = selectors.DefaultSelector()
     _mutex = Lock()
     _stop_evt = Event()
     _started = False
+    _client_ids = count(1)
 
     def __init__(self):
-        self.stat_expired_stale_perc = 0
-        '''估计的失效键比例，去 % 的整数值'''
+        self.timelimit_exit = False
+        '''上次清理是否因为超时而退出'''
         self.last_time_cycle = 0
         '''上次执行清理的时刻'''
+        self.functions = FunctionRegistry()
+        '''注册到服务中的函数'''
+        self._pending: List[Connection] = []
+        '''上一轮因达到处理上限而仍有请求的连接'''
+        self.stats_enabled = True
+        '''是否记录每条命令的调用次数和耗时'''
+        self.stat_total_commands = 0
+        '''从连接中收到的请求的数量'''
+        self.start_time = time()
+        self.slowlog = SlowLog()
+        '''慢查询日志'''
+        self.slowlog_log_slower_than = 10000
+        '''耗时不少于此值（微秒）的命令被记入慢查询日志，负数表示不记录'''
+        self._current_client: Optional[Connection] = None
+        '''正在处理的连接'''
+        self.latency = LatencyMonitor()
+        '''延迟监控，阈值通过 ``latency_monitor_threshold`` 设置'''
+        self._busy_since: Optional[float] = None
+        '''服务线程本轮循环开始工作的时刻，空闲时为 None'''
+        self._thread_ident: Optional[int] = None
+        self._watchdog: Optional[Watchdog] = None
+        self.dbfilename = 'dump.pydis'
+        '''快照文件的路径，save、bgsave 没有指定路径时使用'''
+        self._dbformat = 'rdb'
+        self.lastsave_time = 0.0
+        '''最近一次成功保存快照的时刻，unix 时间戳'''
+        self.last_bgsave_status = 'ok'
+        self._bgsave_thread: Optional[Thread] = None
+        self._cow_lock = Lock()
+        self.aof: Optional[AppendOnlyFile] = None
+        '''命令日志，通过 ``appendonly`` 开启'''
+        self.appendfilename = 'appendonly.aof'
+        '''命令日志的路径，开启 ``appendonly`` 时使用'''
+        self._appendfsync = 'everysec'
+        self._tracking_table_max_keys = TRACKING_MAX_KEYS
         super().__init__()
+        self._commands = self._resolve_commands()
+        '''操作码到命令、处理函数及其统计的映射'''
 
     @classmethod
     def open_connection(cls) -> Connection:
@@ -104,6 +199,8 @@ class Server(Core):
             if cls._stop_evt.is_set():
                 raise ServerStopped
             ret, conn = open_connection()
+            ret.id = conn.id = next(cls._client_ids)
+            cls._selector.register(conn, selectors.EVENT_READ, conn)
             cls._connections.add(conn)
             return ret
 
@@ -125,115 +222,638 @@ class Server(Core):
             # server 线程因为意外退出
             # 通知客户端连接已经被关闭
             self._close_connections()
+            self.watchdog_period = 0
 
     def serve_forever(self):
+        '''服务线程的主循环
+
+        每轮循环中实际工作的时长（不含等待请求的时间）记录为 ``event-loop``
+        延迟事件，开始工作的时刻保存在 ``_busy_since`` 中，供看门狗检查
+        '''
+        self._thread_ident = get_ident()
         while not self._stop_evt.is_set():
+            start = self._busy_since = perf_counter()
             self.active_expire_cycle()
-            if not self._connections.wait(timeout=1):
-                continue
-            conns, *_ = select(self._connections.copy(), [], [], 1)
-            for c in conns:
-                if c.closed:
-                    self._connections.remove(c)
-                    continue
-                self.handle_request(c)
+            if self._mapped is not None:
+                self._materialize(time() + MATERIALIZE_TIME_PERC)
+            # 有积压请求的连接不会再产生可读事件，需要立即处理
+            timeout = 0 if self._pending else self._poll_timeout()
+            busy = perf_counter() - start
+            self._busy_since = None
+            if self._connections.wait(timeout=timeout):
+                conns = dict.fromkeys(self._pending)
+                self._pending = []
+                for key, _ in self._selector.select(timeout):
+                    conns[key.data] = None
+                start = self._busy_since = perf_counter()
+                for c in conns:
+                    if c.closed:
+                        self._remove_connection(c)
+                        continue
+                    if self.handle_request(c):
+                        self._pending.append(c)
+                busy += perf_counter() - start
+                self._busy_since = None
+            self.latency.add(EVENT_LOOP, busy)
         else:
             self._close_connections()
 
-    def handle_request(self, c: Connection):
+    def _poll_timeout(self) -> float:
+        '''等待请求的最长时长，保证键到期后能及时被清理'''
+        if self.timelimit_exit or self._mapped is not None:
+            return 0
+        timeout = self._next_expiry() - time()
+        if timeout < MAX_TIME_SPAN:
+            return MAX_TIME_SPAN
+        return timeout if timeout < 1 else 1
+
+    def handle_request(self, c: Connection) -> bool:
+        '''处理连接中积压的请求
+
+        每次最多处理 ``MAX_REQUESTS_PER_CONN`` 条，避免单个繁忙的连接
+        使其他连接得不到处理。响应携带与请求相同的请求 ID
+
+        Returns:
+            bool: 连接中是否还有未处理的请求
+        '''
         try:
-            msg: RequestT = c.recv(block=False)  # type: ignore
-        except (ReceiveTimeout, ConnectionClosedError):
-            return
-        kind, name, value = msg
+            msgs: List[TaggedRequestT] = c.recv_many(MAX_REQUESTS_PER_CONN)  # type: ignore
+        except ConnectionClosedError:
+            return False
+        self.stat_total_commands += len(msgs)
+        execute = self.execute
+        self._current_client = c
         try:
-            attr = getattr(self, name)
-        except Exception as e:
-            resp = (message.ERROR, e)
-        else:
-            if kind == message.CALL:
-                args, kwargs = value  # type: ignore
+            for msg in msgs:
+                resp = execute(msg[1:])
+                # 失效消息先于响应送达，客户端收到写命令的响应时本地缓存已经失效
+                if self._tracking is not None and self._tracking.pending:
+                    self._send_invalidations()
+                c.send((msg[0], *resp))  # type: ignore
+        except ConnectionClosedError:
+            return False
+        finally:
+            self._current_client = None
+        return len(msgs) == MAX_REQUESTS_PER_CONN and c.pending
+
+    def execute(self, msg: RequestT) -> ResponseT:
+        '''执行一条命令并返回结果
+
+        ``CALL`` 消息通过操作码在命令表中查找处理函数，并检查参数的数量，
+        见 ``pydis.multithreading.commands``
+
+        ``PIPELINE`` 消息中的命令会被依次执行，期间不会处理其他连接的请求，
+        结果以列表的形式一次性返回
+
+        ``EXEC`` 消息在执行前比对被监视的键的版本号，任何一个键被修改过时
+        放弃执行，结果为 None，否则与 ``PIPELINE`` 相同
+        '''
+        kind, opcode, value = msg
+        if kind == message.CALL:
+            entry = self._commands.get(opcode)  # type: ignore
+            if entry is None:
+                return (message.ERROR, ValueError('unknown command %r' % (opcode,)))
+            command, handler, stats = entry
+            args, kwargs = value  # type: ignore
+            if not command.check_arity(len(args) + len(kwargs)):
+                return (message.ERROR, TypeError(
+                    'wrong number of arguments for %r' % command.name))
+            slower_than = self.slowlog_log_slower_than
+            version = self._last_version
+            if not self.stats_enabled and slower_than < 0:
                 try:
-                    ret = attr(*args, **kwargs)
+                    ret = handler(*args, **kwargs)
                 except Exception as e:
-                    resp = (message.ERROR, e)
-                else:
-                    resp = (message.RETURN, ret)
-            elif kind == message.GET:
-                resp = (message.RETURN, attr)
-            elif kind == message.SET:
-                setattr(self, name, value)
-                resp = (message.RETURN, None)
+                    self._log_failed(command, args, kwargs, version)
+                    return (message.ERROR, e)
+                if command.flags & WRITE and self.aof is not None:
+                    self.aof.append(command.name, args, kwargs)
+                if command.flags & READONLY and self._tracking is not None:
+                    self._tracking.track(self._current_client, command.get_keys(args))
+                return (message.RETURN, ret)
+            start = perf_counter()
+            try:
+                resp = (message.RETURN, handler(*args, **kwargs))
+            except Exception as e:
+                resp = (message.ERROR, e)
+                self._log_failed(command, args, kwargs, version)
             else:
-                resp = (
-                    message.ERROR,
-                    TypeError('message kind nuknown')
-                )
-        c.send(resp)
+                if command.flags & WRITE and self.aof is not None:
+                    self.aof.append(command.name, args, kwargs)
+                if command.flags & READONLY and self._tracking is not None:
+                    self._tracking.track(self._current_client, command.get_keys(args))
+            duration = perf_counter() - start
+            if self.stats_enabled:
+                stats.record(duration, resp[0] == message.ERROR)
+            if slower_than >= 0 and duration * 1_000_000 >= slower_than:
+                client = self._current_client
+                self.slowlog.add(
+                    int(duration * 1_000_000), command.name, args, kwargs,
+                    client.id if client is not None else 0)
+            return resp
+        if kind == message.PIPELINE:
+            return (message.RETURN, [self.execute(m) for m in value])  # type: ignore
+        if kind == message.EXEC:
+            watched, msgs = value  # type: ignore
+            if watched and self.versions(*watched) != list(watched.values()):
+                return (message.RETURN, None)
+            return (message.RETURN, [self.execute(m) for m in msgs])
+        return (message.ERROR, TypeError('message kind nuknown'))
+
+    def _log_failed(
+        self,
+        command: Command,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        version: int
+    ):
+        '''执行失败的写命令在失败前修改过数据时（如函数写入部分键后引发异常），
+        同样追加到命令日志，重放时得到相同的修改；``version`` 为执行前的 ``_last_version``
+        '''
+        if command.flags & WRITE and self.aof is not None and self._last_version != version:
+            self.aof.append(command.name, args, kwargs)
+
+    def _resolve_commands(
+        self
+    ) -> Dict[int, Tuple[Command, Callable[..., Any], CommandStats]]:
+        # 预先取得每条命令的处理函数，属性（如 empty）取其 getter
+        commands = {}
+        for command in COMMANDS:
+            attr = getattr(type(self), command.name)
+            if isinstance(attr, property):
+                handler = partial(attr.fget, self)  # type: ignore
+            else:
+                handler = getattr(self, command.name)
+            commands[command.opcode] = (command, handler, CommandStats())
+        return commands
 
-    def active_expire_cycle(self):
-        '''对 redis 定期过期的拙劣模仿'''
-        last_time_cycle = self.last_time_cycle
-        stat_expired_stale_perc = self.stat_expired_stale_perc
-        db = self._db
-        expiry_keys = self._expiry_key
+    def info(self, section: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        '''获取服务的运行信息
 
-        start = time()
-        # 当预估的失效键占比可接受，并且没有
-        # 到清理周期时，不会执行清理
-        if start - last_time_cycle < MAX_TIME_SPAN and \
-                0 < stat_expired_stale_perc < ACCEPTABLE_STALE:
-            return
+        分为 server、stats、persistence、keyspace、commandstats、latencystats 几个部分，
+        ``section`` 不为 None 时只返回指定的部分。命令的耗时以微秒计，
+        ``stats_enabled`` 为 False 时不再更新 commandstats 和 latencystats
 
-        # 本次每轮需要抽查的键的数量
-        num = len(expiry_keys)
-        if num > LOOKUPS_PER_LOOP:
-            num = LOOKUPS_PER_LOOP
-
-        last_time_cycle = start
-        timelimit = TIME_PERC
-        exit = False
-        total_expired = total_sample = 0
-        expired = sample = 0
-
-        # 只有存在关联了失效时长的键，才需要清理
-        if num:
-            while not exit and (
-                sample == 0 or  # 第一次抽查
-                100 * expired / sample > ACCEPTABLE_STALE  # 本轮失效的键太多
-            ):
-                expired = sample = 0
-
-                sample_keys = random_sample(expiry_keys, num)
-                while sample_keys and time() - start < timelimit:
-                    key = sample_keys.pop()
-                    if db[key].expired:
-                        db.pop(key)
-                        expiry_keys.discard(key)
-                        expired += 1
-                    sample += 1
-                else:
-                    exit = True
-
-                total_expired += expired
-                total_sample += sample
-
-        # 评估失效键比例，本次失效占比 20%，历次占比 80%。当某时刻
-        # 有大量的键失效导致清理过程因为超时而退出时，评估值将会增大，
-        # 下次将一定会执行清理。我们认为 50% 的键过期即为大量过期，
-        # 在历次失效比例为 0 的情况下，经过计算，选择了上述占比
-        # 计算方式：
-        # 假设本次占比为 x，则历次占比为 (1-x)，本次比例 a, 历次比例 b,
-        # 则有 ax + b(1-x) >= 10 => x >= (10-b)/(a-b)，
-        # 令 a=0.5, b=0，可解 x>=0.2
-        if total_sample:
-            current_perc = total_expired / total_sample
+        Raises:
+            ValueError: 部分不存在时引发
+        '''
+        sections = {
+            'server': lambda: {
+                'uptime_in_seconds': time() - self.start_time,
+                'connected_clients': len(self._connections),
+                'tracking_clients': self._tracking.clients
+                if self._tracking is not None else 0,
+                'stats_enabled': self.stats_enabled,
+            },
+            'stats': lambda: {
+                'total_commands_processed': self.stat_total_commands,
+                'keyspace_hits': self.stat_keyspace_hits,
+                'keyspace_misses': self.stat_keyspace_misses,
+                'expired_keys': self.stat_expired_keys,
+                'evicted_keys': self.stat_evicted_keys,
+                'lazyfree_pending_objects': LazyFree().pending,
+                'lazyfreed_objects': LazyFree().freed,
+                'tracking_total_keys': len(self._tracking)
+                if self._tracking is not None else 0,
+            },
+            'persistence': lambda: {
+                'rdb_bgsave_in_progress': self._bgsave_thread is not None
+                and self._bgsave_thread.is_alive(),
+                'rdb_last_save_time': self.lastsave_time,
+                'rdb_last_bgsave_status': self.last_bgsave_status,
+                'mapped_loading': self._mapped is not None,
+                'aof_enabled': self.aof is not None,
+                'aof_rewrite_in_progress': self.aof is not None
+                and self.aof.rewrite_in_progress,
+                'aof_last_rewrite_status': self.aof.last_rewrite_status
+                if self.aof is not None else 'ok',
+                'aof_pending_records': self.aof.pending if self.aof is not None else 0,
+            },
+            'keyspace': lambda: {
+                'keys': len(self._db),
+                'expires': self._volatile_keys,
+            },
+            'commandstats': lambda: {
+                command.name: stats.info()
+                for command, _, stats in self._commands.values() if stats.calls
+            },
+            'latencystats': lambda: {
+                command.name: stats.percentiles()
+                for command, _, stats in self._commands.values() if stats.calls
+            },
+        }
+        if section is None:
+            return {name: get() for name, get in sections.items()}
+        if section not in sections:
+            raise ValueError('unknown info section %r' % section)
+        return {section: sections[section]()}
+
+    @property
+    def slowlog_max_len(self) -> int:
+        '''慢查询日志的容量'''
+        return self.slowlog.maxlen
+
+    @slowlog_max_len.setter
+    def slowlog_max_len(self, maxlen: int):
+        self.slowlog.maxlen = maxlen
+
+    def slowlog_get(self, count: int = 10) -> List[Dict[str, Any]]:
+        '''获取最近的 ``count`` 条慢查询记录，新的在前，``count`` 为负数时获取全部
+
+        每条记录包含 id、start_time、duration（微秒）、command、args、client_id
+        '''
+        return [entry._asdict() for entry in self.slowlog.get(count)]
+
+    def slowlog_len(self) -> int:
+        return len(self.slowlog)
+
+    def slowlog_reset(self) -> bool:
+        self.slowlog.reset()
+        return True
+
+    @property
+    def latency_monitor_threshold(self) -> int:
+        '''延迟监控的阈值，以毫秒计，默认为 0，表示不记录'''
+        return self.latency.threshold
+
+    @latency_monitor_threshold.setter
+    def latency_monitor_threshold(self, threshold: int):
+        if threshold < 0:
+            raise ValueError("'latency_monitor_threshold' must not be negative")
+        self.latency.threshold = threshold
+
+    @property
+    def watchdog_period(self) -> int:
+        '''看门狗的超时时长，以毫秒计，默认为 0，表示关闭看门狗'''
+        return int(self._watchdog.period * 1000) if self._watchdog else 0
+
+    @watchdog_period.setter
+    def watchdog_period(self, period: int):
+        if period < 0:
+            raise ValueError("'watchdog_period' must not be negative")
+        if self._watchdog is not None:
+            self._watchdog.stop()
+            self._watchdog = None
+        if period:
+            self._watchdog = Watchdog(
+                lambda: self._busy_since, lambda: self._thread_ident, period / 1000)
+
+    def latency_latest(self) -> Dict[str, Dict[str, int]]:
+        '''各延迟事件最近一个样本的时刻和耗时（毫秒），以及历史最大耗时'''
+        return self.latency.latest()
+
+    def latency_history(self, event: str) -> List[Tuple[int, int]]:
+        '''指定延迟事件的所有样本，元素为 (时刻, 耗时)'''
+        return self.latency.history(event)
+
+    def latency_reset(self, *events: str) -> int:
+        '''清除指定延迟事件的样本，没有指定时清除全部'''
+        return self.latency.reset(*events)
+
+    def _delete_many(self, keys: Collection[str], lazy: bool = False) -> int:
+        start = perf_counter()
+        count = super()._delete_many(keys, lazy)
+        self.latency.add(BULK_FREE, perf_counter() - start)
+        return count
+
+    def flushdb(self, asynchronous: bool = False):
+        '''清除所有存入的键，见 ``BaseCore.flushdb``'''
+        start = perf_counter()
+        super().flushdb(asynchronous)
+        self.latency.add(BULK_FREE, perf_counter() - start)
+
+    @property
+    def tracking_table_max_keys(self) -> int:
+        '''客户端缓存跟踪表中键的数量上限，超出时最早跟踪的键视为失效'''
+        return self._tracking_table_max_keys
+
+    @tracking_table_max_keys.setter
+    def tracking_table_max_keys(self, value: int):
+        self._tracking_table_max_keys = value
+        if self._tracking is not None:
+            self._tracking.max_keys = value
+
+    @property
+    def dbformat(self) -> str:
+        '''save、bgsave 保存的快照文件的格式，见 ``DB_FORMATS``，默认为 rdb
+
+        mapped 格式的快照通过 ``attach`` 载入，启动后立即可以提供服务
+        '''
+        return self._dbformat
+
+    @dbformat.setter
+    def dbformat(self, fmt: str):
+        if fmt not in DB_FORMATS:
+            raise ValueError('unknown snapshot format %r' % fmt)
+        self._dbformat = fmt
+
+    def save(self, path: Optional[str] = None) -> int:
+        '''在服务线程中保存快照，保存期间不处理其他请求，见 ``BaseCore.save``'''
+        save = super().save if self._dbformat == 'rdb' else self.save_mapped
+        count = save(path or self.dbfilename)
+        self.lastsave_time = unix_time()
+        return count
+
+    def bgsave(self, path: Optional[str] = None) -> bool:
+        '''在后台线程中保存快照
+
+        服务线程只复制一次键值对的引用，序列化和写入都在后台线程中进行。
+        保存期间 incr、decr 不再原地修改值，快照是调用时刻的状态
+
+        Raises:
+            RuntimeError: 已有后台保存在进行时引发
+        '''
+        if self._bgsave_thread is not None and self._bgsave_thread.is_alive():
+            raise RuntimeError('background save already in progress')
+        items = self._items()
+        self._cow_acquire()
+        write = rdb.save if self._dbformat == 'rdb' else mapped.write
+        self._bgsave_thread = Thread(
+            target=self._bgsave, args=(items, path or self.dbfilename, write),
+            name='pydis-bgsave', daemon=True)
+        self._bgsave_thread.start()
+        return True
+
+    def _bgsave(self, items: List[Any], path: str, write: Callable[..., int]):
+        try:
+            write(items, path)
+        except Exception:
+            logger.exception('background save failed')
+            self.last_bgsave_status = 'err'
         else:
-            current_perc = 0
-        self.stat_expired_stale_perc = \
-            current_perc * 20 + stat_expired_stale_perc * 0.80
+            self.last_bgsave_status = 'ok'
+            self.lastsave_time = unix_time()
+        finally:
+            self._cow_release()
+
+    def _cow_acquire(self):
+        with self._cow_lock:
+            self._cow += 1
+
+    def _cow_release(self):
+        # 在后台线程中调用
+        with self._cow_lock:
+            self._cow -= 1
+
+    def lastsave(self) -> float:
+        '''最近一次成功保存快照的时刻，unix 时间戳，没有保存过时为 0'''
+        return self.lastsave_time
+
+    @property
+    def appendonly(self) -> bool:
+        '''是否开启命令日志，默认为 False
+
+        开启时立即以当前的数据重写一次日志，之后每条执行成功，或失败前修改过数据的写命令都被追加到日志中
+        '''
+        return self.aof is not None
+
+    @appendonly.setter
+    def appendonly(self, enabled: bool):
+        if enabled and self.aof is None:
+            self.aof = AppendOnlyFile(self.appendfilename, self._appendfsync)
+            self.bgrewriteaof()
+        elif not enabled and self.aof is not None:
+            self.aof.close()
+            self.aof = None
+
+    @property
+    def appendfsync(self) -> str:
+        '''命令日志的 fsync 策略，见 ``pydis.multithreading.aof``，默认为 everysec'''
+        return self._appendfsync
+
+    @appendfsync.setter
+    def appendfsync(self, policy: str):
+        if policy not in FSYNC_POLICIES:
+            raise ValueError('unknown fsync policy %r' % policy)
+        self._appendfsync = policy
+        if self.aof is not None:
+            self.aof.fsync = policy
+
+    def bgrewriteaof(self) -> bool:
+        '''在后台线程中以当前的数据重写命令日志
+
+        Raises:
+            RuntimeError: 没有开启命令日志，或已有重写在进行时引发
+        '''
+        if self.aof is None:
+            raise RuntimeError('append only file is disabled')
+        if self.aof.rewrite_in_progress:
+            raise RuntimeError('append only file rewrite already in progress')
+        self._cow_acquire()
+        self.aof.rewrite(self._items(), self._cow_release)
+        return True
+
+    def load_aof(self, path: Optional[str] = None) -> int:
+        '''重放命令日志，``path`` 默认为 ``appendfilename``，文件不存在时返回 0
+
+        应在启动时、创建客户端和开启 ``appendonly`` 之前调用。
+        注册的函数不会被记录，重放 fcall、evalsha 前需要先注册同样的函数，
+        否则引发 AofError，已经重放的记录不会撤销
+
+        Raises:
+            AofError: 文件不是命令日志、已损坏，或记录了写命令以外的命令时引发
+
+        Returns:
+            int: 重放的记录的数量
+        '''
+        try:
+            f = open(path or self.appendfilename, 'rb')
+        except FileNotFoundError:
+            return 0
+        with f, rdb.gc_paused():
+            return replay(f, self._replay_command, lambda batch: self._load_batches((batch,)))
+
+    def _replay_command(self, name: str, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        '''通过命令表执行命令日志中的一条记录，只接受写命令
+
+        Raises:
+            AofError: 记录的不是写命令，或调用的函数没有注册时引发
+        '''
+        entry = self._commands.get(OPCODES.get(name))  # type: ignore
+        if entry is None or not entry[0].flags & WRITE:
+            raise AofError('unexpected command %r in the append only file' % name)
+        if name == 'fcall' or name == 'evalsha':
+            # 函数本身不会被记录，跳过调用会悄悄丢失函数的写入
+            find = self.functions.get if name == 'fcall' else self.functions.get_by_digest
+            try:
+                find(args[0] if args else None)  # type: ignore
+            except ValueError as e:
+                raise AofError('can not replay %r, load the function first: %s' % (name, e)) from None
+        return entry[1](*args, **kwargs)
+
+    def metrics(self) -> str:
+        '''以 Prometheus 文本格式导出运行信息'''
+        return to_prometheus(self.info(), (
+            (command.name, stats) for command, _, stats in self._commands.values()
+        ))
+
+    def stats_reset(self) -> bool:
+        '''重置所有统计'''
+        self.stat_total_commands = 0
+        self.stat_keyspace_hits = self.stat_keyspace_misses = 0
+        self.stat_expired_keys = self.stat_evicted_keys = 0
+        for command, handler, _ in list(self._commands.values()):
+            self._commands[command.opcode] = (command, handler, CommandStats())
+        return True
+
+    def config_get(self, name: str) -> Any:
+        '''获取配置项的值，可用的配置项见 ``CONFIG_PARAMS``
+
+        Raises:
+            ValueError: 配置项不存在时引发
+        '''
+        if name not in CONFIG_PARAMS:
+            raise ValueError('unknown config parameter %r' % name)
+        return getattr(self, name)
+
+    def config_set(self, name: str, value: Any) -> bool:
+        '''设置配置项的值，可用的配置项见 ``CONFIG_PARAMS``
+
+        Raises:
+            ValueError: 配置项不存在时引发
+        '''
+        if name not in CONFIG_PARAMS:
+            raise ValueError('unknown config parameter %r' % name)
+        setattr(self, name, value)
+        return True
+
+    def function_load(
+        self,
+        func: Callable[..., Any],
+        name: Optional[str] = None,
+        readonly: bool = False,
+        replace: bool = False
+    ) -> str:
+        '''注册一个函数，之后可以通过名称或摘要在服务线程中调用它
+
+        函数的第一个参数为服务实例，可以直接调用其上的所有命令，
+        执行期间不会处理其他请求，因此函数内的所有操作是原子的
+
+        开启跟踪的客户端调用函数时，函数通过只读命令（如 get、mget）读取的键
+        同样会被跟踪；直接访问内部数据（如 ``_db``）读取的键不会被跟踪，
+        这样的函数的结果不应缓存在客户端
+
+        Args:
+            func (Callable): 待注册的函数
+            name (str, optional): 函数名称. 默认为 ``func.__name__``
+            readonly (bool, optional): 是否只读，只读函数可通过 fcall_ro 调用. 默认为 False
+            replace (bool, optional): 是否替换同名的函数. 默认为 False
+
+        Raises:
+            ValueError: 名称已被使用，并且 ``replace`` 为 False 时引发
+
+        Returns:
+            str: 函数代码的 SHA1 摘要
+        '''
+        return self.functions.load(func, name, readonly, replace).digest
+
+    def function_delete(self, name: str) -> bool:
+        '''删除指定名称的函数
+
+        Returns:
+            bool: 函数是否存在
+        '''
+        return self.functions.delete(name)
+
+    def function_list(self) -> List[Dict[str, Any]]:
+        '''列出所有注册的函数的名称、摘要与只读标记'''
+        return self.functions.list()
+
+    def function_flush(self):
+        '''删除所有注册的函数'''
+        self.functions.clear()
+
+    def fcall(self, name: str, *args, **kwargs) -> Any:
+        '''调用指定名称的函数
 
-        self.last_time_cycle = last_time_cycle
+        Raises:
+            ValueError: 函数不存在时引发
+        '''
+        return self._call_function(self.functions.get(name).func, args, kwargs)
+
+    def fcall_ro(self, name: str, *args, **kwargs) -> Any:
+        '''调用指定名称的只读函数
+
+        Raises:
+            ValueError: 函数不存在，或函数不是只读函数时引发
+        '''
+        function = self.functions.get(name)
+        if not function.readonly:
+            raise ValueError('can not execute a write function %r with fcall_ro' % name)
+        return self._call_function(function.func, args, kwargs)
+
+    def evalsha(self, digest: str, *args, **kwargs) -> Any:
+        '''通过摘要调用函数
+
+        Raises:
+            ValueError: 没有与摘要对应的函数时引发
+        '''
+        return self._call_function(self.functions.get_by_digest(digest).func, args, kwargs)
+
+    def _call_function(self, func: Callable[..., Any], args: Tuple[Any, ...],
+                       kwargs: Dict[str, Any]) -> Any:
+        tracking, client = self._tracking, self._current_client
+        if tracking is None or client not in tracking:
+            return func(self, *args, **kwargs)
+        return func(_TrackedReads(self, tracking, client), *args, **kwargs)
+
+    def client_tracking(self, on: bool) -> bool:
+        '''开启或关闭当前连接的客户端缓存跟踪，语义与 redis 的 CLIENT TRACKING 相同
+
+        开启后，连接读取过的键被修改、删除、失效或淘汰时，服务线程向连接推送
+        ``(0, message.INVALIDATE, keys)``，``keys`` 为 None 表示清空整个缓存。
+        推送只发生一次，连接再次读取这个键后才会重新跟踪，见 ``pydis.tracking``
+
+        Raises:
+            ValueError: 不是通过连接调用时引发
+        '''
+        client = self._current_client
+        if client is None:
+            raise ValueError('client_tracking must be called through a connection')
+        if not on:
+            self._disable_tracking(client)
+            return True
+        if self._tracking is None:
+            self._tracking = Tracking(self._tracking_table_max_keys)
+        self._tracking.enable(client)
+        return True
+
+    def _disable_tracking(self, conn: Connection):
+        tracking = self._tracking
+        if tracking is not None:
+            tracking.disable(conn)
+            if not tracking.clients:  # 没有客户端开启跟踪时，写命令不再查找跟踪表
+                self._tracking = None
+
+    def _send_invalidations(self) -> List[Connection]:
+        '''推送积攒的失效消息，返回收到推送的连接'''
+        tracking = self._tracking
+        sent = []
+        for conn, keys in tracking.pop_pending():  # type: ignore
+            try:
+                conn.send((0, message.INVALIDATE, keys))
+            except ConnectionClosedError:
+                tracking.disable(conn)  # type: ignore
+                continue
+            sent.append(conn)
+        return sent
+
+    def active_expire_cycle(self):
+        '''定期清理已经失效的键
+
+        失效索引以失效时刻排序，每次只取出确实已经失效的键，
+        单次清理的耗时不超过 ``TIME_PERC``
+        '''
+        start = time()
+        # 上次清理已经完成，并且没有到清理周期时，不会执行清理
+        if start - self.last_time_cycle < MAX_TIME_SPAN and \
+                not self.timelimit_exit:
+            return
+        self.last_time_cycle = start
+        _, self.timelimit_exit = self._expire_due(start, start + TIME_PERC)
+        if self._tracking is not None and self._tracking.pending:
+            self._send_invalidations()
+        self.latency.add(EXPIRE_CYCLE, time() - start)
 
     @classmethod
     def stop(cls):
@@ -247,11 +867,26 @@ class Server(Core):
         '''返回服务线程是否被关闭'''
         return cls._stop_evt.is_set()
 
+    def _remove_connection(self, conn: Connection):
+        with self._mutex:
+            self._unregister(conn)
+            self._connections.remove(conn)
+        self._disable_tracking(conn)
+        conn.close()
+
+    def _unregister(self, conn: Connection):
+        try:
+            self._selector.unregister(conn)
+        except (KeyError, ValueError):
+            pass
+
     def _close_connections(self):
         with self._mutex:
             while self._connections:
                 conn = self._connections.pop()
+                self._unregister(conn)
                 try:
                     conn.close()
                 except:
                     pass
+        self._tracking = None
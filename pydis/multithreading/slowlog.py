@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from reprlib import Repr
+from time import time
+from typing import Any, Deque, Dict, List, NamedTuple, Sequence
+
+SLOWLOG_MAX_ARGS = 32      # 每条记录最多保存的参数数量
+SLOWLOG_MAX_ARGLEN = 128   # 每个参数摘要的最大长度
+
+_repr = Repr()
+_repr.maxstring = _repr.maxother = SLOWLOG_MAX_ARGLEN
+_repr.maxlist = _repr.maxtuple = _repr.maxset = _repr.maxdict = 8
+
+
+def summarize(args: Sequence[Any], kwargs: Dict[str, Any]) -> List[str]:
+    '''生成参数的摘要，大容器只展开前几个元素，不会遍历整个参数'''
+    ret = [_repr.repr(arg) for arg in args[:SLOWLOG_MAX_ARGS]]
+    for key, value in kwargs.items():
+        if len(ret) >= SLOWLOG_MAX_ARGS:
+            break
+        ret.append('%s=%s' % (key, _repr.repr(value)))
+    more = len(args) + len(kwargs) - len(ret)
+    if more > 0:
+        ret[-1] = '... (%d more arguments)' % (more + 1)
+    return ret
+
+
+class SlowLogEntry(NamedTuple):
+    '''慢查询记录
+
+    Attributes:
+        id (int): 记录的序号，递增
+        start_time (float): 命令开始执行的时刻，unix 时间戳
+        duration (int): 执行耗时，以微秒计
+        command (str): 命令名称
+        args (List[str]): 参数的摘要
+        client_id (int): 发出命令的连接的 ID，不经过连接执行时为 0
+    '''
+    id: int
+    start_time: float
+    duration: int
+    command: str
+    args: List[str]
+    client_id: int
+
+
+class SlowLog:
+    '''容量固定的慢查询日志，记录满后丢弃最旧的记录'''
+
+    def __init__(self, maxlen: int = 128) -> None:
+        self._entries: Deque[SlowLogEntry] = deque(maxlen=maxlen)
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def maxlen(self) -> int:
+        return self._entries.maxlen  # type: ignore
+
+    @maxlen.setter
+    def maxlen(self, maxlen: int):
+        if maxlen < 0:
+            raise ValueError("'maxlen' must not be negative")
+        self._entries = deque(self._entries, maxlen=maxlen)
+
+    def add(
+        self,
+        duration: int,
+        command: str,
+        args: Sequence[Any],
+        kwargs: Dict[str, Any],
+        client_id: int = 0
+    ):
+        self._entries.append(SlowLogEntry(
+            self._next_id,
+            time() - duration / 1_000_000,
+            duration,
+            command,
+            summarize(args, kwargs),
+            client_id,
+        ))
+        self._next_id += 1
+
+    def get(self, count: int = 10) -> List[SlowLogEntry]:
+        '''获取最近的 ``count`` 条记录，新的在前，``count`` 为负数时获取全部'''
+        entries = self._entries
+        if count < 0 or count > len(entries):
+            count = len(entries)
+        return [entries[-i] for i in range(1, count + 1)]
+
+    def reset(self):
+        self._entries.clear()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+'''服务线程的运行统计
+
+每条命令记录调用次数、累计耗时、失败次数，以及一个对数分桶的延迟直方图。
+直方图以微秒计，每个 2 的幂区间再均分为 ``SUB_BUCKETS`` 个子桶，
+记录一次只需几次整数运算，百分位数的相对误差不超过 1 / SUB_BUCKETS
+'''
+
+from typing import Any, Dict, Iterable, List, Tuple
+
+SUB_BUCKET_BITS = 2
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS  # 每个 2 的幂区间的子桶数量
+MAX_BUCKET_BITS = 40                # 最大约 12 天，更长的耗时计入最后一个桶
+PERCENTILES = (50.0, 99.0, 99.9)
+
+
+def _bucket_index(usec: int) -> int:
+    n = usec.bit_length()
+    if n <= SUB_BUCKET_BITS:
+        return usec
+    if n > MAX_BUCKET_BITS:
+        n, usec = MAX_BUCKET_BITS, (1 << MAX_BUCKET_BITS) - 1
+    shift = n - SUB_BUCKET_BITS - 1
+    return ((shift + 1) << SUB_BUCKET_BITS) + ((usec >> shift) & (SUB_BUCKETS - 1))
+
+
+def _bucket_upper(index: int) -> int:
+    '''桶中耗时的上界（不含），以微秒计'''
+    if index < SUB_BUCKETS:
+        return index + 1
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    sub = index & (SUB_BUCKETS - 1)
+    return (SUB_BUCKETS + sub + 1) << shift
+
+
+class LatencyHistogram:
+    '''对数分桶的延迟直方图'''
+
+    __slots__ = ['counts', 'total']
+
+    def __init__(self) -> None:
+        size = (MAX_BUCKET_BITS - SUB_BUCKET_BITS + 1) << SUB_BUCKET_BITS
+        self.counts = [0] * size
+        self.total = 0
+
+    def record(self, usec: int):
+        self.counts[_bucket_index(usec)] += 1
+        self.total += 1
+
+    def percentile(self, p: float) -> int:
+        '''第 ``p`` 百分位的耗时上界，以微秒计，没有记录时为 0'''
+        if not self.total:
+            return 0
+        rank = self.total * p / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return _bucket_upper(i)
+        return _bucket_upper(len(self.counts) - 1)
+
+    def buckets(self) -> List[Tuple[int, int]]:
+        '''以 2 的幂为边界的累计计数，元素为 (上界微秒数, 累计次数)，到最后一个非空桶为止'''
+        ret: List[Tuple[int, int]] = []
+        seen, last = 0, 0
+        for i, count in enumerate(self.counts):
+            if count:
+                last = i
+        for i in range(last + 1):
+            seen += self.counts[i]
+            upper = _bucket_upper(i)
+            if upper & (upper - 1) == 0:
+                ret.append((upper, seen))
+        if not ret or ret[-1][1] != seen:
+            ret.append((_bucket_upper(last), seen))
+        return ret
+
+
+class CommandStats:
+    '''单条命令的统计'''
+
+    __slots__ = ['calls', 'usec', 'failed_calls', 'histogram']
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.usec = 0
+        self.failed_calls = 0
+        self.histogram = LatencyHistogram()
+
+    def record(self, seconds: float, failed: bool = False):
+        usec = int(seconds * 1_000_000)
+        self.calls += 1
+        self.usec += usec
+        if failed:
+            self.failed_calls += 1
+        # 每条命令都会调用，内联 LatencyHistogram.record 以减少函数调用
+        histogram = self.histogram
+        histogram.counts[
+            usec if usec < SUB_BUCKETS else _bucket_index(usec)] += 1
+        histogram.total += 1
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'usec': self.usec,
+            'usec_per_call': self.usec / self.calls if self.calls else 0.0,
+            'failed_calls': self.failed_calls,
+        }
+
+    def percentiles(self) -> Dict[str, int]:
+        return {
+            'p%g' % p: self.histogram.percentile(p) for p in PERCENTILES
+        }
+
+
+def _labels(labels: Iterable[Tuple[str, Any]]) -> str:
+    return ','.join(
+        '%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels
+    )
+
+
+def to_prometheus(
+    info: Dict[str, Dict[str, Any]],
+    commands: Iterable[Tuple[str, CommandStats]],
+    prefix: str = 'pydis'
+) -> str:
+    '''将 ``Server.info`` 的结果和命令统计转换为 Prometheus 文本格式'''
+    lines: List[str] = []
+
+    def metric(name, kind, help, samples):
+        lines.append('# HELP %s_%s %s' % (prefix, name, help))
+        lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+        for labels, value in samples:
+            if labels:
+                lines.append('%s_%s{%s} %s' % (prefix, name, _labels(labels), value))
+            else:
+                lines.append('%s_%s %s' % (prefix, name, value))
+
+    server, stats, keyspace = info['server'], info['stats'], info['keyspace']
+    metric('uptime_seconds', 'gauge', 'Seconds since the server was created',
+           [((), server['uptime_in_seconds'])])
+    metric('connected_clients', 'gauge', 'Number of open connections',
+           [((), server['connected_clients'])])
+    metric('keys', 'gauge', 'Number of keys', [((), keyspace['keys'])])
+    metric('expires', 'gauge', 'Number of keys with an expiry',
+           [((), keyspace['expires'])])
+    for name in ('keyspace_hits', 'keyspace_misses', 'expired_keys',
+                 'evicted_keys', 'total_commands_processed'):
+        metric(name + '_total', 'counter', name.replace('_', ' ').capitalize(),
+               [((), stats[name])])
+
+    commands = [(name, cs) for name, cs in commands if cs.calls]
+    metric('commands_total', 'counter', 'Number of calls per command',
+           [((('cmd', name),), cs.calls) for name, cs in commands])
+    metric('commands_failed_total', 'counter', 'Number of failed calls per command',
+           [((('cmd', name),), cs.failed_calls) for name, cs in commands])
+    lines.append('# HELP %s_command_duration_seconds Command latency' % prefix)
+    lines.append('# TYPE %s_command_duration_seconds histogram' % prefix)
+    name = prefix + '_command_duration_seconds'
+    for cmd, cs in commands:
+        for upper, count in cs.histogram.buckets():
+            labels = _labels((('cmd', cmd), ('le', '%g' % (upper / 1e6))))
+            lines.append('%s_bucket{%s} %s' % (name, labels, count))
+        labels = _labels((('cmd', cmd),))
+        lines.append('%s_bucket{%s,le="+Inf"} %s' % (name, labels, cs.calls))
+        lines.append('%s_sum{%s} %g' % (name, labels, cs.usec / 1e6))
+        lines.append('%s_count{%s} %s' % (name, labels, cs.calls))
+    return '\n'.join(lines) + '\n'
@@ -1,8 +1,10 @@
 
 from typing import Any, Tuple, Union
 
-from .message import message
-
-RequestT = Tuple[message, str, Union[Any, None]]
-ResponseT = Tuple[message, Union[Any, None]]
-MessageT = Union[RequestT, ResponseT]
+# 命令为 (消息种类, 操作码, 数据)，结果为 (消息种类, 数据)
+RequestT = Tuple[int, int, Union[Any, None]]
+ResponseT = Tuple[int, Union[Any, None]]
+# 在连接上传输的消息，首个元素为请求 ID，响应携带与请求相同的 ID
+TaggedRequestT = Tuple[int, int, int, Union[Any, None]]
+TaggedResponseT = Tuple[int, int, Union[Any, None]]
+MessageT = Union[TaggedRequestT, TaggedResponseT]
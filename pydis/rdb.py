@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+'''快照文件格式
+
+文件由文件头、若干数据块和结束块组成，数值均为小端序：
+
+- 文件头: 魔数 ``RDB_MAGIC``、格式版本（uint16）、保存时刻（unix 时间戳，double）
+- 数据块: 数据长度（uint32）、数据的 crc32（uint32）、数据。数据为 pickle 后的列表，
+  元素为 (键, 值, 失效时刻)，失效时刻为 unix 时间戳，永不失效为 INF
+- 结束块: 长度为 0，crc32 的位置为键的总数
+
+键按块写入和读取，每块最多 ``RDB_CHUNK_KEYS`` 个键，写入时不需要将整个
+数据库序列化到内存中，每序列化一块，其他线程都有机会获取 GIL。
+内存中的失效时刻为 monotonic 时钟读数，保存和载入时与 unix 时间戳互相换算
+'''
+
+import gc
+import os
+import pickle
+from contextlib import contextmanager
+from struct import Struct
+from threading import get_ident
+from time import monotonic, time
+from typing import Any, BinaryIO, Iterable, Iterator, List, Tuple
+from zlib import crc32
+
+from .exceptions import RdbError
+from .value import INF, Value
+
+RDB_MAGIC = b'PYDISRDB'
+RDB_VERSION = 1
+RDB_CHUNK_KEYS = 1024
+
+_HEADER = Struct('<8sHd')
+_CHUNK = Struct('<II')
+
+EntryT = Tuple[str, Any, float]
+
+
+def entries(
+    items: Iterable[Tuple[str, Value]],
+    chunk_keys: int = RDB_CHUNK_KEYS
+) -> Iterator[List[EntryT]]:
+    '''将键值对逐块转换为 (键, 值, 失效时刻) 的列表，已经失效的键会被跳过
+
+    失效时刻换算为 unix 时间戳，永不失效为 INF
+    '''
+    now = monotonic()
+    offset = time() - now
+    batch: List[EntryT] = []
+    for key, value in items:
+        expire_at = value.expire_at
+        if expire_at != INF:
+            if expire_at <= now:
+                continue
+            expire_at += offset
+        batch.append((key, value.value, expire_at))
+        if len(batch) >= chunk_keys:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def dump(
+    items: Iterable[Tuple[str, Value]],
+    f: BinaryIO,
+    chunk_keys: int = RDB_CHUNK_KEYS
+) -> int:
+    '''将 ``items`` 中的键值对写入 ``f``，已经失效的键会被跳过
+
+    Args:
+        items (Iterable[Tuple[str, Value]]): 键和值，通常为 ``_db.items()`` 的副本
+        f (BinaryIO): 以二进制写模式打开的文件
+        chunk_keys (int, optional): 每块的键的数量. 默认为 ``RDB_CHUNK_KEYS``
+
+    Returns:
+        int: 写入的键的数量
+    '''
+    f.write(_HEADER.pack(RDB_MAGIC, RDB_VERSION, time()))
+    write, dumps, protocol = f.write, pickle.dumps, pickle.HIGHEST_PROTOCOL
+    count = 0
+    for batch in entries(items, chunk_keys):
+        data = dumps(batch, protocol)
+        write(_CHUNK.pack(len(data), crc32(data)))
+        write(data)
+        count += len(batch)
+    write(_CHUNK.pack(0, count))
+    return count
+
+
+def load(f: BinaryIO) -> Iterator[List[EntryT]]:
+    '''逐块读取 ``f`` 中的键值对，失效时刻仍为 unix 时间戳，由调用方换算
+
+    Raises:
+        RdbError: 文件不是快照、版本不支持或内容损坏时引发
+    '''
+    header = f.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        raise RdbError('truncated header')
+    magic, version, _ = _HEADER.unpack(header)
+    if magic != RDB_MAGIC:
+        raise RdbError('not a pydis snapshot')
+    if version > RDB_VERSION:
+        raise RdbError('unsupported snapshot version: %d' % version)
+    read, loads, size = f.read, pickle.loads, _CHUNK.size
+    count = 0
+    while True:
+        head = read(size)
+        if len(head) < size:
+            raise RdbError('truncated snapshot')
+        length, checksum = _CHUNK.unpack(head)
+        if not length:
+            if checksum != count:
+                raise RdbError('key count mismatch: %d != %d' % (checksum, count))
+            return
+        data = read(length)
+        if len(data) < length or crc32(data) != checksum:
+            raise RdbError('corrupted chunk at key %d' % count)
+        batch: List[EntryT] = loads(data)
+        count += len(batch)
+        yield batch
+
+
+@contextmanager
+def gc_paused():
+    '''暂停循环垃圾回收
+
+    载入时会创建大量存活的对象，每创建一定数量的对象就会触发一次分代回收，
+    而每次回收都要遍历已经载入的所有对象，暂停回收可以使载入快一倍左右
+    '''
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def save(
+    items: Iterable[Tuple[str, Value]],
+    path: str,
+    chunk_keys: int = RDB_CHUNK_KEYS
+) -> int:
+    '''将 ``items`` 保存到 ``path``，返回写入的键的数量
+
+    先写入同目录下的临时文件并刷入磁盘，完成后再替换 ``path``，
+    保存失败不会破坏已有的快照
+    '''
+    tmp = '%s.tmp-%d-%d' % (path, os.getpid(), get_ident())
+    try:
+        with open(tmp, 'wb') as f:
+            count = dump(items, f, chunk_keys)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return count
@@ -0,0 +1,468 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import (Any, Callable, Collection, Dict, Iterator, List, Optional,
+                    Tuple, TypeVar, Union)
+from weakref import ref
+
+from . import mapped, rdb
+from .core import MAPPED_STEP, SCAN_MAPPED_TIME, BaseCore
+from .eviction import EvictionPolicy, get_policy
+from .mapped import MappedSnapshot
+from .value import INF
+
+T = TypeVar('T')
+
+TIME_PERC = 25 / 1000      # 每次定期清理的耗时上限，25ms
+EXPIRE_INTERVAL = 0.1      # 后台定期清理的间隔，100ms
+
+
+class ShardedCore:
+    '''将键按哈希分布到多个独立分片上的内存管理工具
+
+    每个分片是一个 ``BaseCore``，拥有独立的锁和失效索引，应用线程可以
+    直接调用本类的方法，不需要经过 Server 线程。访问不同分片的线程之间
+    不会互相阻塞
+
+    多键操作（mget、mset、msetnx、delete）先按分片对键分组，
+    每个分片的锁在一次操作中只获取一次
+
+    失效的键在访问时惰性清理；``active_expire`` 为 True 时，
+    还会启动一个后台线程定期清理
+
+    线程安全
+
+    Attributes:
+        stat_evicted_keys (int): 所有分片被淘汰的键的数量，其他统计见 ``BaseCore``
+    '''
+
+    def __init__(self, shards: int = 16, active_expire: bool = True) -> None:
+        if shards < 1:
+            raise ValueError("'shards' must be a positive number")
+        self._shards = [BaseCore() for _ in range(shards)]
+        self._locks = [Lock() for _ in range(shards)]
+        self._maxkeys: Optional[int] = None
+        self._mapped: Optional[MappedSnapshot] = None
+        '''所有分片共享的映射的快照，全部载入后为 None，见 ``attach``'''
+        self._mapped_pos = 0
+        self._mapped_lock = Lock()
+        '''保护载入快照的进度，获取顺序为先 _mapped_lock 后分片的锁'''
+        self._stop_evt = Event()
+        if active_expire:
+            Thread(
+                target=_expire_forever,
+                args=(ref(self), self._stop_evt),
+                daemon=True
+            ).start()
+
+    def _index(self, key: str) -> int:
+        return hash(key) % len(self._shards)
+
+    def _call(self, key: str, func: Callable[..., T], *args, **kwargs) -> T:
+        i = self._index(key)
+        with self._locks[i]:
+            return func(self._shards[i], key, *args, **kwargs)
+
+    def _group(self, keys: Collection[str]) -> Dict[int, List[str]]:
+        groups: Dict[int, List[str]] = {}
+        n = len(self._shards)
+        for key in keys:
+            i = hash(key) % n
+            try:
+                groups[i].append(key)
+            except KeyError:
+                groups[i] = [key]
+        return groups
+
+    @property
+    def empty(self) -> bool:
+        self._materialize()
+        return all(shard.empty for shard in self._shards)
+
+    def dbsize(self) -> int:
+        '''键的数量，各分片的键数之和，见 ``BaseCore.dbsize``'''
+        self._materialize()
+        return sum(shard.dbsize() for shard in self._shards)
+
+    @property
+    def maxkeys(self) -> Optional[int]:
+        '''键的数量上限，平均分配给每个分片，默认为 None，表示不限制'''
+        return self._maxkeys
+
+    @maxkeys.setter
+    def maxkeys(self, maxkeys: Optional[int]):
+        n = len(self._shards)
+        per_shard = None if maxkeys is None else -(-maxkeys // n)
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                shard.maxkeys = per_shard
+        self._maxkeys = maxkeys
+
+    @property
+    def key_index(self) -> bool:
+        '''是否在每个分片上维护按字典序排列的键索引，见 ``BaseCore``'''
+        return self._shards[0].key_index
+
+    @key_index.setter
+    def key_index(self, enabled: bool):
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                shard.key_index = enabled
+
+    @property
+    def maxkeys_policy(self) -> str:
+        '''达到 ``maxkeys`` 后的淘汰策略，每个分片使用独立的策略实例'''
+        return self._shards[0].maxkeys_policy
+
+    @maxkeys_policy.setter
+    def maxkeys_policy(self, policy: Union[str, EvictionPolicy]):
+        for shard, lock in zip(self._shards, self._locks):
+            if isinstance(policy, EvictionPolicy):
+                shard_policy = policy.clone()
+            else:
+                shard_policy = get_policy(policy)
+            with lock:
+                shard.maxkeys_policy = shard_policy
+
+    @property
+    def stat_evicted_keys(self) -> int:
+        return sum(shard.stat_evicted_keys for shard in self._shards)
+
+    @property
+    def stat_expired_keys(self) -> int:
+        return sum(shard.stat_expired_keys for shard in self._shards)
+
+    @property
+    def stat_keyspace_hits(self) -> int:
+        return sum(shard.stat_keyspace_hits for shard in self._shards)
+
+    @property
+    def stat_keyspace_misses(self) -> int:
+        return sum(shard.stat_keyspace_misses for shard in self._shards)
+
+    def get(self, key: str) -> Union[Any, None]:
+        '''获取指定 key 的值，见 ``BaseCore.get``'''
+        return self._call(key, BaseCore.get)
+
+    def set(self, key: str, value: Any,
+            ex: Optional[Union[float, timedelta]] = None) -> bool:
+        '''将 ``key`` 的值设为 ``value``，见 ``BaseCore.set``'''
+        return self._call(key, BaseCore.set, value, ex)
+
+    def setnx(self, key: str, value: Any,
+              ex: Optional[Union[float, timedelta]] = None) -> bool:
+        '''当 ``key`` 不存在时，将 ``key`` 的值设为 ``value``，见 ``BaseCore.setnx``'''
+        return self._call(key, BaseCore.setnx, value, ex)
+
+    def mget(self, keys: Collection[str]) -> List[Any]:
+        '''获取通过 ``keys`` 指定的键的值，见 ``BaseCore.mget``'''
+        keys = list(keys)
+        if len(self._shards) == 1:
+            with self._locks[0]:
+                return self._shards[0].mget(keys)
+        found: Dict[str, Any] = {}
+        for i, group in self._group(keys).items():
+            with self._locks[i]:
+                values = self._shards[i].mget(group)
+            found.update(zip(group, values))
+        return [found[key] for key in keys]
+
+    def mset(self, data: Dict[str, Any],
+             ex: Optional[Union[float, timedelta]] = None) -> bool:
+        '''存入通过 ``data`` 指定的键值对，见 ``BaseCore.mset``'''
+        for i, group in self._group(data).items():
+            with self._locks[i]:
+                self._shards[i].mset({key: data[key] for key in group}, ex)
+        return True
+
+    def msetnx(self, data: Dict[str, Any],
+               ex: Optional[Union[float, timedelta]] = None) -> int:
+        '''存入通过 dict 指定的多个键值对，见 ``BaseCore.msetnx``'''
+        count = 0
+        for i, group in self._group(data).items():
+            with self._locks[i]:
+                count += self._shards[i].msetnx(
+                    {key: data[key] for key in group}, ex)
+        return count
+
+    def delete(self, key, *keys: str) -> int:
+        '''删除一个或多个通过 ``keys`` 指定的键
+
+        Returns:
+            int: 成功操作的数量
+        '''
+        if not keys:
+            return self._call(key, BaseCore.delete)
+        count = 0
+        for i, group in self._group((key, *keys)).items():
+            with self._locks[i]:
+                count += self._shards[i].delete(*group)
+        return count
+
+    def unlink(self, key: str, *keys: str) -> int:
+        '''删除一个或多个键，大的值交给后台线程释放，见 ``BaseCore.unlink``'''
+        count = 0
+        for i, group in self._group((key, *keys)).items():
+            with self._locks[i]:
+                count += self._shards[i].unlink(*group)
+        return count
+
+    def exists(self, key: str) -> bool:
+        '''判断指定的 ``key`` 是否存在或失效'''
+        return self._call(key, BaseCore.exists)
+
+    def keys(self, pattern: Optional[str] = None) -> List[str]:
+        '''获取所有合法的键，各分片依次加锁，结果不是某一时刻的快照
+
+        ``pattern`` 见 ``BaseCore.keys``
+        '''
+        self._materialize()
+        ret: List[str] = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                ret.extend(shard.keys(pattern))
+        return ret
+
+    def delete_prefix(self, prefix: str) -> int:
+        '''删除所有以 ``prefix`` 开头的键，各分片依次加锁'''
+        self._materialize()
+        count = 0
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                count += shard.delete_prefix(prefix)
+        return count
+
+    def scan(
+        self,
+        cursor: int = 0,
+        match: Optional[str] = None,
+        count: int = 10,
+        type: Optional[str] = None
+    ) -> Tuple[int, List[str]]:
+        '''增量地遍历键空间，依次遍历各分片，见 ``BaseCore.scan``
+
+        游标的低位为分片的序号，其余为分片内的游标
+        '''
+        n = len(self._shards)
+        i, inner = cursor % n, cursor // n
+        if self._mapped is not None and \
+                self._materialize(monotonic() + SCAN_MAPPED_TIME):
+            # 快照中的键没有全部载入之前不推进遍历，以免遗漏之后载入的键
+            if cursor == 0:
+                with self._locks[0]:
+                    inner = self._shards[0]._scan_cursor(0)
+            return inner * n + i, []
+        with self._locks[i]:
+            inner, keys = self._shards[i].scan(inner, match, count, type)
+        if not inner:
+            i += 1
+            if i == n:
+                return 0, keys
+        return inner * n + i, keys
+
+    def scan_iter(
+        self,
+        match: Optional[str] = None,
+        count: int = 10,
+        type: Optional[str] = None
+    ) -> Iterator[str]:
+        '''以生成器的形式遍历键空间，参数见 ``BaseCore.scan``'''
+        cursor = 0
+        while True:
+            cursor, keys = self.scan(cursor, match, count, type)
+            yield from keys
+            if not cursor:
+                return
+
+    def ttl(self, key: str) -> int:
+        '''获取指定键的 TTL，见 ``BaseCore.ttl``'''
+        return self._call(key, BaseCore.ttl)
+
+    def incr(
+        self,
+        key: str,
+        amount: int = 1,
+        ex: Optional[Union[float, timedelta]] = None
+    ) -> int:
+        '''自增，见 ``BaseCore.incr``'''
+        return self._call(key, BaseCore.incr, amount, ex)
+
+    def decr(
+        self,
+        key: str,
+        amount: int = 1,
+        ex: Optional[Union[float, timedelta]] = None
+    ) -> int:
+        '''自减，见 ``BaseCore.decr``'''
+        return self._call(key, BaseCore.decr, amount, ex)
+
+    def flushdb(self, asynchronous: bool = False):
+        '''清除所有存入的键，见 ``BaseCore.flushdb``'''
+        with self._mapped_lock:
+            self._mapped = None
+            for shard, lock in zip(self._shards, self._locks):
+                with lock:
+                    shard.flushdb(asynchronous)
+
+    def _items(self) -> List[Any]:
+        '''各分片依次加锁复制键值对的引用，不是所有分片在同一时刻的状态'''
+        self._materialize()
+        items: List[Any] = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                items.extend(shard._items())
+        return items
+
+    def save(self, path: str) -> int:
+        '''将所有键保存为快照文件，见 ``BaseCore.save``
+
+        各分片依次加锁复制键值对的引用，快照不是所有分片在同一时刻的状态
+        '''
+        return rdb.save(self._items(), path)
+
+    def save_mapped(self, path: str) -> int:
+        '''将所有键保存为可以映射的快照文件，见 ``BaseCore.save_mapped``'''
+        return mapped.write(self._items(), path)
+
+    def attach(self, path: str) -> int:
+        '''映射 ``save_mapped`` 保存的快照文件，见 ``BaseCore.attach``
+
+        所有分片共享同一个映射，每个分片只载入属于自己的键。
+        ``active_expire`` 为 True 时，后台清理线程在清理之余逐步载入剩余的键
+
+        Raises:
+            RuntimeError: 已经存有键时引发
+            RdbError: 文件不是可以映射的快照或已损坏时引发
+
+        Returns:
+            int: 文件中的键的数量
+        '''
+        with self._mapped_lock:
+            if self._mapped is not None or not all(
+                    not shard._db and shard._mapped is None for shard in self._shards):
+                raise RuntimeError('can only attach a snapshot to an empty database')
+            snapshot = MappedSnapshot(path)
+            n = len(self._shards)
+            for i, (shard, lock) in enumerate(zip(self._shards, self._locks)):
+                with lock:
+                    shard._attach(snapshot, lambda key, i=i: hash(key) % n == i)
+            self._mapped, self._mapped_pos = snapshot, 0
+            return snapshot.count
+
+    @property
+    def mapped_pending(self) -> bool:
+        '''映射的快照中是否还有没有载入的键'''
+        return self._mapped is not None
+
+    def _materialize(self, deadline: float = INF) -> bool:
+        '''从上次的进度开始载入映射的快照中的键，超过 ``deadline`` 时退出
+
+        每批槽位中的键先按分片分组，每个分片的锁只获取一次，见 ``BaseCore._materialize``
+
+        Returns:
+            bool: 是否还有没有载入的键
+        '''
+        if self._mapped is None:
+            return False
+        with self._mapped_lock:
+            snapshot = self._mapped
+            if snapshot is None:
+                return False
+            n = len(self._shards)
+            pos, slots = self._mapped_pos, snapshot.slots
+            with rdb.gc_paused():
+                while pos < slots:
+                    groups = self._group_entries(snapshot.entries(pos, pos + MAPPED_STEP), n)
+                    for i, group in groups.items():
+                        with self._locks[i]:
+                            self._shards[i]._restore_entries(group)
+                    pos += MAPPED_STEP
+                    if pos < slots and monotonic() >= deadline:
+                        self._mapped_pos = pos
+                        return True
+            for shard, lock in zip(self._shards, self._locks):
+                with lock:
+                    shard._detach()
+            self._mapped = None
+            return False
+
+    @staticmethod
+    def _group_entries(
+        entries: Iterator[Tuple[str, int, int, float]],
+        n: int
+    ) -> Dict[int, List[Tuple[str, int, int, float]]]:
+        groups: Dict[int, List[Tuple[str, int, int, float]]] = {}
+        for entry in entries:
+            i = hash(entry[0]) % n
+            try:
+                groups[i].append(entry)
+            except KeyError:
+                groups[i] = [entry]
+        return groups
+
+    def load(self, path: str) -> int:
+        '''载入快照文件，见 ``BaseCore.load``'''
+        self._materialize()
+        with rdb.gc_paused():
+            with open(path, 'rb') as f:
+                batches = list(rdb.load(f))
+            groups: List[List[rdb.EntryT]] = [[] for _ in self._shards]
+            n = len(self._shards)
+            for batch in batches:
+                for entry in batch:
+                    groups[hash(entry[0]) % n].append(entry)
+            count = 0
+            for shard, lock, group in zip(self._shards, self._locks, groups):
+                with lock:
+                    count += shard._load_batches((group,))
+            return count
+
+    def expire(self, key: str, time: Union[int, timedelta],
+               nx: bool = False, xx: bool = False) -> bool:
+        '''将 ``key`` 的失效时长设为 ``time``（秒），见 ``BaseCore.expire``'''
+        return self._call(key, BaseCore.expire, time, nx, xx)
+
+    def active_expire_cycle(self, timelimit: float = TIME_PERC) -> Tuple[int, bool]:
+        '''依次清理各分片中已经失效的键，总耗时不超过 ``timelimit``
+
+        每个分片只在清理自身时持有锁。有映射的快照时，
+        清理完成后在剩余的时间里载入快照中的键，见 ``attach``
+
+        Returns:
+            Tuple[int, bool]: 清理的键的数量，以及是否因超时而退出或仍有没有载入的键
+        '''
+        start = monotonic()
+        deadline = start + timelimit
+        total = 0
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:  # 其他线程可能正在修改失效索引，读取最近的失效时刻同样需要持有锁
+                if shard._next_expiry() > start:
+                    continue
+                expired, timeout = shard._expire_due(start, deadline)
+            total += expired
+            if timeout or monotonic() >= deadline:
+                return total, True
+        if self._mapped is not None:
+            return total, self._materialize(deadline)
+        return total, False
+
+    def close(self):
+        '''停止后台清理线程'''
+        self._stop_evt.set()
+
+    def __del__(self):
+        self.close()
+
+
+def _expire_forever(core_ref: 'ref[ShardedCore]', stop_evt: Event):
+    # 只持有弱引用，ShardedCore 被回收后线程自动退出
+    while not stop_evt.is_set():
+        core = core_ref()
+        if core is None:
+            return
+        _, timeout = core.active_expire_cycle()
+        del core
+        if not timeout:
+            stop_evt.wait(EXPIRE_INTERVAL)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+'''客户端缓存的跟踪表
+
+仿照 redis 的 CLIENT TRACKING（默认模式）：开启跟踪的客户端读取过的键被记录下来，
+键被修改、删除、失效或淘汰时，向读取过它的客户端发送失效消息，并清除记录，
+客户端再次读取这个键后才会重新记录。清空数据库时通知所有客户端清空整个缓存
+
+跟踪表只记录键和客户端，失效消息先积攒起来，由服务线程通过 ``pop_pending``
+取出后推送，见 ``Server.client_tracking``
+'''
+
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+TRACKING_MAX_KEYS = 1_000_000
+'''跟踪表中键的数量上限，超出时最早记录的键视为失效，与 redis 的 tracking-table-max-keys 相同'''
+
+
+class Tracking:
+    '''记录客户端读取过的键，键失效时为客户端生成失效消息
+
+    客户端可以是任意可哈希的对象，服务线程中为连接
+    '''
+
+    def __init__(self, max_keys: int = TRACKING_MAX_KEYS) -> None:
+        self.max_keys = max_keys
+        self._clients: Set[Hashable] = set()
+        self._table: Dict[str, Set[Hashable]] = {}
+        '''键到读取过它的客户端的映射，按记录的先后排列'''
+        self._pending: Dict[Hashable, Optional[List[str]]] = {}
+        '''待发送的失效消息，值为 None 表示客户端需要清空整个缓存'''
+
+    def __len__(self) -> int:
+        '''跟踪的键的数量'''
+        return len(self._table)
+
+    def __contains__(self, client: Hashable) -> bool:
+        return client in self._clients
+
+    @property
+    def clients(self) -> int:
+        '''开启跟踪的客户端的数量'''
+        return len(self._clients)
+
+    @property
+    def pending(self) -> bool:
+        '''是否有待发送的失效消息'''
+        return bool(self._pending)
+
+    def enable(self, client: Hashable):
+        self._clients.add(client)
+
+    def disable(self, client: Hashable):
+        '''关闭 ``client`` 的跟踪，表中残留的记录在键失效时跳过'''
+        self._clients.discard(client)
+        self._pending.pop(client, None)
+
+    def track(self, client: Hashable, keys: Iterable[str]):
+        '''记录 ``client`` 读取了 ``keys``，没有开启跟踪的客户端被忽略'''
+        if client not in self._clients:
+            return
+        table = self._table
+        for key in keys:
+            clients = table.get(key)
+            if clients is None:
+                table[key] = {client}
+            else:
+                clients.add(client)
+        while len(table) > self.max_keys:
+            self.invalidate(next(iter(table)))
+
+    def invalidate(self, key: str):
+        '''``key`` 被修改或删除，为读取过它的客户端生成失效消息'''
+        clients = self._table.pop(key, None)
+        if clients is None:
+            return
+        tracking, pending = self._clients, self._pending
+        for client in clients:
+            if client in tracking:
+                keys = pending.setdefault(client, [])
+                if keys is not None:
+                    keys.append(key)
+
+    def invalidate_all(self):
+        '''清空了整个数据库，通知所有客户端清空缓存'''
+        self._table.clear()
+        self._pending = dict.fromkeys(self._clients)
+
+    def pop_pending(self) -> List[Tuple[Any, Optional[List[str]]]]:
+        '''取出待发送的失效消息，为 (客户端, 失效的键) 的列表，键为 None 表示全部失效'''
+        pending, self._pending = self._pending, {}
+        return list(pending.items())
@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
 
-from datetime import datetime, timedelta
-from threading import Lock
-from typing import Any, Union
+from datetime import timedelta
+from time import monotonic
+from typing import Any, Optional, Union
 
 INF = float('inf')  # 无穷大
 
@@ -10,39 +10,68 @@ INF = float('inf')  # 无穷大
 class Value:
     '''值的包装类
 
+    失效时刻以 ``time.monotonic`` 的读数保存，避免 datetime 运算的开销，
+    同时不受系统时间调整的影响
+
+    需要连续检查大量值时（如 mget、keys），可以先读取一次时钟，
+    再通过 ``is_expired(now)``、``get_ttl(now)`` 传入，避免逐个读取时钟
+
     Attributes:
         value (Any): 存入的原始值
-        expire_at (timedelta): 失效时刻，以 datetime 保存
-        expiry (bool): 是否会失效的标志
+        expire_at (float): 失效时刻，以 monotonic 时钟读数保存，永不失效为 INF
+        lru (int): 访问信息，供淘汰策略使用，见 ``pydis.eviction``
+        version (int): 版本号，每次写入都会改变，供乐观锁使用
+        seq (int): 键在键日志中的位置，存入时设置，覆盖写入时保持不变，供 scan 使用
     '''
     __slots__ = [
         'value',
         'expire_at',
-        'expiry',
+        'lru',
+        'version',
+        'seq',
     ]
 
-    def __init__(self, value: Any, ex: Union[float, timedelta, None]):
+    def __init__(
+        self,
+        value: Any,
+        ex: Union[float, timedelta, None],
+        now: Optional[float] = None
+    ):
         self.value = value
-        if ex is not None:
-            if isinstance(ex, (int, float)):
-                ex = timedelta(seconds=ex)
-            self.expire_at = datetime.now() + ex
-            self.expiry = True
-
+        self.lru = self.version = 0
+        if ex is None:
+            self.expire_at = INF
         else:
-            self.expire_at = datetime.max
-            self.expiry = False
+            if isinstance(ex, timedelta):
+                ex = ex.total_seconds()
+            if now is None:
+                now = monotonic()
+            self.expire_at = now + ex
+
+    @property
+    def expiry(self) -> bool:
+        '''是否会失效的标志'''
+        return self.expire_at != INF
 
     @property
     def expired(self) -> bool:
         '''是否失效'''
-        return datetime.now() >= self.expire_at
+        expire_at = self.expire_at
+        return expire_at != INF and monotonic() >= expire_at
+
+    def is_expired(self, now: float) -> bool:
+        '''以给定的时钟读数 ``now`` 判断是否失效'''
+        return now >= self.expire_at
 
     @property
     def ttl(self) -> float:
-        if not self.expiry:
+        return self.get_ttl(monotonic())
+
+    def get_ttl(self, now: float) -> float:
+        '''以给定的时钟读数 ``now`` 计算剩余的有效时长'''
+        if self.expire_at == INF:
             return -1  # 表示永不过期
-        return (self.expire_at - datetime.now()).total_seconds()
+        return self.expire_at - now
 
     def cre(self, amount) -> int:
         if not isinstance(self.value, int):
@@ -55,4 +84,4 @@ class Value:
 
 
 NOT_EXISTS = Value(None, 0)
-NOT_EXISTS.expire_at = datetime.min
+NOT_EXISTS.expire_at = -INF
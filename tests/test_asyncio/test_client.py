@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from threading import Thread
+from unittest import TestCase, mock
+
+from pydis.asyncio.client import AsyncPydisClient
+from pydis.exceptions import ConnectionClosedError, ReceiveTimeout, WatchError
+from pydis.multithreading.connection import open_connection
+from pydis.multithreading.server import Server
+from pydis.utils import Singleton
+
+
+class FakeServer(metaclass=Singleton):
+    '''在后台线程中用 Server.execute 处理请求，不启动真正的服务线程'''
+
+    @classmethod
+    def open_connection(cls):
+        cls.conn, conn = open_connection()
+        Thread(target=cls.serve, args=(cls.conn,), daemon=True).start()
+        return conn
+
+    @staticmethod
+    def serve(conn):
+        while True:
+            try:
+                msg = conn.recv()
+            except ConnectionClosedError:
+                return
+            if msg[2] == 'sleep':
+                continue  # 模拟迟迟不返回的请求
+            conn.send((msg[0], *Server().execute(msg[1:])))
+
+    def start(self): pass
+
+
+@mock.patch('pydis.multithreading.client.Server', FakeServer)
+class TestAsyncPydisClient(TestCase):
+    def setUp(self):
+        Server._Singleton__instance = None  # type: ignore
+
+    def tearDown(self):
+        Server._Singleton__instance = None  # type: ignore
+
+    def run_async(self, coro):
+        return asyncio.run(coro)
+
+    def test_commands(self):
+        async def main():
+            c = AsyncPydisClient()
+            self.assertIs(await c.set('key', 'val'), True)
+            self.assertEqual(await c.get('key'), 'val')
+            self.assertIs(await c.empty(), False)
+            self.assertEqual(await c.dbsize(), 1)
+            self.assertEqual(await c.mget(['key', 'fake']), ['val', None])
+            with self.assertRaises(ValueError):
+                await c.incr('key')
+            c.close()
+        self.run_async(main())
+
+    def test_wrappers(self):
+        import inspect
+        from pydis.multithreading.commands import OPCODES
+        for name in ('get', 'mget', 'set', 'scan', 'client_tracking'):
+            method = getattr(AsyncPydisClient, name)
+            self.assertTrue(inspect.iscoroutinefunction(method), name)
+            self.assertEqual(method.__name__, name)
+        self.assertTrue(set(OPCODES) - {'function_flush'} <= set(vars(AsyncPydisClient)))
+
+    def test_scan_iter(self):
+        async def main():
+            c = AsyncPydisClient()
+            for i in range(25):
+                await c.set('key%d' % i, i)
+            keys = [key async for key in c.scan_iter(count=10)]
+            self.assertEqual(sorted(keys), sorted('key%d' % i for i in range(25)))
+            c.close()
+        self.run_async(main())
+
+    def test_concurrent_requests(self):
+        async def main():
+            c = AsyncPydisClient()
+            results = await asyncio.gather(*(c.incr('counter') for _ in range(100)))
+            self.assertEqual(results, list(range(1, 101)))
+            c.close()
+        self.run_async(main())
+
+    def test_timeout(self):
+        from pydis.multithreading.message import message
+
+        async def main():
+            c = AsyncPydisClient()
+            with self.assertRaises(ReceiveTimeout):
+                await c.execute_command(
+                    (message.CALL, 'sleep', ((), {})), timeout=0.05)
+            c.close()
+            with self.assertRaises(ConnectionClosedError):
+                await c.get('key')
+        self.run_async(main())
+
+    def test_pipeline_transaction(self):
+        async def main():
+            c = AsyncPydisClient()
+            async with c.pipeline() as pipe:
+                pipe.set('key', 1).incr('key')
+                self.assertEqual(await pipe.execute(), [True, 2])
+
+            pipe = c.pipeline(transaction=True)
+            await pipe.watch('key')
+            pipe.multi()
+            pipe.set('key', 10)
+            Server().set('key', 3)
+            with self.assertRaises(WatchError):
+                await pipe.execute()
+
+            async def double(pipe):
+                value = await c.get('key')
+                pipe.multi()
+                pipe.set('key', value * 2)
+            self.assertEqual(await c.transaction(double, 'key'), [True])
+            self.assertEqual(await c.get('key'), 6)
+            c.close()
+        self.run_async(main())
@@ -85,6 +85,127 @@ class Test(unittest.TestCase):
         p.set(key1, val1)
         self.assertEqual(p.delete(key1, key2), 2)
 
+    def test_unlink(self):
+        from pydis.lazyfree import LazyFree
+        p = Pydis()
+        big = list(range(1000))
+        p.mset({'key1': big, 'key2': 'val', 'key3': 'val'})
+        self.assertEqual(p.unlink('key1', 'key2', 'nokey'), 2)
+        self.assertEqual(p.keys(), ['key3'])
+        self.assertIs(LazyFree().wait(), True)
+        self.assertEqual(len(big), 1000)
+
+    def test_flushdb_async(self):
+        from pydis.lazyfree import LazyFree
+        p = Pydis()
+        p.key_index = True
+        p.mset({'key%d' % i: i for i in range(1000)}, 100)
+        p.flushdb(asynchronous=True)
+        self.assertIs(p.empty, True)
+        self.assertEqual(p.keys('key*'), [])
+        self.assertEqual(p._expires, [])
+        p.set('key', 'val')
+        self.assertEqual(p.get('key'), 'val')
+        self.assertIs(LazyFree().wait(), True)
+
+    def test_save_load(self):
+        import os
+        import tempfile
+        p = Pydis()
+        p.mset({'key%d' % i: i for i in range(100)})
+        p.set('ex', 'val', 100)
+        p.set('short', 'val', 0.2)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dump.pydis')
+            self.assertEqual(p.save(path), 102)
+            Pydis._Singleton__instance = None  # type: ignore
+            p = Pydis()
+            p.key_index = True
+            p.set('key1', 'old')
+            time.sleep(0.2)
+            self.assertEqual(p.load(path), 101)  # 已经失效的键被跳过
+        self.assertEqual(p.get('key1'), 1)
+        self.assertEqual(len(p.keys('key*')), 100)
+        self.assertTrue(98 < p.ttl('ex') <= 100)
+        self.assertEqual(p._expires[0][1], 'ex')
+        self.assertNotEqual(p.versions('key1'), [0])
+        self.assertEqual(p._volatile_keys, 1)
+
+    def test_attach(self):
+        import os
+        import tempfile
+        from pydis.core import MAPPED_STEP
+        p = Pydis()
+        p.mset({'key%d' % i: [i] for i in range(1000)})
+        p.set('ex', 'val', 100)
+        p.set('short', 'val', 0.2)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dump.pydis')
+            self.assertEqual(p.save_mapped(path), 1002)
+            Pydis._Singleton__instance = None  # type: ignore
+            p = Pydis()
+            p.key_index = True
+            time.sleep(0.2)
+            self.assertEqual(p.attach(path), 1002)
+            with self.assertRaises(RuntimeError):
+                p.attach(path)
+        self.assertTrue(p.mapped_pending)
+        # 按需载入，映射后写入和删除的键不会再从快照中载入
+        self.assertEqual(p.get('key1'), [1])
+        self.assertEqual(len(p._db), 1)
+        self.assertEqual(p.mget(['key2', 'missing', 'short']), [[2], None, None])
+        self.assertTrue(98 < p.ttl('ex') <= 100)
+        p.set('key3', 'new')
+        self.assertEqual(p.delete('key4', 'key5', 'missing'), 2)
+        self.assertEqual(p.msetnx({'key6': 'new', 'key7000': 'new'}), 1)
+        self.assertEqual(p.incr('counter'), 1)
+        # 逐步载入
+        self.assertTrue(p._materialize(0))
+        self.assertEqual(p._mapped_pos, MAPPED_STEP)
+        self.assertFalse(p._materialize())
+        self.assertFalse(p.mapped_pending)
+        self.assertEqual(len(p._db), 1001)
+        self.assertEqual(p.get('key3'), 'new')
+        self.assertIsNone(p.get('key4'))
+        self.assertEqual(p.get('key6'), [6])
+        self.assertEqual(p.get('key999'), [999])
+        self.assertIsNone(p.get('short'))
+        self.assertEqual(len(p.keys('key*')), 999)
+        self.assertEqual(p._expires[0][1], 'ex')
+        self.assertEqual(p._volatile_keys, 1)
+
+    def test_attach_keys(self):
+        import os
+        import tempfile
+        p = Pydis()
+        p.mset({'key%d' % i: i for i in range(10)})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dump.pydis')
+            p.save_mapped(path)
+            p.flushdb()
+            p.attach(path)
+            p.delete('key1')
+            self.assertEqual(len(p.keys()), 9)  # 需要所有键的操作先载入剩余的键
+            self.assertFalse(p.mapped_pending)
+            p.flushdb()
+            p.attach(path)
+            self.assertEqual(sorted(p.scan_iter()), sorted('key%d' % i for i in range(10)))
+            self.assertFalse(p.mapped_pending)
+            p.flushdb()
+            p.attach(path)
+        p.flushdb()
+        self.assertFalse(p.mapped_pending)
+        self.assertIsNone(p.get('key1'))
+
+    def test_incr_copy_on_write(self):
+        p = Pydis()
+        p.set('counter', 1)
+        snapshot = list(p._db.items())
+        p._cow = True
+        p.incr('counter')
+        self.assertEqual(snapshot[0][1].value, 1)
+        self.assertEqual(p.get('counter'), 2)
+
     def test_exists(self):
         p = Pydis()
         key, val, fake_key = 'key', 'val', 'fake_key'
@@ -104,6 +225,60 @@ class Test(unittest.TestCase):
         time.sleep(1)
         self.assertFalse(set(p.keys()).difference(keys))
 
+    def test_keys_pattern(self):
+        for key_index in (False, True):
+            p = Pydis()
+            p.key_index = key_index
+            p.mset({'user:1:name': 'a', 'user:2:name': 'b', 'user:10:age': 1,
+                    'session:1': 's', 'user': 'u'})
+            p.set('user:3:name', 'c', 0)
+            self.assertEqual(sorted(p.keys('user:*')),
+                             ['user:10:age', 'user:1:name', 'user:2:name'])
+            self.assertEqual(sorted(p.keys('user:?:name')),
+                             ['user:1:name', 'user:2:name'])
+            self.assertEqual(p.keys('user'), ['user'])
+            self.assertEqual(sorted(p.keys('*:1*')),
+                             ['session:1', 'user:10:age', 'user:1:name'])
+            self.assertEqual(len(p.keys('*')), 5)
+            self.assertEqual(p.stat_expired_keys, 1)
+            Pydis._Singleton__instance = None  # type: ignore
+
+    def test_delete_prefix(self):
+        for key_index in (False, True):
+            p = Pydis()
+            p.key_index = key_index
+            p.mset({'user:%d' % i: i for i in range(100)})
+            p.set('session:1', 's')
+            self.assertEqual(p.delete_prefix('user:1'), 11)
+            self.assertEqual(len(p.keys('user:*')), 89)
+            self.assertEqual(p.delete_prefix('user:'), 89)
+            self.assertEqual(p.delete_prefix('user:'), 0)
+            self.assertEqual(p.keys(), ['session:1'])
+            Pydis._Singleton__instance = None  # type: ignore
+
+    def test_key_index_maintained(self):
+        p = Pydis()
+        p.set('k:old', 1)
+        p.key_index = True  # 启用时由已有的键建立索引
+        index = p._key_index
+        p.set('k:1', 1)
+        p.set('k:1', 2)
+        p.set('k:2', 1, 0)
+        p.set('k:3', 1, 0)
+        p.set('k:4', 1)
+        p.get('k:2')                     # 惰性清理
+        p._expire_due(time.monotonic())  # 定期清理
+        p.delete('k:4')
+        self.assertEqual(list(index), ['k:1', 'k:old'])
+        p.maxkeys = 2
+        p.maxkeys_policy = 'allkeys-random'
+        p.set('k:5', 1)                  # 淘汰
+        self.assertEqual(sorted(index), sorted(p.keys()))
+        p.flushdb()
+        self.assertEqual(len(index), 0)
+        p.key_index = False
+        self.assertIsNone(p._key_index)
+
     def test_ttl(self):
         p = Pydis()
         key, val, ttl = 'key', 'val', 1
@@ -128,8 +303,10 @@ class Test(unittest.TestCase):
         self.assertIs(p.empty, True)
         p.set('key', 'val')
         self.assertIs(p.empty, False)
+        self.assertEqual(p.dbsize(), 1)
         p.flushdb()
         self.assertIs(p.empty, True)
+        self.assertEqual(p.dbsize(), 0)
 
     def test_incr_decr(self):
         p = Pydis()
@@ -157,6 +334,160 @@ class Test(unittest.TestCase):
         self.assertIs(p.expire(key, 0), True)
         self.assertIsNone(p.get(key))
 
+    def test_expire_due(self):
+        from time import monotonic
+        p = Pydis()
+        p.set('key1', 'val', 1)
+        p.set('key2', 'val', 100)
+        p.set('key3', 'val', 1)
+        p.set('key3', 'val')  # 覆盖为永久有效的键
+        p.delete('key1')
+        p.set('key1', 'val', 1)
+        expired, timeout = p._expire_due(monotonic() + 2)
+        self.assertEqual(expired, 1)
+        self.assertIs(timeout, False)
+        self.assertEqual(sorted(p._db), ['key2', 'key3'])
+        self.assertEqual(len(p._expires), 1)
+
+    def test_volatile_keys(self):
+        from time import monotonic
+
+        def volatile(p):
+            return sum(1 for v in p._db.values() if v.expiry)
+
+        p = Pydis()
+        p.mset({'key%d' % i: i for i in range(10)}, 100)
+        p.set('key0', 'val')
+        p.expire('key1', 1)
+        p.incr('key2', 1, 100)
+        p.delete('key3', 'key4', 'key5')
+        p.unlink('key6')
+        self.assertEqual(p._volatile_keys, volatile(p))
+        p._expire_due(monotonic() + 2)
+        self.assertEqual(p._volatile_keys, volatile(p))
+        p.maxkeys, p.maxkeys_policy = len(p._db), 'volatile-ttl'
+        p.set('new', 'val', 10)
+        self.assertEqual(p._volatile_keys, volatile(p))
+        p.flushdb()
+        self.assertEqual(p._volatile_keys, 0)
+
+    def test_expires_compact(self):
+        from pydis.core import EXPIRES_COMPACT_MIN
+        p = Pydis()
+        for _ in range(EXPIRES_COMPACT_MIN * 2):
+            p.set('key', 'val', 100)
+        self.assertLessEqual(len(p._expires), EXPIRES_COMPACT_MIN + 1)
+        p.set('key', 'val')
+        p.flushdb()
+        self.assertFalse(p._expires)
+
+    def test_versions(self):
+        p = Pydis()
+        self.assertEqual(p.versions('key'), [0])
+        p.set('key', 1)
+        v1, = p.versions('key')
+        self.assertNotEqual(v1, 0)
+        self.assertEqual(p.versions('key'), [v1])
+        p.incr('key')
+        v2, = p.versions('key')
+        self.assertNotEqual(v2, v1)
+        p.expire('key', 0)
+        v3, = p.versions('key')
+        self.assertNotIn(v3, (0, v2))
+        p.set('key', 1)
+        p.delete('key')             # 存入后又删除，版本号仍然改变
+        v4, = p.versions('key')
+        self.assertNotEqual(v4, v3)
+        self.assertEqual(p.versions('key', 'missing'), [v4, 0])
+        p.flushdb()
+        self.assertNotEqual(p.versions('key', 'missing'), [v4, 0])  # 清空后所有不存在的键都改变
+        self.assertEqual(p.versions('key', 'missing'), p.versions('key', 'missing'))
+
+    def test_keyspace_stats(self):
+        p = Pydis()
+        p.set('key1', 'val')
+        p.set('key2', 'val', 0)
+        p.set('key3', 'val', 0)
+        p.get('key1')
+        p.get('key2')  # 惰性清理
+        p.mget(['key1', 'key3', 'nokey'])
+        self.assertEqual(p.stat_keyspace_hits, 2)
+        self.assertEqual(p.stat_keyspace_misses, 3)
+        self.assertEqual(p.stat_expired_keys, 2)
+        p.set('key4', 'val', 0)
+        p._expire_due(time.monotonic())
+        self.assertEqual(p.stat_expired_keys, 3)
+
+    def test_scan(self):
+        p = Pydis()
+        keys = ['key%d' % i for i in range(25)]
+        for key in keys:
+            p.set(key, 'val')
+        cursor, batch = p.scan(count=10)
+        self.assertNotEqual(cursor, 0)
+        self.assertEqual(batch, keys[:10])
+        p.delete('key10')           # 遍历过程中删除的键不会返回
+        p.set('new', 'val')         # 遍历开始后新增的键排在最后，遍历结束前新增的会被返回
+        seen = batch
+        while cursor:
+            cursor, batch = p.scan(cursor, count=10)
+            seen += batch
+        self.assertEqual(seen, keys[:10] + keys[11:] + ['new'])
+        self.assertEqual(list(p.scan_iter(match='key1*')),
+                         ['key1'] + ['key%d' % i for i in range(11, 20)])
+        p.set('number', 1)
+        self.assertEqual(list(p.scan_iter(type='int')), ['number'])
+        with self.assertRaises(ValueError):
+            p.scan(12345)
+        with self.assertRaises(ValueError):
+            p.scan(count=0)
+
+    def test_scan_compact(self):
+        p = Pydis()
+        keys = ['key%d' % i for i in range(100)]
+        for key in keys:
+            p.set(key, 'val')
+        cursor, seen = p.scan(count=50)
+        for i in range(3000):       # 反复新增和删除键，遍历途中压缩键日志
+            p.set('tmp', i)
+            p.delete('tmp')
+        p.delete('key60')
+        p.set('key60', 'val')       # 重新存入的键排在最后，旧的位置不再返回
+        self.assertLess(len(p._keylog), 3000)
+        while cursor:
+            cursor, batch = p.scan(cursor, count=50)
+            seen += batch
+        # 压缩后位置向前取整，已经返回过的键可能重复返回，但不会遗漏
+        self.assertEqual(set(seen), set(keys))
+        self.assertLessEqual(len(seen), len(keys) + 50)
+        self.assertEqual(seen.count('key60'), 1)
+
+    def test_scan_interleaved(self):
+        p = Pydis()
+        keys = ['key%d' % i for i in range(100)]
+        for key in keys:
+            p.set(key, 'val')
+        # 服务端不保存遍历的状态，同时进行的遍历的数量不受限制
+        scans = [p.scan_iter(count=1) for _ in range(20)]
+        seen = [[next(it)] for it in scans]
+        for i, it in enumerate(scans):
+            p.set('new%d' % i, 'val')
+            p.delete('key%d' % (99 - i))
+            seen[i] += it
+        for i, batch in enumerate(seen):
+            self.assertEqual(len(batch), len(set(batch)))
+            self.assertTrue(set(keys[:80]) <= set(batch))
+        with self.assertRaises(ValueError):
+            p.scan(1 << 50)             # 来自未来的压缩次数
+
+    def test_scan_expired(self):
+        p = Pydis()
+        p.set('key1', 'val')
+        p.set('key2', 'val', 0)
+        self.assertEqual(list(p.scan_iter()), ['key1'])
+        self.assertIs(p.exists('key2'), False)
+        self.assertEqual(p.stat_expired_keys, 1)
+
     def tearDown(self):
         # Pydis 为单例类，测试完成后需要恢复改动
         Pydis._Singleton__instance = None  # type: ignore
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+from pydis import Pydis
+from pydis.eviction import (LFU_INIT_VAL, POLICIES, AllKeysLRU, KeySampler,
+                            get_policy, lfu_clock, lfu_decr,
+                            lfu_log_incr)
+from pydis.exceptions import OutOfMemoryError
+
+
+class TestEviction(unittest.TestCase):
+    def test_noeviction(self):
+        p = Pydis()
+        p.maxkeys = 3
+        p.mset({'key%d' % i: i for i in range(3)})
+        p.set('key0', 'val')  # 覆盖已有的键不受限制
+        with self.assertRaises(OutOfMemoryError):
+            p.set('key3', 'val')
+        with self.assertRaises(OutOfMemoryError):
+            p.incr('counter')
+        # 多键写入放不下时不存入任何键
+        with self.assertRaises(OutOfMemoryError):
+            p.mset({'key1': 'new', 'key3': 'val'})
+        with self.assertRaises(OutOfMemoryError):
+            p.msetnx({'key3': 'val', 'key4': 'val'})
+        self.assertEqual(p.mget(['key1', 'key3', 'key4']), [1, None, None])
+        self.assertEqual(p.stat_evicted_keys, 0)
+
+    def test_mset_evicts_before_store(self):
+        p = Pydis()
+        p.maxkeys, p.maxkeys_policy = 3, 'allkeys-random'
+        p.mset({'key%d' % i: i for i in range(3)})
+        p.mset({'key1': 'new', 'key3': 'new', 'key4': 'new'})
+        self.assertEqual(len(p._db), 3)
+        self.assertEqual(p.mget(['key1', 'key3', 'key4']), ['new'] * 3)
+
+    def test_expired_keys_freed_first(self):
+        p = Pydis()
+        p.maxkeys = 2
+        p.set('key1', 'val', 0)
+        p.set('key2', 'val')
+        p.set('key3', 'val')
+        self.assertEqual(sorted(p._db), ['key2', 'key3'])
+        self.assertEqual(p.stat_evicted_keys, 0)
+
+    def test_policies(self):
+        for name in POLICIES:
+            if name == 'noeviction':
+                continue
+            p = Pydis()
+            p.maxkeys = 10
+            p.maxkeys_policy = name
+            self.assertEqual(p.maxkeys_policy, name)
+            for i in range(100):
+                p.set('key%d' % i, i, 100 + i)
+                p.get('key%d' % i)
+            self.assertEqual(len(p._db), 10, name)
+            self.assertEqual(p.stat_evicted_keys, 90, name)
+            Pydis._Singleton__instance = None  # type: ignore
+
+    def test_volatile_without_volatile_keys(self):
+        p = Pydis()
+        p.maxkeys = 1
+        p.maxkeys_policy = 'volatile-lru'
+        p.set('key1', 'val')
+        with self.assertRaises(OutOfMemoryError):
+            p.set('key2', 'val')
+
+    def test_volatile_ttl(self):
+        p = Pydis()
+        p.maxkeys = 3
+        p.maxkeys_policy = 'volatile-ttl'
+        p.set('key1', 'val', 100)
+        p.set('key2', 'val', 10)
+        p.set('key3', 'val')
+        p.set('key4', 'val')
+        self.assertEqual(sorted(p._db), ['key1', 'key3', 'key4'])
+
+    def test_lru_keeps_hot_keys(self):
+        p = Pydis()
+        p.maxkeys = 100
+        p.maxkeys_policy = AllKeysLRU(samples=10)
+        for i in range(100):
+            p.set('key%d' % i, i)
+        time.sleep(0.05)
+        for i in range(10):
+            p.get('key%d' % i)  # 前 10 个为热键
+        for i in range(50):
+            p.set('new%d' % i, i)
+        hot = sum(1 for i in range(10) if 'key%d' % i in p._db)
+        self.assertEqual(hot, 10)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            get_policy('fake-policy')
+
+    def test_lfu_counter(self):
+        self.assertEqual(lfu_log_incr(255), 255)
+        self.assertEqual(lfu_log_incr(0), 1)  # 低于初始值时一定增长
+        ldt = (lfu_clock() - 10) & 0xFFFF
+        self.assertEqual(lfu_decr(ldt << 8 | LFU_INIT_VAL), 0)  # 10 分钟未访问，完全衰减
+        self.assertEqual(lfu_decr(lfu_clock() << 8 | LFU_INIT_VAL), LFU_INIT_VAL)
+
+    def test_sampler(self):
+        p = Pydis()
+        p.mset({'key%d' % i: i for i in range(10)})
+        sampler = KeySampler()
+        sampled = sampler.sample(p, 20)
+        self.assertLessEqual(len(sampled), 10)
+        self.assertEqual(len(set(sampled)), len(sampled))
+        # 键日志中大部分为过期条目时压缩后重新抽取
+        p.mset({'tmp%d' % i: i for i in range(1000)})
+        p.delete_prefix('tmp')
+        self.assertEqual(len(sampler.sample(p, 5)), 5)
+        self.assertEqual(len(p._keylog), 10)
+        volatile = KeySampler(volatile=True)
+        self.assertEqual(volatile.sample(p, 5), [])
+        p.set('ex', 'val', 100)
+        self.assertEqual(volatile.sample(p, 5), ['ex'])
+
+    def test_default_score(self):
+        from pydis.eviction import EvictionPolicy
+        p = Pydis()
+        p.maxkeys, p.maxkeys_policy = 3, EvictionPolicy()  # 默认在抽样的键中随机淘汰
+        p.mset({'key%d' % i: i for i in range(5)})
+        self.assertEqual(len(p.keys()), 3)
+
+    def tearDown(self):
+        Pydis._Singleton__instance = None  # type: ignore
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from pydis import keyindex
+from pydis.keyindex import KeyIndex
+
+
+class TestKeyIndex(unittest.TestCase):
+    def setUp(self):
+        self._chunk_size = keyindex.CHUNK_SIZE
+        keyindex.CHUNK_SIZE = 4  # 让少量的键也会分块
+
+    def tearDown(self):
+        keyindex.CHUNK_SIZE = self._chunk_size
+
+    def test_add_discard(self):
+        keys = ['key%03d' % i for i in range(100)]
+        shuffled = keys[:]
+        random.shuffle(shuffled)
+        index = KeyIndex()
+        for key in shuffled:
+            self.assertIs(index.add(key), True)
+        self.assertIs(index.add('key000'), False)
+        self.assertEqual(len(index), 100)
+        self.assertEqual(list(index), keys)
+        self.assertIn('key050', index)
+        for key in shuffled[:60]:
+            self.assertIs(index.discard(key), True)
+        self.assertIs(index.discard(shuffled[0]), False)
+        self.assertIs(index.discard('zzz'), False)
+        self.assertEqual(list(index), sorted(shuffled[60:]))
+        self.assertNotIn(shuffled[0], index)
+
+    def test_prefix(self):
+        keys = ['session:%d' % i for i in range(30)] + \
+            ['user:%d:profile' % i for i in range(30)] + ['user', 'userx']
+        index = KeyIndex(keys)
+        self.assertEqual(index.prefix('user:'),
+                         sorted('user:%d:profile' % i for i in range(30)))
+        self.assertEqual(index.prefix('user:1'),
+                         sorted(k for k in keys if k.startswith('user:1')))
+        self.assertEqual(index.prefix('session:2'), ['session:2'] +
+                         ['session:%d' % i for i in range(20, 30)])
+        self.assertEqual(index.prefix(''), sorted(keys))
+        self.assertEqual(index.prefix('zzz'), [])
+        self.assertEqual(index.prefix('a'), [])
+        index.clear()
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.prefix('user'), [])
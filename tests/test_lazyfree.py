@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from pydis.lazyfree import LAZYFREE_THRESHOLD, LazyFree, free_effort
+from pydis.value import Value
+
+
+class TestLazyFree(unittest.TestCase):
+    def test_free_effort(self):
+        self.assertEqual(free_effort('val'), 1)
+        self.assertEqual(free_effort([1, 2, 3]), 3)
+        self.assertEqual(free_effort(Value({'a': 1, 'b': 2}, None)), 2)
+
+    def test_free(self):
+        lazyfree = LazyFree()
+        self.assertIs(lazyfree.free([1]), False)  # 小的对象直接释放
+        freed = lazyfree.freed
+        big = list(range(LAZYFREE_THRESHOLD + 1))
+        self.assertIs(lazyfree.free(big, owned=True), True)
+        self.assertIs(lazyfree.wait(), True)
+        self.assertEqual(lazyfree.freed, freed + 1)
+        self.assertEqual(big, [])  # 内部的容器被逐个弹出
+
+    def test_not_owned(self):
+        lazyfree = LazyFree()
+        data = list(range(LAZYFREE_THRESHOLD + 1))
+        self.assertIs(lazyfree.free(Value(data, None)), True)
+        self.assertIs(lazyfree.wait(), True)
+        self.assertEqual(len(data), LAZYFREE_THRESHOLD + 1)  # 用户的值不会被修改
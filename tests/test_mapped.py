@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import unittest
+from time import time
+
+from pydis import mapped
+from pydis.exceptions import RdbError
+from pydis.value import INF, Value
+
+
+class TestMapped(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'dump.pydis')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        items = [('key%d' % i, Value({'i': i}, None)) for i in range(100)]
+        items.append(('ex', Value('val', 100)))
+        items.append(('expired', Value('val', 0)))
+        items.append(('中文\udc80', Value(b'raw', None)))
+        self.assertEqual(mapped.write(items, self.path), 102)
+        self.assertEqual(os.listdir(self.tmp.name), ['dump.pydis'])
+        snapshot = mapped.MappedSnapshot(self.path)
+        try:
+            self.assertEqual(len(snapshot), 102)
+            self.assertEqual(snapshot.slots, 256)
+            self.assertEqual(snapshot.lookup('key3'), ({'i': 3}, INF))
+            self.assertEqual(snapshot.lookup('中文\udc80'), (b'raw', INF))
+            self.assertAlmostEqual(snapshot.lookup('ex')[1], time() + 100, delta=1)
+            self.assertIsNone(snapshot.lookup('expired'))
+            self.assertIsNone(snapshot.lookup('missing'))
+            entries = list(snapshot.entries(0, 128)) + list(snapshot.entries(128, 1024))
+            self.assertEqual(len(entries), 102)
+            key, start, length, _ = next(e for e in entries if e[0] == 'key7')
+            self.assertEqual(snapshot.value(start, length), {'i': 7})
+        finally:
+            snapshot.close()
+
+    def test_empty(self):
+        self.assertEqual(mapped.write([], self.path), 0)
+        snapshot = mapped.MappedSnapshot(self.path)
+        self.assertIsNone(snapshot.lookup('key'))
+        self.assertEqual(list(snapshot.entries(0, snapshot.slots)), [])
+        snapshot.close()
+
+    def test_invalid(self):
+        mapped.write([('key', Value('val', None))], self.path)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        for bad in (b'NOTPYDIS' + data[8:], data[:-1], data[:10], b''):
+            with open(self.path, 'wb') as f:
+                f.write(bad)
+            with self.assertRaises(RdbError):
+                mapped.MappedSnapshot(self.path)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+from threading import Thread
+from unittest import TestCase
+
+from pydis.exceptions import ConnectionClosedError, ReceiveTimeout
+from pydis.multiprocessing import ConnectionPool, Pydis, start_server
+from pydis.multiprocessing.connection import connect
+
+
+class TestClient(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, 'pydis.sock')
+        cls.process = start_server(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.process.terminate()
+        cls.process.join()
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        self.client = Pydis(path=self.path)
+        self.client.flushdb()
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_commands(self):
+        c = self.client
+        self.assertIs(c.set('key', {'a': [1, 2]}), True)
+        self.assertEqual(c.get('key'), {'a': [1, 2]})
+        self.assertEqual(c.mset({'k1': 1, 'k2': 2}, 100), True)
+        self.assertEqual(c.mget(['k1', 'k2', 'k3']), [1, 2, None])
+        self.assertEqual(c.incr('k1', 2), 3)
+        self.assertTrue(0 < c.ttl('k2') <= 100)
+        self.assertEqual(sorted(c.keys()), ['k1', 'k2', 'key'])
+        self.assertEqual(sorted(c.scan_iter(match='k?')), ['k1', 'k2'])
+        with self.assertRaises(ValueError):
+            c.incr('key')  # 异常经 pickle 传回
+        with c.pipeline() as pipe:
+            self.assertEqual(pipe.set('p', 1).incr('p').get('p').execute(), [True, 2, 2])
+
+    def test_multiple_clients(self):
+        self.client.set('key', 'val')
+        other = Pydis(path=self.path)
+        self.assertEqual(other.get('key'), 'val')
+        self.assertEqual(other.info('server')['server']['connected_clients'], 2)
+        other.close()
+
+    def test_large_value(self):
+        value = b'x' * (8 * 1024 * 1024)
+        self.client.set('big', value)
+        self.assertEqual(self.client.get('big'), value)
+
+    def test_pool(self):
+        pool = ConnectionPool(max_connections=2, path=self.path)
+        client = Pydis(connection_pool=pool)
+
+        def incr():
+            for _ in range(100):
+                client.incr('counter')
+        threads = [Thread(target=incr) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(client.get('counter'), 400)
+        self.assertLessEqual(len(pool), 2)
+        pool.close()
+
+    def test_client_cache(self):
+        cached = Pydis(path=self.path, client_cache=2)
+        c = self.client
+        c.mset({'k1': 1, 'k2': 2})
+        self.assertEqual(cached.get('k1'), 1)
+        self.assertEqual(cached.mget(['k1', 'k2', 'k3']), [1, 2, None])
+        self.assertEqual(cached.client_cache.hits, 1)
+        self.assertEqual(len(cached.client_cache), 2)  # 超出容量时丢弃 k1
+        c.set('k2', 'new')
+        self.assertEqual(cached.get('k2'), 'new')
+        cached.set('k2', 'own')
+        self.assertEqual(cached.get('k2'), 'own')  # 读到自己写入的值
+        hits = cached.client_cache.hits
+        self.assertEqual(cached.get('k2'), 'own')
+        self.assertEqual(cached.client_cache.hits, hits + 1)
+        c.flushdb()
+        self.assertIsNone(cached.get('k2'))
+        info = c.info()
+        self.assertEqual(info['server']['tracking_clients'], 1)
+        cached.close()
+        with self.assertRaises(ValueError):
+            Pydis(connection_pool=ConnectionPool(path=self.path), client_cache=10)
+
+    def test_connection(self):
+        conn = connect(self.path)
+        with self.assertRaises(ReceiveTimeout):
+            conn.recv(block=False)
+        with self.assertRaises(ReceiveTimeout):
+            conn.recv(timeout=0.05)
+        rid = conn.send_request((3, 1, (('missing',), {})))
+        self.assertEqual(conn.recv_response(rid), (10, None))
+        conn.close()
+        self.assertIs(conn.closed, True)
+        with self.assertRaises(ConnectionClosedError):
+            conn.send_request((3, 1, (('missing',), {})))
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+from unittest import TestCase
+
+from pydis.multiprocessing.codec import MARSHAL, PICKLE, FrameDecoder, encode
+
+
+class TestCodec(TestCase):
+    def test_codec(self):
+        msg = (1, 3, 2, (('key', {'a': [1, 2.5, None, b'x']}), {'ex': 10}))
+        self.assertEqual(encode(msg)[4], MARSHAL)
+        self.assertEqual(FrameDecoder().feed(encode(msg)), [msg])
+        for msg in ((1, 11, ValueError('ops')), (1, 3, 2, (('key', 1, timedelta(1)), {}))):
+            data = encode(msg)
+            self.assertEqual(data[4], PICKLE)
+            self.assertEqual(repr(FrameDecoder().feed(data)), repr([msg]))
+
+    def test_incremental(self):
+        msgs = [(i, 'x' * i) for i in range(100)]
+        data = b''.join(map(encode, msgs))
+        decoder, ret = FrameDecoder(), []
+        for i in range(0, len(data), 7):
+            ret.extend(decoder.feed(data[i:i + 7]))
+        self.assertEqual(ret, msgs)
+        self.assertEqual(len(decoder), 0)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            FrameDecoder().feed(b'\x00\x00\x00\x00\x09')
+        with self.assertRaises(ValueError):
+            FrameDecoder().feed(b'\xff\xff\xff\xff\x00')
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+import os
+import socket
+import tempfile
+from unittest import TestCase
+
+from pydis.exceptions import OutOfMemoryError
+from pydis.multiprocessing import start_server
+from pydis.multiprocessing.resp import RespParser, encode, error
+
+
+def command(*args):
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        arg = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+class TestRespParser(TestCase):
+    def test_feed(self):
+        parser = RespParser()
+        data = command('SET', 'key', 'val') + command('GET', 'key')
+        self.assertEqual(parser.feed(data), [[b'SET', b'key', b'val'], [b'GET', b'key']])
+        self.assertEqual(len(parser), 0)
+
+    def test_partial(self):
+        parser = RespParser()
+        set_cmd = command('SET', 'key', b'x' * 1000)
+        data = set_cmd + command('PING')
+        commands = []
+        for i in range(len(data)):
+            commands += parser.feed(data[i:i + 1])
+            if i == len(set_cmd) - 2:
+                self.assertEqual(commands, [])
+        self.assertEqual(commands, [[b'SET', b'key', b'x' * 1000], [b'PING']])
+        self.assertEqual(len(parser), 0)
+
+    def test_binary(self):
+        parser = RespParser()
+        value = b'\r\n\x00*$'
+        self.assertEqual(parser.feed(command('SET', 'k', value)), [[b'SET', b'k', value]])
+
+    def test_inline(self):
+        parser = RespParser()
+        self.assertEqual(parser.feed(b'PING\r\nECHO  hi\n\r\n'), [[b'PING'], [b'ECHO', b'hi']])
+        self.assertEqual(parser.feed(b'*0\r\n*-1\r\n'), [])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            RespParser().feed(b'*1\r\n+OK\r\n')
+        with self.assertRaises(ValueError):
+            RespParser().feed(b'*1\r\n$-2\r\n')
+        with self.assertRaises(ValueError):
+            RespParser().feed(b'*x\r\n')
+
+
+class TestEncode(TestCase):
+    def test_resp2(self):
+        self.assertEqual(encode(None), b'$-1\r\n')
+        self.assertEqual(encode(b'val'), b'$3\r\nval\r\n')
+        self.assertEqual(encode('键'), b'$3\r\n\xe9\x94\xae\r\n')
+        self.assertEqual(encode(True), b':1\r\n')
+        self.assertEqual(encode(-3), b':-3\r\n')
+        self.assertEqual(encode([b'a', 1]), b'*2\r\n$1\r\na\r\n:1\r\n')
+        self.assertEqual(encode({'k': 1}), b'*2\r\n$1\r\nk\r\n:1\r\n')
+
+    def test_resp3(self):
+        self.assertEqual(encode(None, True), b'_\r\n')
+        self.assertEqual(encode(False, True), b'#f\r\n')
+        self.assertEqual(encode(1.5, True), b',1.5\r\n')
+        self.assertEqual(encode({'k': None}, True), b'%1\r\n$1\r\nk\r\n_\r\n')
+
+    def test_error(self):
+        self.assertEqual(error(ValueError('bad\nvalue')), b'-ERR bad value\r\n')
+        self.assertTrue(error(OutOfMemoryError('full')).startswith(b'-OOM '))
+
+
+class TestRespServer(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, 'pydis.sock')
+        cls.resp_path = os.path.join(cls.tmp.name, 'resp.sock')
+        cls.process = start_server(cls.path, resp=cls.resp_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.process.terminate()
+        cls.process.join()
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(5)
+        self.sock.connect(self.resp_path)
+        self.call('FLUSHDB')
+
+    def tearDown(self):
+        self.sock.close()
+
+    def call(self, *args):
+        return self.pipeline([args])
+
+    def pipeline(self, commands):
+        self.sock.sendall(b''.join(command(*args) for args in commands))
+        return self.read_replies(len(commands))
+
+    def read_replies(self, n):
+        data = b''
+        while True:
+            chunk = self.sock.recv(65536)
+            self.assertTrue(chunk, 'connection closed')
+            data += chunk
+            try:
+                replies = self.parse(data, n)
+            except IndexError:  # 数据不完整
+                continue
+            return replies[0] if n == 1 else replies
+
+    def parse(self, data, n):
+        replies, pos = [], 0
+        for _ in range(n):
+            reply, pos = self.parse_one(data, pos)
+            replies.append(reply)
+        return replies
+
+    def parse_one(self, data, pos):
+        eol = data.find(b'\r\n', pos)
+        if eol < 0:
+            raise IndexError
+        kind, line = data[pos:pos + 1], data[pos + 1:eol]
+        pos = eol + 2
+        if kind in b'+-':
+            return kind + line, pos
+        if kind == b':':
+            return int(line), pos
+        if kind == b'_':
+            return None, pos
+        if kind == b'$':
+            length = int(line)
+            if length < 0:
+                return None, pos
+            if len(data) < pos + length + 2:
+                raise IndexError
+            return data[pos:pos + length], pos + length + 2
+        if kind in b'*%':
+            items = []
+            for _ in range(int(line) * (2 if kind == b'%' else 1)):
+                item, pos = self.parse_one(data, pos)
+                items.append(item)
+            return items, pos
+        raise AssertionError('unexpected reply %r' % data[pos:])
+
+    def test_commands(self):
+        self.assertEqual(self.call('PING'), b'+PONG')
+        self.assertEqual(self.call('SET', 'key', 'val'), b'+OK')
+        self.assertEqual(self.call('GET', 'key'), b'val')
+        self.assertIsNone(self.call('GET', 'missing'))
+        self.assertEqual(self.call('SET', 'key', 'other', 'NX'), None)
+        self.assertEqual(self.call('MSET', 'k1', '10', 'k2', 'v2'), b'+OK')
+        self.assertEqual(self.call('MGET', 'k1', 'k2', 'k3'), [b'10', b'v2', None])
+        self.assertEqual(self.call('INCR', 'k1'), 11)
+        self.assertEqual(self.call('DECRBY', 'k1', 5), 6)
+        self.assertEqual(self.call('GET', 'k1'), b'6')
+        self.assertEqual(self.call('TTL', 'key'), -1)
+        self.assertEqual(self.call('EXPIRE', 'key', 100), 1)
+        self.assertTrue(0 < self.call('TTL', 'key') <= 100)
+        self.assertEqual(self.call('EXISTS', 'k1', 'k2', 'k3'), 2)
+        self.assertEqual(sorted(self.call('KEYS', 'k?')), [b'k1', b'k2'])
+        self.assertEqual(self.call('DEL', 'k1', 'k3'), 1)
+        self.assertEqual(self.call('DBSIZE'), 2)
+        self.assertEqual(self.call('FLUSHDB', 'ASYNC'), b'+OK')
+        self.assertEqual(self.call('DBSIZE'), 0)
+
+    def test_set_options(self):
+        self.assertEqual(self.call('SET', 'key', 'val', 'PX', 1500), b'+OK')
+        self.assertTrue(0 <= self.call('TTL', 'key') <= 2)
+        self.assertEqual(self.call('SET', 'key', 'val', 'EX', 0)[:4], b'-ERR')
+        self.assertEqual(self.call('SET', 'key', 'val', 'XY')[:4], b'-ERR')
+        for option in ('XX', 'GET', 'KEEPTTL'):
+            self.assertEqual(
+                self.call('SET', 'key', 'val', option),
+                b"-ERR unsupported option '%s' in 'set' command" % option.encode())
+
+    def test_errors(self):
+        self.assertTrue(self.call('NOSUCH', 'a').startswith(b"-ERR unknown command 'NOSUCH'"))
+        self.assertEqual(
+            self.call('GET'), b"-ERR wrong number of arguments for 'get' command")
+        self.assertEqual(self.call('SET', 'key', 'val'), b'+OK')
+        self.assertTrue(self.call('INCR', 'key').startswith(b'-ERR'))  # 服务线程中引发的异常
+        self.assertEqual(self.call('PING'), b'+PONG')
+
+    def test_pipeline(self):
+        commands = [('SET', 'key%d' % i, i) for i in range(1000)]
+        commands += [('NOSUCH',), ('INCR', 'key1'), ('GET', 'key999')]
+        replies = self.pipeline(commands)
+        self.assertEqual(replies[:1000], [b'+OK'] * 1000)
+        self.assertTrue(replies[1000].startswith(b'-ERR'))
+        self.assertEqual(replies[1001:], [2, b'999'])
+
+    def test_hello(self):
+        reply = self.call('HELLO', 3)
+        self.assertEqual(reply[reply.index(b'proto') + 1], 3)
+        self.assertIsNone(self.call('GET', 'missing'))
+        self.sock.sendall(command('GET', 'missing'))
+        self.assertEqual(self.sock.recv(16), b'_\r\n')
+        self.assertTrue(self.call('HELLO', 4).startswith(b'-NOPROTO'))
+
+    def test_quit(self):
+        self.sock.sendall(command('QUIT') + command('PING'))
+        self.assertEqual(self.read_replies(1), b'+OK')
+        self.assertEqual(self.sock.recv(16), b'')
+
+    def test_quit_flush(self):
+        value = b'x' * (1 << 21)
+        self.assertEqual(self.call('SET', 'key', value), b'+OK')
+        # 响应比套接字的缓冲区大，QUIT 的 +OK 也要在它之后完整写出
+        self.sock.sendall(command('GET', 'key') + command('QUIT'))
+        self.assertEqual(self.read_replies(2), [value, b'+OK'])
+        self.assertEqual(self.sock.recv(16), b'')
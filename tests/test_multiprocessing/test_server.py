@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import os
+import socket
+import tempfile
+from unittest import TestCase
+
+from pydis.exceptions import ConnectionClosedError
+from pydis.multiprocessing import Pydis, start_server
+from pydis.multiprocessing.codec import FrameDecoder, encode
+from pydis.multiprocessing.server import OUTPUT_HIGH_WATER, Peer
+
+
+class TestPeer(TestCase):
+    def test_recv_send(self):
+        a, b = socket.socketpair()
+        peer = Peer(a, 1)
+        self.assertEqual(peer.recv_many(10), [])
+        b.sendall(b''.join(encode((i, 3, 1, (('key',), {}))) for i in range(5)))
+        self.assertEqual([m[0] for m in peer.recv_many(3)], [0, 1, 2])
+        self.assertIs(peer.pending, True)
+        self.assertEqual([m[0] for m in peer.recv_many(3)], [3, 4])
+        peer.send((0, 10, None))
+        peer.send((1, 10, 'val'))
+        self.assertIs(peer.flush(), True)
+        self.assertEqual(FrameDecoder().feed(b.recv(4096)), [(0, 10, None), (1, 10, 'val')])
+        b.close()
+        with self.assertRaises(ConnectionClosedError):
+            peer.recv_many(10)
+        self.assertIs(peer.eof, True)
+        peer.close()
+
+    def test_throttled(self):
+        a, b = socket.socketpair()
+        peer = Peer(a, 1)
+        value = b'x' * OUTPUT_HIGH_WATER
+        peer.send((0, 10, value))
+        self.assertIs(peer.throttled, True)
+        self.assertIs(peer.flush(), False)  # 套接字的缓冲区写满
+        decoder, replies = FrameDecoder(), []
+        while not replies:
+            replies += decoder.feed(b.recv(1 << 16))
+            peer.flush()
+        self.assertEqual(replies, [(0, 10, value)])
+        self.assertIs(peer.throttled, False)
+        peer.close()
+        b.close()
+
+    def test_invalid_data(self):
+        a, b = socket.socketpair()
+        peer = Peer(a, 1)
+        b.sendall(b'\xff\xff\xff\xff\x00')
+        with self.assertRaises(ConnectionClosedError):
+            peer.recv_many(10)
+        self.assertIs(peer.closed, True)
+        b.close()
+
+
+class TestServer(TestCase):
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'pydis.sock')
+            snapshot = os.path.join(tmp, 'dump.pydis')
+            process = start_server(path, snapshot=snapshot)
+            client = Pydis(path=path)
+            client.mset({'key%d' % i: i for i in range(100)})
+            client.close()
+            process.terminate()  # 退出前保存快照
+            process.join()
+            self.assertFalse(os.path.exists(path))
+            self.assertTrue(os.path.exists(snapshot))
+            process = start_server(path, snapshot=snapshot)
+            client = Pydis(path=path)
+            self.assertEqual(client.get('key42'), 42)
+            self.assertEqual(len(client.keys()), 100)
+            client.close()
+            process.terminate()
+            process.join()
+
+    def test_half_close(self):
+        from pydis.multithreading.commands import OPCODES
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'pydis.sock')
+            process = start_server(path)
+            value = 'x' * (2 * OUTPUT_HIGH_WATER)
+            client = Pydis(path=path)
+            client.set('key', value)
+            client.close()
+            # 对端关闭写方向后，已经收到的请求的响应仍然全部写出
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(5)
+            sock.connect(path)
+            sock.sendall(b''.join(
+                encode((i, 3, OPCODES['get'], (('key',), {}))) for i in range(1, 4)))
+            sock.shutdown(socket.SHUT_WR)
+            decoder, replies = FrameDecoder(), []
+            while True:
+                data = sock.recv(1 << 16)
+                if not data:
+                    break
+                replies += decoder.feed(data)
+            sock.close()
+            self.assertEqual(replies, [(i, 10, value) for i in range(1, 4)])
+            process.terminate()
+            process.join()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+from datetime import timedelta
+from threading import Event
+from time import time
+from unittest import TestCase
+
+from pydis.exceptions import AofError
+from pydis.multithreading.aof import (RESTORE, AppendOnlyFile, _shift,
+                                      read_records, replay)
+from pydis.value import Value
+
+
+class TestAof(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'appendonly.aof')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def records(self):
+        with open(self.path, 'rb') as f:
+            return list(read_records(f))
+
+    def test_shift(self):
+        self.assertEqual(_shift('set', ('k', 'v', 10), {}, 100), (('k', 'v', 110), {}))
+        self.assertEqual(_shift('set', ('k', 'v'), {'ex': timedelta(seconds=1)}, 100),
+                         (('k', 'v'), {'ex': 101.0}))
+        self.assertEqual(_shift('set', ('k', 'v', None), {}, 100), (('k', 'v', None), {}))
+        self.assertEqual(_shift('expire', ('k', 5), {}, 1), (('k', 6), {}))
+        self.assertEqual(_shift('delete', ('k',), {}, 1), (('k',), {}))
+
+    def test_append(self):
+        for policy in ('always', 'everysec', 'no'):
+            aof = AppendOnlyFile(self.path, policy)
+            aof.append('set', ('key', policy, 10), {})
+            aof.close()
+        records = self.records()
+        self.assertEqual([r[1][1] for r in records], ['always', 'everysec', 'no'])
+        self.assertAlmostEqual(records[0][1][2], time() + 10, delta=1)
+
+    def test_replay(self):
+        aof = AppendOnlyFile(self.path)
+        aof.append('set', ('key', 'val'), {'ex': 100})
+        aof.append('incr', ('counter',), {})
+        aof.append('expire', ('counter', 0), {})
+        self.assertIs(aof.flush(), True)
+        aof.close()
+        calls = []
+        with open(self.path, 'rb') as f:
+            count = replay(f, lambda *call: calls.append(call), None)  # type: ignore
+        self.assertEqual(count, 3)
+        self.assertEqual(calls[1], ('incr', ('counter',), {}))
+        self.assertTrue(99 < calls[0][2]['ex'] <= 100)
+        self.assertLessEqual(calls[2][1][1], 0)  # 重放时已经失效
+
+    def test_truncated_and_corrupted(self):
+        aof = AppendOnlyFile(self.path)
+        aof.append('set', ('key1', 'val'), {})
+        aof.append('set', ('key2', 'val'), {})
+        aof.close()
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(data[:-3])
+        self.assertEqual(len(self.records()), 1)
+        corrupted = bytearray(data)
+        corrupted[-3] ^= 0xFF
+        with open(self.path, 'wb') as f:
+            f.write(bytes(corrupted))
+        with self.assertRaises(AofError):
+            self.records()
+        with open(self.path, 'wb') as f:
+            f.write(b'NOTPYDIS\x01\x00')
+        with self.assertRaises(AofError):
+            self.records()
+
+    def test_rewrite(self):
+        aof = AppendOnlyFile(self.path)
+        for i in range(100):
+            aof.append('incr', ('counter',), {})
+        done = Event()
+        aof.rewrite([('counter', Value(100, None))], done.set)
+        aof.append('incr', ('counter',), {})  # 重写期间的写入
+        self.assertIs(done.wait(1), True)
+        aof.append('incr', ('counter',), {})
+        aof.close()
+        self.assertEqual(aof.last_rewrite_status, 'ok')
+        records = self.records()
+        self.assertEqual(records[0], (RESTORE, ([('counter', 100, float('inf'))],), {}))
+        self.assertEqual(records[1:], [('incr', ('counter',), {})] * 2)
@@ -40,12 +40,15 @@ class TestClient(TestCase):
 class TestFunction(TestCase):
     def test_make_message(self):
         from pydis.multithreading.client import make_message
+        from pydis.multithreading.commands import OPCODES
         from pydis.multithreading.message import message
         fake_arg, fake_kwargs = 'fake_arg', {'fake_kw1': 'fake_val1', 'fake_kw2': 'fake_val2'}
-        msg = make_message(message.CALL, 'fake_call')
-        self.assertEqual(msg, (message.CALL, 'fake_call', (tuple(), {})))
-        msg = make_message(message.CALL, 'fake_call', fake_arg, **fake_kwargs)
-        self.assertEqual(msg, (message.CALL, 'fake_call', ((fake_arg,), fake_kwargs)))
+        msg = make_message(message.CALL, 'keys')
+        self.assertEqual(msg, (message.CALL, OPCODES['keys'], (tuple(), {})))
+        msg = make_message(message.CALL, 'get', fake_arg, **fake_kwargs)
+        self.assertEqual(msg, (message.CALL, OPCODES['get'], ((fake_arg,), fake_kwargs)))
+        with self.assertRaises(KeyError):
+            make_message(message.CALL, 'fake_call')
 
     def test_general_response_handler(self):
         from pydis.multithreading.client import general_response_handler
@@ -70,9 +73,150 @@ class TestPydisClient(TestCase):
 
     @mock.patch.object(PydisClient, 'execute_command')
     def test_set_arguments(self, execute_command):
+        from pydis.multithreading.commands import OPCODES
         from pydis.multithreading.message import message
         p = PydisClient()
         execute_command.return_value = (message.RETURN, True)
         p.set('fake_key', 'fake_val', 1)
-        msg = (message.CALL, 'set', (('fake_key', 'fake_val'), {'ex': 1}))
+        msg = (message.CALL, OPCODES['set'], (('fake_key', 'fake_val'), {'ex': 1}))
         execute_command.assert_called_with(msg, True, None)
+
+    def test_pipeline(self):
+        from pydis.multithreading.commands import COMMANDS_BY_OPCODE
+        from pydis.multithreading.message import message
+        p = PydisClient()
+        with p.pipeline() as pipe:
+            self.assertIs(pipe.set('key', 'val'), pipe)
+            pipe.incr('counter').get('key')
+            self.assertEqual(len(pipe), 3)
+            results = [
+                (message.RETURN, True),
+                (message.RETURN, 1),
+                (message.RETURN, 'val'),
+            ]
+            with mock.patch.object(p, 'execute_command',
+                                   return_value=(message.RETURN, results)) as execute_command:
+                self.assertEqual(pipe.execute(), [True, 1, 'val'])
+            kind, name, msgs = execute_command.call_args[0][0]
+            self.assertEqual(kind, message.PIPELINE)
+            self.assertEqual([COMMANDS_BY_OPCODE[m[1]].name for m in msgs],
+                             ['set', 'incr', 'get'])
+            self.assertEqual(len(pipe), 0)
+            self.assertEqual(pipe.execute(), [])
+
+    def test_pipeline_error(self):
+        from pydis.multithreading.message import message
+        p = PydisClient()
+        pipe = p.pipeline()
+        pipe.get('key').incr('key')
+        error = ValueError('ops')
+        results = [(message.RETURN, 'val'), (message.ERROR, error)]
+        with mock.patch.object(p, 'execute_command', return_value=(message.RETURN, results)):
+            with self.assertRaises(ValueError):
+                pipe.execute()
+            pipe.get('key').incr('key')
+            self.assertEqual(pipe.execute(raise_on_error=False), ['val', error])
+
+    def _route_to_server(self, p):
+        # 不启动服务线程，直接在当前线程中执行命令
+        from pydis.multithreading.server import Server
+        Server._Singleton__instance = None  # type: ignore
+        server = Server()
+        p.execute_command = lambda msg, block=True, timeout=None: server.execute(msg)
+        return server
+
+    def test_watch(self):
+        from pydis.exceptions import WatchError
+        p = PydisClient()
+        server = self._route_to_server(p)
+        p.set('key', 1)
+        with p.pipeline() as pipe:
+            pipe.watch('key')
+            self.assertIs(pipe.watching, True)
+            self.assertEqual(pipe.get('key'), 1)  # 监视状态下立即执行
+            pipe.multi()
+            self.assertIs(pipe.set('key', 2), pipe)
+            server.set('key', 3)  # 其他连接修改了被监视的键
+            with self.assertRaises(WatchError):
+                pipe.execute()
+            self.assertIs(pipe.watching, False)
+        self.assertEqual(p.get('key'), 3)
+        server.flushdb()
+
+    def test_watch_missing(self):
+        from pydis.exceptions import WatchError
+        p = PydisClient()
+        server = self._route_to_server(p)
+        with p.pipeline() as pipe:
+            pipe.watch('key')
+            pipe.multi()
+            pipe.set('key', 1)
+            server.set('key', 2)
+            server.delete('key')  # 被监视的键被存入后又删除
+            with self.assertRaises(WatchError):
+                pipe.execute()
+        self.assertIsNone(p.get('key'))
+        server.flushdb()
+
+    def test_multi_errors(self):
+        p = PydisClient()
+        self._route_to_server(p)
+        pipe = p.pipeline(transaction=True)
+        pipe.multi()
+        with self.assertRaises(RuntimeError):
+            pipe.multi()
+        with self.assertRaises(RuntimeError):
+            pipe.watch('key')
+        pipe.reset()
+        pipe.set('key', 'val')
+        with self.assertRaises(RuntimeError):
+            pipe.multi()
+        self.assertEqual(pipe.execute(), [True])
+
+    def test_transaction(self):
+        p = PydisClient()
+        server = self._route_to_server(p)
+        p.set('key', 1)
+        calls = []
+
+        def incr_by_two(pipe):
+            value = pipe.get('key')
+            if not calls:
+                server.set('key', 10)  # 第一次执行时制造冲突
+            calls.append(value)
+            pipe.multi()
+            pipe.set('key', value + 2)
+        self.assertEqual(p.transaction(incr_by_two, 'key'), [True])
+        self.assertEqual(calls, [1, 10])
+        self.assertEqual(p.get('key'), 12)
+        server.flushdb()
+
+    def test_scan_iter(self):
+        p = PydisClient()
+        self._route_to_server(p)
+        p.mset({'key%d' % i: i for i in range(25)})
+        cursor, keys = p.scan(count=10)
+        self.assertNotEqual(cursor, 0)
+        self.assertEqual(len(keys), 10)
+        self.assertEqual(sorted(p.scan_iter(match='key2*')),
+                         ['key2'] + ['key%d' % i for i in range(20, 25)])
+
+    def test_fcall(self):
+        p = PydisClient()
+        server = self._route_to_server(p)
+
+        def incr_if_exists(server, key, amount=1):
+            if server.exists(key):
+                return server.incr(key, amount)
+            return None
+        digest = p.function_load(incr_if_exists)
+        self.assertEqual(p.function_list()[0]['digest'], digest)
+        self.assertIsNone(p.fcall('incr_if_exists', 'key'))
+        p.set('key', 1)
+        self.assertEqual(p.fcall('incr_if_exists', 'key', amount=2), 3)
+        self.assertEqual(p.evalsha(digest, 'key'), 4)
+        with self.assertRaises(ValueError):
+            p.fcall_ro('incr_if_exists', 'key')
+        self.assertIs(p.function_delete('incr_if_exists'), True)
+        server.flushdb()
+
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+from pydis.multithreading.commands import (COMMANDS, COMMANDS_BY_OPCODE,
+                                           OPCODES)
+from pydis.multithreading.server import Server
+
+
+class TestCommands(TestCase):
+    def test_table(self):
+        self.assertEqual(len(COMMANDS_BY_OPCODE), len(COMMANDS))
+        self.assertEqual(len(OPCODES), len(COMMANDS))
+        for command in COMMANDS:
+            self.assertTrue(hasattr(Server, command.name), command.name)
+            self.assertIsInstance(command.opcode, int)
+
+    def test_flags(self):
+        get = COMMANDS_BY_OPCODE[OPCODES['get']]
+        self.assertIs(get.readonly, True)
+        self.assertIs(get.write, False)
+        self.assertIs(COMMANDS_BY_OPCODE[OPCODES['incr']].write, True)
+
+    def test_check_arity(self):
+        get = COMMANDS_BY_OPCODE[OPCODES['get']]
+        self.assertIs(get.check_arity(1), True)
+        self.assertIs(get.check_arity(2), False)
+        delete = COMMANDS_BY_OPCODE[OPCODES['delete']]
+        self.assertIs(delete.check_arity(0), False)
+        self.assertIs(delete.check_arity(3), True)
+
+    def test_get_keys(self):
+        def keys(name, *args):
+            return COMMANDS_BY_OPCODE[OPCODES[name]].get_keys(args)
+        self.assertEqual(keys('set', 'key', 'val', 10), ['key'])
+        self.assertEqual(keys('delete', 'k1', 'k2', 'k3'), ['k1', 'k2', 'k3'])
+        self.assertEqual(keys('mget', ['k1', 'k2']), ['k1', 'k2'])
+        self.assertEqual(keys('mset', {'k1': 1, 'k2': 2}), ['k1', 'k2'])
+        self.assertEqual(keys('keys'), [])
+        self.assertEqual(keys('fcall', 'func', 'key'), [])
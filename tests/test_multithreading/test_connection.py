@@ -38,6 +38,69 @@ class TestConnection(TestCase):
             close_signal.set()
             conn1.recv()
 
+    def test_coalesced_wakeups(self):
+        import socket
+        conn1, conn2 = open_connection()
+        for i in range(10):
+            conn1.send(i)  # type: ignore
+        # 只有队列由空变为非空时写入唤醒字节
+        self.assertEqual(conn2._socket.recv(4096, socket.MSG_PEEK), b'x')
+        self.assertEqual(conn2.recv_many(4), [0, 1, 2, 3])
+        self.assertIs(conn2.pending, True)
+        self.assertEqual(conn2.recv_many(10), [4, 5, 6, 7, 8, 9])
+        self.assertIs(conn2.pending, False)
+        self.assertEqual(conn2.recv_many(10), [])
+        conn1.send('again')  # type: ignore
+        self.assertEqual(conn2.recv(), 'again')
+
+    def test_recv_many_closed(self):
+        conn1, conn2 = open_connection()
+        conn1.send('data')  # type: ignore
+        conn1.close()
+        with self.assertRaises(ConnectionClosedError):
+            conn2.recv_many(10)
+
+    def test_request_response(self):
+        conn1, conn2 = open_connection()
+        rid1 = conn1.send_request(('#TEST', 'a', None))  # type: ignore
+        rid2 = conn1.send_request(('#TEST', 'b', None))  # type: ignore
+        self.assertNotEqual(rid1, rid2)
+        reqs = conn2.recv_many(10)
+        self.assertEqual([req[0] for req in reqs], [rid1, rid2])
+        # 乱序返回
+        conn2.send((rid2, '#RET', 'b'))  # type: ignore
+        conn2.send((rid1, '#RET', 'a'))  # type: ignore
+        self.assertEqual(conn1.recv_response(rid1), ('#RET', 'a'))
+        self.assertEqual(conn1.recv_response(rid2), ('#RET', 'b'))
+
+    def test_stale_response_dropped(self):
+        conn1, conn2 = open_connection()
+        rid1 = conn1.send_request(('#TEST', 'a', None))  # type: ignore
+        with self.assertRaises(ReceiveTimeout):
+            conn1.recv_response(rid1, timeout=.01)
+        rid2 = conn1.send_request(('#TEST', 'b', None))  # type: ignore
+        conn2.send((rid1, '#RET', 'a'))  # type: ignore
+        conn2.send((rid2, '#RET', 'b'))  # type: ignore
+        self.assertEqual(conn1.recv_response(rid2), ('#RET', 'b'))
+        self.assertEqual(conn1._replies, {})
+        with self.assertRaises(ReceiveTimeout):
+            conn1.recv(block=False)
+
+    def test_invalidate_push(self):
+        from pydis.multithreading.message import message
+        client, server = open_connection()
+        pushed = []
+        client.on_invalidate = pushed.append
+        client.poll()  # 没有消息时立即返回
+        rid = client.send_request((message.CALL, 1, (('key',), {})))
+        server.send((0, message.INVALIDATE, ['k1']))
+        server.send((rid, message.RETURN, 'val'))
+        server.send((0, message.INVALIDATE, None))
+        self.assertEqual(client.recv_response(rid, timeout=1), (message.RETURN, 'val'))
+        self.assertEqual(pushed, [['k1']])
+        client.poll()
+        self.assertEqual(pushed, [['k1'], None])
+
     def test_close(self):
         conn1, conn2 = open_connection()
         conn1.close()
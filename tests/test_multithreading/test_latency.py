@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import time
+from threading import get_ident
+from unittest import TestCase
+
+from pydis.multithreading.latency import (EVENT_LOOP, EXPIRE_CYCLE,
+                                          LatencyMonitor, Watchdog)
+
+
+class TestLatencyMonitor(TestCase):
+    def test_threshold(self):
+        monitor = LatencyMonitor()
+        monitor.add(EVENT_LOOP, 1)
+        self.assertEqual(monitor.latest(), {})  # 阈值为 0 时不记录
+        monitor.threshold = 10
+        monitor.add(EVENT_LOOP, 0.005)
+        self.assertEqual(monitor.latest(), {})
+        monitor.add(EVENT_LOOP, 0.02)
+        monitor.add(EVENT_LOOP, 0.05)  # 同一秒内只保留最大的样本
+        monitor.add(EVENT_LOOP, 0.03)
+        latest = monitor.latest()[EVENT_LOOP]
+        self.assertEqual((latest['latest'], latest['max']), (50, 50))
+        self.assertEqual([l for _, l in monitor.history(EVENT_LOOP)], [50])
+        self.assertEqual(monitor.history(EXPIRE_CYCLE), [])
+
+    def test_reset(self):
+        monitor = LatencyMonitor(1)
+        monitor.add(EVENT_LOOP, 0.01)
+        monitor.add(EXPIRE_CYCLE, 0.01)
+        self.assertEqual(monitor.reset(EXPIRE_CYCLE, 'fake'), 1)
+        self.assertEqual(list(monitor.latest()), [EVENT_LOOP])
+        self.assertEqual(monitor.reset(), 1)
+        self.assertEqual(monitor.latest(), {})
+
+
+class TestWatchdog(TestCase):
+    def test_stall(self):
+        busy = [None]
+        ident = get_ident()
+        watchdog = Watchdog(lambda: busy[0], lambda: ident, 0.02)
+        try:
+            time.sleep(0.05)
+            self.assertEqual(watchdog.stalls, 0)
+            with self.assertLogs('pydis.multithreading.latency', 'WARNING'):
+                busy[0] = time.perf_counter()
+                time.sleep(0.1)  # 模拟服务线程停顿
+            self.assertEqual(watchdog.stalls, 1)  # 同一轮循环只报告一次
+            self.assertIn('test_stall', watchdog.last_stack)
+        finally:
+            watchdog.stop()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+from pydis.multithreading.nearcache import MISSING, NearCache
+
+
+class TestNearCache(TestCase):
+    def test_get_put(self):
+        cache = NearCache(2)
+        self.assertIs(cache.get('k1'), MISSING)
+        cache.put('k1', None)  # 不存在的键同样可以缓存
+        self.assertIsNone(cache.get('k1'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru(self):
+        cache = NearCache(2)
+        cache.put('k1', 1)
+        cache.put('k2', 2)
+        cache.get('k1')
+        cache.put('k3', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn('k2', cache)
+        self.assertIn('k1', cache)
+
+    def test_invalidate(self):
+        cache = NearCache(10)
+        for i in range(3):
+            cache.put('k%d' % i, i)
+        cache.invalidate(['k0', 'k1', 'missing'])
+        self.assertEqual(len(cache), 1)
+        cache.invalidate(None)
+        self.assertEqual(len(cache), 0)
+
+    def test_maxsize(self):
+        with self.assertRaises(ValueError):
+            NearCache(0)
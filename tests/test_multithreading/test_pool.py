@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+from threading import Lock, Thread
+from unittest import TestCase
+
+from pydis.exceptions import ConnectionClosedError, PoolTimeout
+from pydis.multithreading.client import PydisClient
+from pydis.multithreading.connection import open_connection
+from pydis.multithreading.pool import ConnectionPool
+from pydis.multithreading.server import Server
+
+
+class FakeServer:
+    '''每个连接一个后台线程，用 Server.execute 处理请求'''
+
+    def __init__(self) -> None:
+        self.peers = []
+        self.lock = Lock()
+
+    def connect(self):
+        conn, peer = open_connection()
+        self.peers.append(peer)
+        Thread(target=self.serve, args=(peer,), daemon=True).start()
+        return conn
+
+    def serve(self, conn):
+        while True:
+            try:
+                msg = conn.recv()
+            except ConnectionClosedError:
+                return
+            with self.lock:
+                resp = Server().execute(msg[1:])
+            conn.send((msg[0], *resp))
+
+
+class TestConnectionPool(TestCase):
+    def setUp(self):
+        Server._Singleton__instance = None  # type: ignore
+        self.server = FakeServer()
+
+    def test_bounded(self):
+        pool = ConnectionPool(2, connection_factory=self.server.connect)
+        c1 = pool.get_connection()
+        c2 = pool.get_connection()
+        self.assertIsNot(c1, c2)
+        with self.assertRaises(PoolTimeout):
+            pool.get_connection(timeout=0.01)
+        pool.release(c1)
+        self.assertIs(pool.get_connection(timeout=0.01), c1)
+        self.assertEqual(len(pool), 2)
+
+    def test_wait_for_release(self):
+        pool = ConnectionPool(1, connection_factory=self.server.connect)
+        conn = pool.get_connection()
+        t = Thread(target=lambda: pool.release(conn))
+        t.start()
+        self.assertIs(pool.get_connection(timeout=1), conn)
+        t.join()
+
+    def test_thread_affinity(self):
+        pool = ConnectionPool(2, connection_factory=self.server.connect)
+        c1 = pool.get_connection()
+        c2 = pool.get_connection()
+        pool.release(c1)
+        pool.release(c2)
+        self.assertIs(pool.get_connection(), c2)  # 本线程最后取出的是 c2
+        got = []
+        t = Thread(target=lambda: got.append(pool.get_connection()))
+        t.start()
+        t.join()
+        self.assertEqual(got, [c1])
+
+    def test_health_check(self):
+        pool = ConnectionPool(1, connection_factory=self.server.connect)
+        with pool.connection() as conn:
+            pass
+        conn.close()
+        with pool.connection() as new_conn:
+            self.assertIsNot(new_conn, conn)
+            new_conn.close()
+        self.assertEqual(len(pool), 0)
+
+    def test_release_foreign(self):
+        pool = ConnectionPool(1, connection_factory=self.server.connect)
+        with self.assertRaises(ValueError):
+            pool.release(self.server.connect())
+
+    def test_close(self):
+        pool = ConnectionPool(2, connection_factory=self.server.connect)
+        idle = pool.get_connection()
+        busy = pool.get_connection()
+        pool.release(idle)
+        pool.close()
+        self.assertIs(idle.closed, True)
+        self.assertIs(busy.closed, False)
+        pool.release(busy)
+        self.assertIs(busy.closed, True)
+        with self.assertRaises(ConnectionClosedError):
+            pool.get_connection()
+
+    def test_shared_client(self):
+        pool = ConnectionPool(2, connection_factory=self.server.connect)
+        client = PydisClient(connection_pool=pool)
+
+        def incr():
+            for _ in range(100):
+                client.incr('counter')
+        threads = [Thread(target=incr) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(client.get('counter'), 400)
+        self.assertLessEqual(len(pool), 2)
+        client.close()
+        self.assertIs(pool.closed, False)
+        pool.close()
@@ -143,7 +143,7 @@ class TestServer(TestCase):
 
     @patch.object(Server, 'active_expire_cycle')
     @patch.object(Server, '_close_connections')
-    @patch('pydis.multithreading.server.select')
+    @patch.object(Server._selector, 'select')
     def test_server_forever_wait_for_conn(self, select, *mock_funcs):
         from time import time
         with patch.object(Server._stop_evt, 'is_set', Mock(side_effect=[False, True])):
@@ -211,140 +211,364 @@ class TestServer(TestCase):
         for mock_func in mock_funcs:
             mock_func.assert_called()
 
-    @patch('pydis.multithreading.server.getattr', create=True)
-    def test_handle_request_recv_exception_ReceiveTimeout(self, getattr):
+    def test_handle_request_recv_exception_ReceiveTimeout(self):
         from pydis.multithreading.connection import open_connection
         c, _ = open_connection()
-        Server().handle_request(c)
-        getattr.assert_not_called()
+        with patch.object(c, 'send') as send:
+            self.assertIs(Server().handle_request(c), False)
+            send.assert_not_called()
 
-    @patch('pydis.multithreading.server.getattr', side_effect=ValueError('ops'), create=True)
-    def test_handle_request_getattr_exception(self, getattr):
+    def _call(self, kind, opcode, value):
+        # 通过连接发送一条命令，返回服务的响应
         from pydis.multithreading.connection import open_connection
-        from pydis.multithreading.message import message
         c1, c2 = open_connection()
-        c1.send(('#test', 'fake', 'fake'))  # type: ignore
-        with patch.object(c2, 'send') as send:
-            Server().handle_request(c2)
-            getattr.assert_called()
-            send.assert_called()
-            call_args = send.call_args
-            args = call_args[0]  # ((message.ERROR, ValueError('ops'),)
-            kwargs = call_args[1]  # {}
-            self.assertTrue(args)
-            self.assertTrue(len(args) == 1)
-            self.assertFalse(kwargs)
-            kind, err = args[0]
-            self.assertEqual(kind, message.ERROR)
-            self.assertTrue(isinstance(err, ValueError))
-
-    # 本函数与上个流程一致，只是值有区别
-    @patch('pydis.multithreading.server.getattr', return_value=Mock(side_effect=ValueError('ops')), create=True)
-    def test_handle_request_kind_call_execute_exception(self, getattr):
-        from pydis.multithreading.connection import open_connection
+        c1.send((1, kind, opcode, value))
+        Server().handle_request(c2)
+        rid, kind, result = c1.recv(timeout=1)  # type: ignore
+        self.assertEqual(rid, 1)
+        return kind, result
+
+    def test_handle_request_return_ok(self):
+        from pydis.multithreading.commands import OPCODES
         from pydis.multithreading.message import message
-        c1, c2 = open_connection()
-        c1.send((message.CALL, 'fake', (('fake_arg',), {})))
-        with patch.object(c2, 'send') as send:
-            Server().handle_request(c2)
-            getattr.assert_called()
-            getattr.return_value.assert_called_with('fake_arg')
-            send.assert_called()
-            call_args = send.call_args
-            args = call_args[0]  # ((message.ERROR, ValueError('ops'),)
-            kwargs = call_args[1]  # {}
-            self.assertTrue(args)
-            self.assertTrue(len(args) == 1)
-            self.assertFalse(kwargs)
-            kind, err = args[0]
-            self.assertEqual(kind, message.ERROR)
-            self.assertTrue(isinstance(err, ValueError), f'err: {err}')
-
-    # 本函数与上个流程一致，只是值有区别
-    @patch('pydis.multithreading.server.getattr', return_value=Mock(return_value='ok'), create=True)
-    def test_handle_request_kind_call_return_ok(self, getattr):
-        from pydis.multithreading.connection import open_connection
+        kind, ret = self._call(message.CALL, OPCODES['set'], (('key', 'val'), {}))
+        self.assertEqual((kind, ret), (message.RETURN, True))
+        kind, ret = self._call(message.CALL, OPCODES['get'], (('key',), {}))
+        self.assertEqual((kind, ret), (message.RETURN, 'val'))
+        # 属性作为无参数的命令
+        kind, ret = self._call(message.CALL, OPCODES['empty'], ((), {}))
+        self.assertEqual((kind, ret), (message.RETURN, False))
+        Server().flushdb()
+
+    def test_handle_request_execute_exception(self):
+        from pydis.multithreading.commands import OPCODES
         from pydis.multithreading.message import message
-        c1, c2 = open_connection()
-        c1.send((message.CALL, 'fake', (('fake_arg',), {})))
-        with patch.object(c2, 'send') as send:
-            Server().handle_request(c2)
-            getattr.assert_called()
-            getattr.return_value.assert_called_with('fake_arg')
-            send.assert_called()
-            call_args = send.call_args
-            args = call_args[0]  # ((message.RETURN, 'ok'),)
-            kwargs = call_args[1]  # {}
-            self.assertTrue(args)
-            self.assertTrue(len(args) == 1)
-            self.assertFalse(kwargs)
-            kind, ret = args[0]
-            self.assertEqual(kind, message.RETURN)
-            self.assertEqual(ret, 'ok')
-
-    # 本函数与上个流程一致，只是值有区别
-    @patch('pydis.multithreading.server.getattr', return_value='ok', create=True)
-    def test_handle_request_kind_get_ok(self, getattr):
-        from pydis.multithreading.connection import open_connection
+        Server().set('key', 'val')
+        kind, err = self._call(message.CALL, OPCODES['incr'], (('key',), {}))
+        self.assertEqual(kind, message.ERROR)
+        self.assertTrue(isinstance(err, ValueError), f'err: {err}')
+        Server().flushdb()
+
+    def test_handle_request_unknown_command(self):
         from pydis.multithreading.message import message
-        c1, c2 = open_connection()
-        c1.send((message.GET, 'fake', (('fake_arg',), {})))
-        with patch.object(c2, 'send') as send:
-            Server().handle_request(c2)
-            getattr.assert_called()
-            send.assert_called()
-            call_args = send.call_args
-            args = call_args[0]  # ((message.RETURN, 'ok'),)
-            kwargs = call_args[1]  # {}
-            self.assertTrue(args)
-            self.assertTrue(len(args) == 1)
-            self.assertFalse(kwargs)
-            kind, ret = args[0]
-            self.assertEqual(kind, message.RETURN)
-            self.assertEqual(ret, 'ok')
-
-    # 本函数与上个流程一致，只是值有区别
-    @patch('pydis.multithreading.server.setattr', create=True)
-    @patch('pydis.multithreading.server.getattr', create=True)
-    def test_handle_request_kind_set(self, getattr, setattr):
+        kind, err = self._call(message.CALL, 999, ((), {}))
+        self.assertEqual(kind, message.ERROR)
+        self.assertTrue(isinstance(err, ValueError))
+        # 不再支持通过名称调用任意属性
+        kind, err = self._call(message.CALL, '_close_connections', ((), {}))
+        self.assertEqual(kind, message.ERROR)
+        self.assertTrue(isinstance(err, ValueError))
+
+    def test_handle_request_wrong_arity(self):
+        from pydis.multithreading.commands import OPCODES
+        from pydis.multithreading.message import message
+        kind, err = self._call(message.CALL, OPCODES['get'], ((), {}))
+        self.assertEqual(kind, message.ERROR)
+        self.assertTrue(isinstance(err, TypeError))
+        kind, err = self._call(message.CALL, OPCODES['delete'], ((), {}))
+        self.assertEqual(kind, message.ERROR)
+        self.assertTrue(isinstance(err, TypeError))
+
+    def test_handle_request_unknown_kind(self):
+        from pydis.multithreading.message import message
+        kind, err = self._call('fake_kind', 'fake', 'fake_arg')
+        self.assertEqual(kind, message.ERROR)
+        self.assertTrue(isinstance(err, TypeError))
+
+    def test_config(self):
+        server = Server()
+        self.assertIs(server.config_get('maxkeys'), None)
+        self.assertIs(server.config_set('maxkeys', 10), True)
+        self.assertIs(server.config_set('maxkeys_policy', 'allkeys-lru'), True)
+        self.assertEqual(server.config_get('maxkeys'), 10)
+        self.assertEqual(server.maxkeys_policy, 'allkeys-lru')
+        with self.assertRaises(ValueError):
+            server.config_set('_db', {})
+        with self.assertRaises(ValueError):
+            server.config_get('functions')
+
+    def test_key_index(self):
+        from pydis.multithreading.commands import OPCODES
+        from pydis.multithreading.message import message
+        server = Server()
+        self.assertIs(server.config_get('key_index'), False)
+        server.mset({'user:1': 1, 'user:2': 2, 'session:1': 's'})
+        server.config_set('key_index', True)
+        resp = self._call(message.CALL, OPCODES['keys'], (('user:*',), {}))
+        self.assertEqual(resp, (message.RETURN, ['user:1', 'user:2']))
+        resp = self._call(message.CALL, OPCODES['delete_prefix'], (('user:',), {}))
+        self.assertEqual(resp, (message.RETURN, 2))
+        self.assertEqual(server.keys(), ['session:1'])
+
+    def test_save(self):
+        import os
+        import tempfile
+        from pydis.multithreading.commands import OPCODES
+        from pydis.multithreading.message import message
+        server = Server()
+        server.mset({'key%d' % i: i for i in range(100)})
+        with tempfile.TemporaryDirectory() as tmp:
+            server.config_set('dbfilename', os.path.join(tmp, 'dump.pydis'))
+            resp = self._call(message.CALL, OPCODES['save'], ((), {}))
+            self.assertEqual(resp, (message.RETURN, 100))
+            self.assertNotEqual(server.lastsave(), 0)
+            resp = self._call(message.CALL, OPCODES['bgsave'], ((), {}))
+            self.assertEqual(resp, (message.RETURN, True))
+            server.incr('key1')  # 保存期间的修改不影响快照
+            server._bgsave_thread.join()
+            self.assertIs(server.info('persistence')['persistence']['rdb_bgsave_in_progress'], False)
+            self.assertEqual(server.last_bgsave_status, 'ok')
+            server.flushdb()
+            self.assertEqual(server.load(server.dbfilename), 100)
+            self.assertEqual(server.get('key1'), 1)
+
+    def test_attach(self):
+        import os
+        import tempfile
+        from pydis.multithreading.commands import OPCODES
+        from pydis.multithreading.message import message
+        server = Server()
+        server.mset({'key%d' % i: i for i in range(100)})
+        with tempfile.TemporaryDirectory() as tmp:
+            server.config_set('dbfilename', os.path.join(tmp, 'dump.pydis'))
+            with self.assertRaises(ValueError):
+                server.config_set('dbformat', 'json')
+            server.config_set('dbformat', 'mapped')
+            resp = self._call(message.CALL, OPCODES['bgsave'], ((), {}))
+            self.assertEqual(resp, (message.RETURN, True))
+            server._bgsave_thread.join()
+            self.assertEqual(server.last_bgsave_status, 'ok')
+            server.flushdb()
+            self.assertEqual(server.attach(server.dbfilename), 100)
+            resp = self._call(message.CALL, OPCODES['get'], (('key1',), {}))
+            self.assertEqual(resp, (message.RETURN, 1))
+            self.assertIs(server.info('persistence')['persistence']['mapped_loading'], True)
+            self.assertEqual(server._poll_timeout(), 0)
+            self.assertFalse(server._materialize())
+            self.assertEqual(len(server._db), 100)
+
+    def test_appendonly(self):
+        import os
+        import time
+        import tempfile
+        from pydis.multithreading.commands import OPCODES
+        from pydis.multithreading.message import message
+        server = Server()
+        server.set('old', 'val')
+        with tempfile.TemporaryDirectory() as tmp:
+            server.config_set('appendfilename', os.path.join(tmp, 'appendonly.aof'))
+            server.config_set('appendfsync', 'always')
+            server.config_set('appendonly', True)
+            server.function_load(lambda s, key: [s.set(key, 'half'), 1 / 0], 'half')
+            self._call(message.CALL, OPCODES['set'], (('key', 'val'), {'ex': 100}))
+            self._call(message.CALL, OPCODES['incr'], (('counter',), {}))
+            self._call(message.CALL, OPCODES['incr'], (('key',), {}))  # 失败的命令不记录
+            self._call(message.CALL, OPCODES['get'], (('key',), {}))   # 只读命令不记录
+            while server.aof.rewrite_in_progress:  # 开启时的重写
+                time.sleep(0.001)
+            resp = self._call(message.CALL, OPCODES['bgrewriteaof'], ((), {}))
+            self.assertEqual(resp, (message.RETURN, True))
+            self._call(message.CALL, OPCODES['incr'], (('counter',), {}))
+            while server.aof.rewrite_in_progress:
+                time.sleep(0.001)
+            # 失败前已经修改过数据的命令同样记录
+            self._call(message.CALL, OPCODES['fcall'], (('half', 'partial'), {}))
+            server.config_set('appendonly', False)
+            self.assertEqual(server._cow, 0)
+            server.flushdb()
+            self.assertGreater(server.load_aof(), 0)
+            self.assertEqual(server.get('old'), 'val')
+            self.assertEqual(server.get('counter'), 2)
+            self.assertTrue(98 < server.ttl('key') <= 100)
+            self.assertEqual(server.get('partial'), 'half')
+            with self.assertRaises(RuntimeError):
+                server.bgrewriteaof()
+            with self.assertRaises(ValueError):
+                server.config_set('appendfsync', 'sometimes')
+            # 只重放写命令
+            from pydis.exceptions import AofError
+            from pydis.multithreading.aof import AppendOnlyFile
+            path = os.path.join(tmp, 'other.aof')
+            aof = AppendOnlyFile(path)
+            aof.append('set', ('k', 'v'), {})
+            aof.append('config_set', ('dbfilename', 'other.rdb'), {})
+            aof.close()
+            with self.assertRaisesRegex(AofError, 'config_set'):
+                server.load_aof(path)
+            self.assertEqual(server.get('k'), 'v')
+            self.assertNotEqual(server.dbfilename, 'other.rdb')
+            # 重放函数调用前需要注册同样的函数
+            path = os.path.join(tmp, 'fcall.aof')
+            aof = AppendOnlyFile(path)
+            aof.append('fcall', ('incr2', 'n'), {})
+            aof.close()
+            with self.assertRaisesRegex(AofError, 'incr2'):
+                server.load_aof(path)
+            server.function_load(lambda s, key: s.incr(key, 2), 'incr2')
+            server.load_aof(path)
+            self.assertEqual(server.get('n'), 2)
+            server.function_flush()
+            server.flushdb()
+
+    def test_info(self):
+        from pydis.multithreading.commands import OPCODES
+        from pydis.multithreading.message import message
+        server = Server()
+        self._call(message.CALL, OPCODES['set'], (('key', 'val', 100), {}))
+        self._call(message.CALL, OPCODES['get'], (('key',), {}))
+        self._call(message.CALL, OPCODES['get'], (('nokey',), {}))
+        self._call(message.CALL, OPCODES['incr'], (('key',), {}))
+        info = server.info()
+        self.assertEqual(info['stats']['total_commands_processed'], 4)
+        self.assertEqual(info['stats']['keyspace_hits'], 2)
+        self.assertEqual(info['stats']['keyspace_misses'], 1)
+        self.assertEqual(info['keyspace'], {'keys': 1, 'expires': 1})
+        self.assertEqual(info['commandstats']['get']['calls'], 2)
+        self.assertEqual(info['commandstats']['incr']['failed_calls'], 1)
+        self.assertIn('p99', info['latencystats']['get'])
+        self.assertEqual(list(server.info('keyspace')), ['keyspace'])
+        with self.assertRaises(ValueError):
+            server.info('fake')
+        text = server.metrics()
+        self.assertIn('pydis_keyspace_hits_total 2', text)
+        self.assertIn('pydis_commands_total{cmd="get"} 2', text)
+        self.assertIn('pydis_command_duration_seconds_count{cmd="get"} 2', text)
+        # 关闭统计
+        server.config_set('stats_enabled', False)
+        self._call(message.CALL, OPCODES['get'], (('key',), {}))
+        self.assertEqual(server.info()['commandstats']['get']['calls'], 2)
+        server.stats_reset()
+        self.assertEqual(server.info()['commandstats'], {})
+        self.assertEqual(server.stat_keyspace_hits, 0)
+        server.flushdb()
+
+    def test_slowlog(self):
+        from pydis.multithreading.commands import OPCODES
         from pydis.multithreading.connection import open_connection
         from pydis.multithreading.message import message
-        c1, c2 = open_connection()
-        c1.send((message.SET, 'fake', 'fake_arg'))
-        with patch.object(c2, 'send') as send:
-            Server().handle_request(c2)
-            getattr.assert_called()
-            setattr.assert_called_with(Server(), 'fake', 'fake_arg')
-            send.assert_called()
-            call_args = send.call_args
-            args = call_args[0]  # ((message.RETURN, None),)
-            kwargs = call_args[1]  # {}
-            self.assertTrue(args)
-            self.assertTrue(len(args) == 1)
-            self.assertFalse(kwargs)
-            kind, ret = args[0]
-            self.assertEqual(kind, message.RETURN)
-            self.assertIs(ret, None)
-
-    @patch('pydis.multithreading.server.getattr', create=True)
-    def test_handle_request_unknown_kind(self, getattr):
+        server = Server()
+        server.execute((message.CALL, OPCODES['get'], (('key',), {})))
+        self.assertEqual(server.slowlog_len(), 0)
+        server.config_set('slowlog_log_slower_than', 0)
+        server.config_set('slowlog_max_len', 2)
+        server.execute((message.CALL, OPCODES['set'], (('key', 'val'), {'ex': 10})))
+        c1 = Server.open_connection()
+        c1.send((1, message.CALL, OPCODES['get'], (('key',), {})))
+        conn = next(c for c in Server._connections if c.id == c1.id)
+        server.handle_request(conn)
+        entries = server.slowlog_get()
+        self.assertEqual([e['command'] for e in entries], ['get', 'set'])
+        self.assertEqual(entries[0]['client_id'], c1.id)
+        self.assertNotEqual(c1.id, 0)
+        self.assertEqual(entries[1]['client_id'], 0)
+        self.assertEqual(entries[1]['args'], ["'key'", "'val'", 'ex=10'])
+        server.execute((message.CALL, OPCODES['keys'], ((), {})))
+        self.assertEqual(server.slowlog_len(), 2)
+        self.assertIs(server.slowlog_reset(), True)
+        self.assertEqual(server.slowlog_get(), [])
+        server.config_set('slowlog_log_slower_than', -1)
+        server.execute((message.CALL, OPCODES['keys'], ((), {})))
+        self.assertEqual(server.slowlog_len(), 0)
+        server.flushdb()
+
+    def test_latency_monitor(self):
+        server = Server()
+        self.assertEqual(server.latency_latest(), {})
+        server.config_set('latency_monitor_threshold', 1)
+        server.mset({'key%d' % i: i for i in range(10)})
+        with patch('pydis.multithreading.server.perf_counter', side_effect=[0, 0.5]):
+            server.delete(*('key%d' % i for i in range(10)))
+        self.assertEqual(server.latency_latest()['bulk-free']['max'], 500)
+        self.assertEqual(len(server.latency_history('bulk-free')), 1)
+        self.assertEqual(server.latency_reset(), 1)
+        with self.assertRaises(ValueError):
+            server.config_set('latency_monitor_threshold', -1)
+
+    def test_watchdog_period(self):
+        server = Server()
+        self.assertEqual(server.config_get('watchdog_period'), 0)
+        server.config_set('watchdog_period', 100)
+        watchdog = server._watchdog
+        self.assertEqual(server.watchdog_period, 100)
+        server.config_set('watchdog_period', 0)
+        self.assertIsNone(server._watchdog)
+        self.assertIs(watchdog._stop_evt.is_set(), True)
+
+    def test_handle_request_batch(self):
         from pydis.multithreading.connection import open_connection
         from pydis.multithreading.message import message
+        from pydis.multithreading.commands import OPCODES
+        from pydis.multithreading.server import MAX_REQUESTS_PER_CONN
         c1, c2 = open_connection()
-        c1.send(('fake_kind', 'fake', 'fake_arg'))  # type: ignore
-        with patch.object(c2, 'send') as send:
-            Server().handle_request(c2)
-            getattr.assert_called()
-            send.assert_called()
-            call_args = send.call_args
-            args = call_args[0]  # ((message.ERROR, TypeError('message kind nuknown')),)
-            kwargs = call_args[1]  # {}
-            self.assertTrue(args)
-            self.assertTrue(len(args) == 1)
-            self.assertFalse(kwargs)
-            kind, err = args[0]
-            self.assertEqual(kind, message.ERROR)
-            self.assertTrue(isinstance(err, TypeError))
+        total = MAX_REQUESTS_PER_CONN + 10
+        for _ in range(total):
+            c1.send((1, message.CALL, OPCODES['incr'], (('key',), {})))
+        server = Server()
+        self.assertIs(server.handle_request(c2), True)
+        self.assertEqual(server.get('key'), MAX_REQUESTS_PER_CONN)
+        self.assertIs(server.handle_request(c2), False)
+        self.assertEqual(server.get('key'), total)
+        results = [c1.recv()[2] for _ in range(total)]
+        self.assertEqual(results, list(range(1, total + 1)))
+        server.flushdb()
+
+    def test_execute_pipeline(self):
+        from pydis.multithreading.commands import OPCODES
+        from pydis.multithreading.message import message
+        server = Server()
+        msgs = [
+            (message.CALL, OPCODES['set'], (('key', 'val'), {})),
+            (message.CALL, OPCODES['incr'], (('key',), {})),
+            (message.CALL, OPCODES['get'], (('key',), {})),
+        ]
+        kind, results = server.execute((message.PIPELINE, None, msgs))
+        self.assertEqual(kind, message.RETURN)
+        self.assertEqual(results[0], (message.RETURN, True))
+        self.assertEqual(results[1][0], message.ERROR)
+        self.assertEqual(results[2], (message.RETURN, 'val'))
+        server.flushdb()
+
+    def test_functions(self):
+        def rate_limit(server, key, limit):
+            return server.incr(key) <= limit
+
+        def peek(server, key):
+            return server.get(key)
+        server = Server()
+        digest = server.function_load(rate_limit)
+        peek_digest = server.function_load(peek, readonly=True)
+        self.assertNotEqual(digest, peek_digest)
+        self.assertEqual(server.function_load(peek, 'peek2'), peek_digest)
+        with self.assertRaises(ValueError):
+            server.function_load(peek)
+        self.assertIs(server.fcall('rate_limit', 'key', 2), True)
+        self.assertIs(server.evalsha(digest, 'key', 2), True)
+        self.assertIs(server.fcall('rate_limit', 'key', limit=2), False)
+        self.assertEqual(server.fcall_ro('peek', 'key'), 3)
+        with self.assertRaises(ValueError):
+            server.fcall_ro('rate_limit', 'key', 2)
+        self.assertEqual(
+            sorted(f['name'] for f in server.function_list()),
+            ['peek', 'peek2', 'rate_limit'])
+        self.assertIs(server.function_delete('rate_limit'), True)
+        self.assertIs(server.function_delete('rate_limit'), False)
+        with self.assertRaises(ValueError):
+            server.fcall('rate_limit', 'key', 2)
+        with self.assertRaises(ValueError):
+            server.evalsha(digest, 'key', 2)
+        server.function_flush()
+        server.flushdb()
+
+    def test_active_expire_cycle(self):
+        from time import monotonic
+        server = Server()
+        server.set('key1', 'val', 0)
+        server.set('key2', 'val', 100)
+        server.active_expire_cycle()
+        self.assertEqual(list(server._db), ['key2'])
+        self.assertEqual(server.last_time_cycle <= monotonic(), True)
+        self.assertIs(server.timelimit_exit, False)
+        server.flushdb()
 
     def test_stop(self):
         Server.stop()
@@ -361,3 +585,47 @@ class TestServer(TestCase):
         conns = [Server.open_connection() for _ in range(5)]
         Server()._close_connections()
         self.assertIs(all(conn.closed for conn in conns), True)
+
+    def test_client_tracking(self):
+        from time import sleep
+        from pydis.multithreading.commands import OPCODES
+        from pydis.multithreading.connection import open_connection
+        from pydis.multithreading.message import message
+        server = Server()
+
+        def call(conn, rid, name, *args):
+            conn[0].send((rid, message.CALL, OPCODES[name], (args, {})))
+            server.handle_request(conn[1])
+
+        reader, writer = open_connection(), open_connection()
+        call(reader, 1, 'client_tracking', True)
+        call(reader, 2, 'mget', ['k1', 'k2'])
+        self.assertEqual(server.info('stats')['stats']['tracking_total_keys'], 2)
+        call(writer, 1, 'set', 'k1', 'val')
+        self.assertEqual(reader[0].recv(timeout=1)[:2], (1, message.RETURN))
+        self.assertEqual(reader[0].recv(timeout=1)[:2], (2, message.RETURN))
+        self.assertEqual(reader[0].recv(timeout=1), (0, message.INVALIDATE, ['k1']))
+        # 写命令的失效消息先于响应送达
+        call(reader, 3, 'set', 'k2', 'val', 0)
+        self.assertEqual(reader[0].recv(timeout=1), (0, message.INVALIDATE, ['k2']))
+        self.assertEqual(reader[0].recv(timeout=1), (3, message.RETURN, True))
+        # 定期清理失效的键
+        server.set('k1', 'val', 0.05)
+        call(reader, 4, 'get', 'k1')
+        self.assertEqual(reader[0].recv(timeout=1), (4, message.RETURN, 'val'))
+        sleep(0.06)
+        server.last_time_cycle = 0
+        server.active_expire_cycle()
+        self.assertEqual(reader[0].recv(timeout=1), (0, message.INVALIDATE, ['k1']))
+        call(writer, 2, 'flushdb')
+        self.assertEqual(reader[0].recv(timeout=1), (0, message.INVALIDATE, None))
+        # 函数中读取的键同样被跟踪
+        server.function_load(lambda s, key: s.get(key), 'read', readonly=True)
+        call(reader, 5, 'fcall_ro', 'read', 'k3')
+        self.assertEqual(reader[0].recv(timeout=1), (5, message.RETURN, None))
+        call(writer, 3, 'set', 'k3', 'val')
+        self.assertEqual(reader[0].recv(timeout=1), (0, message.INVALIDATE, ['k3']))
+        server.function_flush()
+        call(reader, 6, 'client_tracking', False)
+        self.assertIsNone(server._tracking)
+        server.flushdb()
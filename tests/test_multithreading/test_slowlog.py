@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+from pydis.multithreading.slowlog import (SLOWLOG_MAX_ARGLEN,
+                                          SLOWLOG_MAX_ARGS, SlowLog,
+                                          summarize)
+
+
+class TestSlowLog(TestCase):
+    def test_ring_buffer(self):
+        log = SlowLog(maxlen=3)
+        for i in range(5):
+            log.add(i, 'get', ('key%d' % i,), {})
+        self.assertEqual(len(log), 3)
+        entries = log.get()
+        self.assertEqual([e.id for e in entries], [4, 3, 2])
+        self.assertEqual(entries[0].args, ["'key4'"])
+        self.assertEqual(len(log.get(1)), 1)
+        self.assertEqual(len(log.get(-1)), 3)
+        log.maxlen = 1
+        self.assertEqual([e.id for e in log.get()], [4])
+        log.reset()
+        self.assertEqual(len(log), 0)
+        log.add(1, 'get', ('key',), {})
+        self.assertEqual(log.get()[0].id, 5)  # 序号不会因重置而回退
+
+    def test_summarize(self):
+        self.assertEqual(summarize(('key',), {'ex': 10}), ["'key'", 'ex=10'])
+        args = summarize((list(range(100000)), 'x' * 1000), {})
+        self.assertLessEqual(len(args[0]), SLOWLOG_MAX_ARGLEN)
+        self.assertLessEqual(len(args[1]), SLOWLOG_MAX_ARGLEN)
+        args = summarize(tuple(range(100)), {})
+        self.assertEqual(len(args), SLOWLOG_MAX_ARGS)
+        self.assertEqual(args[-1], '... (69 more arguments)')
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+from pydis.multithreading.stats import (CommandStats, LatencyHistogram,
+                                        _bucket_index, _bucket_upper)
+
+
+class TestLatencyHistogram(TestCase):
+    def test_buckets(self):
+        for usec in (0, 1, 3, 4, 7, 8, 9, 100, 12345, 10 ** 9):
+            i = _bucket_index(usec)
+            self.assertLess(usec, _bucket_upper(i))
+            if i:
+                self.assertGreaterEqual(usec, _bucket_upper(i - 1))
+        # 超出范围的耗时计入最后一个桶
+        h = LatencyHistogram()
+        h.record(1 << 50)
+        self.assertEqual(h.counts[-1], 1)
+
+    def test_percentile(self):
+        h = LatencyHistogram()
+        self.assertEqual(h.percentile(50), 0)
+        for usec in range(1, 1001):
+            h.record(usec)
+        p50, p99 = h.percentile(50), h.percentile(99)
+        self.assertTrue(500 <= p50 <= 500 * 1.25, p50)
+        self.assertTrue(990 <= p99 <= 990 * 1.25, p99)
+        buckets = h.buckets()
+        self.assertEqual(buckets[-1][1], 1000)
+        self.assertEqual([b for b, _ in buckets], sorted(b for b, _ in buckets))
+
+    def test_command_stats(self):
+        cs = CommandStats()
+        cs.record(0.001)
+        cs.record(0.003, failed=True)
+        info = cs.info()
+        self.assertEqual(info['calls'], 2)
+        self.assertEqual(info['failed_calls'], 1)
+        self.assertEqual(info['usec'], 4000)
+        self.assertEqual(set(cs.percentiles()), {'p50', 'p99', 'p99.9'})
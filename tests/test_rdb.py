@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import tempfile
+import unittest
+from time import time
+
+from pydis import rdb
+from pydis.exceptions import RdbError
+from pydis.value import INF, Value
+
+
+class TestRdb(unittest.TestCase):
+    def dump(self, items, chunk_keys=rdb.RDB_CHUNK_KEYS):
+        f = io.BytesIO()
+        count = rdb.dump(items, f, chunk_keys)
+        return count, f.getvalue()
+
+    def test_round_trip(self):
+        items = [('key%d' % i, Value({'i': i}, None)) for i in range(10)]
+        items.append(('ex', Value('val', 100)))
+        items.append(('expired', Value('val', 0)))
+        count, data = self.dump(items, chunk_keys=3)
+        self.assertEqual(count, 11)
+        batches = list(rdb.load(io.BytesIO(data)))
+        self.assertEqual([len(b) for b in batches], [3, 3, 3, 2])
+        entries = {key: (val, expire_at) for b in batches for key, val, expire_at in b}
+        self.assertNotIn('expired', entries)
+        self.assertEqual(entries['key3'], ({'i': 3}, INF))
+        self.assertAlmostEqual(entries['ex'][1], time() + 100, delta=1)
+
+    def test_invalid(self):
+        _, data = self.dump([('key', Value('val', None))])
+        with self.assertRaises(RdbError):
+            list(rdb.load(io.BytesIO(b'NOTPYDIS' + data[8:])))
+        with self.assertRaises(RdbError):
+            list(rdb.load(io.BytesIO(data[:-1])))
+        corrupted = bytearray(data)
+        corrupted[-10] ^= 0xFF
+        with self.assertRaises(RdbError):
+            list(rdb.load(io.BytesIO(bytes(corrupted))))
+
+    def test_save(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dump.pydis')
+            self.assertEqual(rdb.save([('key', Value('val', None))], path), 1)
+            self.assertEqual(os.listdir(tmp), ['dump.pydis'])
+            with self.assertRaises(Exception):
+                rdb.save([('key', Value(lambda: None, None))], path)  # 不能 pickle
+            self.assertEqual(os.listdir(tmp), ['dump.pydis'])
+            with open(path, 'rb') as f:
+                self.assertEqual(list(rdb.load(f)), [[('key', 'val', INF)]])
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+from threading import Thread
+
+from pydis import ShardedCore
+
+
+class TestShardedCore(unittest.TestCase):
+    def setUp(self):
+        self.p = ShardedCore(shards=4)
+
+    def tearDown(self):
+        self.p.close()
+
+    def test_set_get(self):
+        p = self.p
+        self.assertIs(p.set('key', 'val'), True)
+        self.assertEqual(p.get('key'), 'val')
+        self.assertIs(p.setnx('key', 'val2'), False)
+        self.assertIs(p.exists('key'), True)
+        self.assertEqual(p.ttl('key'), -1)
+        self.assertEqual(p.delete('key'), 1)
+        self.assertIsNone(p.get('key'))
+        self.assertIs(p.empty, True)
+
+    def test_multi_keys(self):
+        p = self.p
+        data = {'key%d' % i: i for i in range(50)}
+        p.mset(data)
+        keys = list(data) + ['fake_key']
+        self.assertEqual(p.mget(keys), list(data.values()) + [None])
+        self.assertEqual(sorted(p.keys()), sorted(data))
+        self.assertEqual(p.msetnx({'key0': 0, 'new': 1}), 1)
+        self.assertEqual(p.dbsize(), 51)
+        self.assertEqual(p.delete('key0', 'key1', 'fake_key'), 2)
+        p.flushdb()
+        self.assertIs(p.empty, True)
+
+    def test_scan(self):
+        p = self.p
+        keys = {'key%d' % i for i in range(50)}
+        p.mset({key: 1 for key in keys})
+        cursor, seen = 0, []
+        while True:
+            cursor, batch = p.scan(cursor, count=5)
+            self.assertLessEqual(len(batch), 5)
+            seen += batch
+            if not cursor:
+                break
+        self.assertEqual(sorted(seen), sorted(keys))
+        self.assertEqual(set(p.scan_iter(match='key1?')),
+                         {'key%d' % i for i in range(10, 20)})
+        scans = [p.scan_iter(count=1) for _ in range(20)]  # 同时进行的遍历不受数量限制
+        firsts = [next(it) for it in scans]
+        for first, it in zip(firsts, scans):
+            self.assertEqual(sorted([first, *it]), sorted(keys))
+
+    def test_prefix(self):
+        p = self.p
+        p.key_index = True
+        p.mset({'user:%d' % i: i for i in range(20)})
+        p.set('session:1', 's')
+        self.assertEqual(sorted(p.keys('user:1*')),
+                         sorted(['user:1'] + ['user:%d' % i for i in range(10, 20)]))
+        self.assertEqual(p.delete_prefix('user:'), 20)
+        self.assertEqual(p.keys(), ['session:1'])
+
+    def test_unlink_flushdb(self):
+        p = self.p
+        p.mset({'key%d' % i: i for i in range(50)})
+        self.assertEqual(p.unlink(*('key%d' % i for i in range(10))), 10)
+        self.assertEqual(len(p.keys()), 40)
+        p.flushdb(asynchronous=True)
+        self.assertIs(p.empty, True)
+
+    def test_save_load(self):
+        import os
+        import tempfile
+        p = self.p
+        p.mset({'key%d' % i: i for i in range(50)}, 100)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dump.pydis')
+            self.assertEqual(p.save(path), 50)
+            p.flushdb()
+            self.assertEqual(p.load(path), 50)
+        self.assertEqual(p.get('key7'), 7)
+        self.assertTrue(0 < p.ttl('key7') <= 100)
+
+    def test_attach(self):
+        import os
+        import tempfile
+        p = ShardedCore(shards=4, active_expire=False)
+        p.mset({'key%d' % i: i for i in range(1000)}, 100)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dump.pydis')
+            self.assertEqual(p.save_mapped(path), 1000)
+            p.flushdb()
+            self.assertEqual(p.attach(path), 1000)
+            self.assertEqual(p.get('key7'), 7)
+            self.assertEqual(p.delete('key8', 'key9'), 2)
+            self.assertEqual(p.active_expire_cycle(0), (0, True))
+            self.assertEqual(len(set(p.scan_iter(count=100))), 998)
+        self.assertFalse(p.mapped_pending)
+        self.assertTrue(all(not shard.mapped_pending for shard in p._shards))
+        self.assertEqual(len(p.keys()), 998)
+        self.assertTrue(0 < p.ttl('key999') <= 100)
+        self.assertIsNone(p.get('key8'))
+        for i, shard in enumerate(p._shards):
+            self.assertTrue(all(p._index(key) == i for key in shard._db))
+
+    def test_expire(self):
+        p = ShardedCore(shards=4, active_expire=False)
+        p.set('key1', 'val', 0.1)
+        p.set('key2', 'val')
+        self.assertIs(p.expire('key2', 0.1), True)
+        time.sleep(0.1)
+        self.assertEqual(p.active_expire_cycle(), (2, False))
+        self.assertIs(p.empty, True)
+
+    def test_active_expire_thread(self):
+        p = self.p
+        p.set('key', 'val', 0.05)
+        time.sleep(0.3)
+        self.assertEqual(sum(len(shard._db) for shard in p._shards), 0)
+
+    def test_expire_cycle_concurrent(self):
+        p = ShardedCore(shards=2, active_expire=False)
+        stop = False
+        errors = []
+
+        def writer(n):
+            while not stop:
+                p.set('key%d' % n, 'val', 0)
+                p.expire('key%d' % n, 0)
+                p.delete('key%d' % n)
+
+        def cycle():
+            try:
+                while not stop:
+                    p.active_expire_cycle()
+            except Exception as e:
+                errors.append(e)
+        threads = [Thread(target=writer, args=(i,)) for i in range(4)]
+        threads.append(Thread(target=cycle))
+        for t in threads:
+            t.start()
+        time.sleep(0.5)
+        stop = True
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        p.active_expire_cycle()
+        self.assertIs(p.empty, True)
+
+    def test_maxkeys(self):
+        p = self.p
+        p.maxkeys = 40
+        p.maxkeys_policy = 'allkeys-random'
+        self.assertEqual(p.maxkeys_policy, 'allkeys-random')
+        p.mset({'key%d' % i: i for i in range(200)})
+        self.assertLessEqual(len(p.keys()), 40)
+        self.assertGreater(p.stat_evicted_keys, 0)
+
+    def test_maxkeys_custom_policy(self):
+        from pydis.eviction import EvictionPolicy
+
+        class Oldest(EvictionPolicy):
+            name = 'oldest'
+
+            def __init__(self, prefix: str) -> None:
+                super().__init__(samples=10)
+                self.prefix = prefix
+
+            def score(self, value):
+                return -value.version
+
+        p = self.p
+        p.maxkeys, p.maxkeys_policy = 40, Oldest('key')
+        self.assertEqual(p.maxkeys_policy, 'oldest')
+        policies = [shard._policy for shard in p._shards]
+        self.assertEqual(len(set(map(id, policies))), len(policies))
+        self.assertEqual({(policy.prefix, policy.samples) for policy in policies}, {('key', 10)})
+        p.mset({'key%d' % i: i for i in range(200)})
+        self.assertLessEqual(len(p.keys()), 40)
+
+    def test_threads(self):
+        p = self.p
+
+        def incr():
+            for _ in range(1000):
+                p.incr('counter')
+        threads = [Thread(target=incr) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(p.get('counter'), 8000)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from pydis.core import BaseCore
+from pydis.tracking import Tracking
+
+
+class TestTracking(unittest.TestCase):
+    def test_track_invalidate(self):
+        t = Tracking()
+        t.enable('a')
+        t.enable('b')
+        t.track('a', ['k1', 'k2'])
+        t.track('b', ['k1'])
+        t.track('c', ['k3'])  # 没有开启跟踪的客户端被忽略
+        self.assertEqual(len(t), 2)
+        self.assertEqual(t.clients, 2)
+        t.invalidate('k1')
+        t.invalidate('k1')  # 推送只发生一次
+        t.invalidate('k3')
+        self.assertEqual(sorted(t.pop_pending()), [('a', ['k1']), ('b', ['k1'])])
+        self.assertIs(t.pending, False)
+        self.assertEqual(len(t), 1)
+
+    def test_invalidate_all(self):
+        t = Tracking()
+        t.enable('a')
+        t.track('a', ['k1'])
+        t.invalidate_all()
+        t.invalidate('k1')
+        self.assertEqual(t.pop_pending(), [('a', None)])
+        self.assertEqual(len(t), 0)
+
+    def test_disable(self):
+        t = Tracking()
+        t.enable('a')
+        t.track('a', ['k1', 'k2'])
+        t.invalidate('k1')
+        t.disable('a')
+        t.invalidate('k2')
+        self.assertEqual(t.pop_pending(), [])
+        self.assertNotIn('a', t)
+
+    def test_max_keys(self):
+        t = Tracking(max_keys=2)
+        t.enable('a')
+        t.track('a', ['k1', 'k2', 'k3'])
+        self.assertEqual(len(t), 2)
+        self.assertEqual(t.pop_pending(), [('a', ['k1'])])
+
+
+class TestCoreTracking(unittest.TestCase):
+    def setUp(self):
+        self.core = BaseCore()
+        self.core._tracking = self.tracking = Tracking()
+        self.tracking.enable('a')
+
+    def invalidated(self, *keys):
+        self.tracking.track('a', keys)
+        return dict(self.tracking.pop_pending()).get('a')
+
+    def test_writes(self):
+        core = self.core
+        self.assertEqual(self.invalidated('k'), None)
+        core.set('k', 1)
+        self.assertEqual(self.invalidated('k'), ['k'])
+        core.incr('k')
+        self.assertEqual(self.invalidated('k', 'x'), ['k'])
+        core.expire('k', 100)
+        self.assertEqual(self.invalidated('k'), ['k'])
+        core.mset({'k': 1, 'x': 2})
+        self.assertEqual(sorted(self.invalidated('k', 'x')), ['k', 'x'])
+        core.delete('k', 'x')
+        self.assertEqual(self.invalidated('k'), ['k', 'x'])
+        core.flushdb()
+        self.assertEqual(self.tracking.pop_pending(), [('a', None)])
+
+    def test_expire_evict(self):
+        core, tracking = self.core, self.tracking
+        core.set('k1', 1, 0)
+        tracking.track('a', ['k1'])
+        core.get('k1')  # 读取时发现已经失效
+        self.assertEqual(tracking.pop_pending(), [('a', ['k1'])])
+        core.set('k2', 1, 0)
+        tracking.track('a', ['k2'])
+        core._expire_due(float('inf'))
+        self.assertEqual(tracking.pop_pending(), [('a', ['k2'])])
+        core.maxkeys, core.maxkeys_policy = 1, 'allkeys-lru'
+        core.set('k3', 1)
+        tracking.track('a', ['k3'])
+        core.set('k4', 1)  # 淘汰 k3
+        self.assertEqual(tracking.pop_pending(), [('a', ['k3'])])
+
+    def test_load(self):
+        import os
+        import tempfile
+        core, tracking = self.core, self.tracking
+        core.set('k1', 1)
+        core.set('k2', 2)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'dump.rdb')
+            core.save(path)
+            core.set('k1', 'new')
+            tracking.track('a', ['k1', 'k2', 'k3'])
+            core.load(path)
+        self.assertEqual(sorted(tracking.pop_pending()[0][1]), ['k1', 'k2'])
+        self.assertEqual(core.get('k1'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from datetime import timedelta
+from time import monotonic
+
+from pydis.value import INF, NOT_EXISTS, Value
+
+
+class TestValue(unittest.TestCase):
+    def test_no_expiry(self):
+        v = Value('val', None)
+        self.assertEqual(v.expire_at, INF)
+        self.assertIs(v.expiry, False)
+        self.assertIs(v.expired, False)
+        self.assertEqual(v.ttl, -1)
+
+    def test_expiry(self):
+        v = Value('val', 10)
+        self.assertIs(v.expiry, True)
+        self.assertIs(v.expired, False)
+        self.assertTrue(9 < v.ttl <= 10)
+        v = Value('val', timedelta(seconds=10))
+        self.assertTrue(9 < v.ttl <= 10)
+        self.assertIs(Value('val', 0).expired, True)
+
+    def test_cached_clock(self):
+        now = monotonic()
+        v = Value('val', 5, now=now)
+        self.assertEqual(v.expire_at, now + 5)
+        self.assertIs(v.is_expired(now + 4.9), False)
+        self.assertIs(v.is_expired(now + 5), True)
+        self.assertEqual(v.get_ttl(now + 2), 3)
+
+    def test_not_exists(self):
+        self.assertIs(NOT_EXISTS.expired, True)
+        self.assertIsNone(NOT_EXISTS.value)